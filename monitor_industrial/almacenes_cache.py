@@ -0,0 +1,831 @@
+#!/usr/bin/env python3
+"""
+Almacenes del Cache - Backends de persistencia para CacheManager
+
+CacheManager (escritura diferida, paginación de pendientes, estado en
+memoria) delega el almacenamiento en un backend elegido con cache.backend:
+
+- "sqlite": SQLite en WAL, conexión de escritura + pool de solo lectura
+- "sqlite_redis": lo anterior con réplica en Redis para otros procesos
+- "memoria": estructuras en memoria, sin disco (pruebas y benchmarks)
+
+Los métodos de escritura solo los llama el hilo escritor de CacheManager;
+los de lectura pueden llamarse desde cualquier hilo.
+
+Al insertar cada lote se acumulan rollups por minuto y por hora para cada
+(orden, estación, fuente) y totales por fuente; las lecturas crudas ya
+sincronizadas se pueden borrar sin perder esos agregados.
+"""
+
+import sqlite3
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+
+# Formato del periodo de cada rollup (mismo prefijo que el timestamp en SQLite)
+GRANULARIDADES = {
+    'minuto': '%Y-%m-%d %H:%M',
+    'hora': '%Y-%m-%d %H:00'
+}
+
+
+def validar_granularidad(granularidad: str):
+    """Rechazar granularidades desconocidas (también nombran tablas)"""
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad desconocida: {granularidad} (opciones: {', '.join(GRANULARIDADES)})")
+
+
+def agrupar_lote(lote: List[tuple]) -> Dict[str, Dict[Tuple[str, str, str, str], List[int]]]:
+    """Sumar lecturas y cantidad de un lote por (periodo, orden, estación, fuente)"""
+    rollups = {granularidad: {} for granularidad in GRANULARIDADES}
+    for orden, upc, cantidad, timestamp, fuente, estacion_id in lote:
+        for granularidad, formato in GRANULARIDADES.items():
+            clave = (timestamp.strftime(formato), orden, estacion_id or '', fuente)
+            acumulado = rollups[granularidad].setdefault(clave, [0, 0])
+            acumulado[0] += 1
+            acumulado[1] += cantidad
+    return rollups
+
+
+class AlmacenCache:
+    """Interfaz común de los backends"""
+
+    nombre = 'base'
+
+    def abrir(self):
+        raise NotImplementedError
+
+    def cerrar(self):
+        raise NotImplementedError
+
+    # Escrituras (hilo escritor)
+    def insertar_lecturas(self, lote: List[tuple],
+                          puntos_control: Optional[Dict[str, int]] = None) -> List[int]:
+        """Insertar filas (orden, upc, cantidad, timestamp, fuente, estacion_id) y retornar sus ids
+
+        puntos_control (clave -> valor) se guarda en configuracion en la misma transacción.
+        """
+        raise NotImplementedError
+
+    def marcar_ids(self, ids: List[int]):
+        raise NotImplementedError
+
+    def marcar_tramo(self, desde_id: int, hasta_id: int) -> int:
+        """Marcar sincronizadas las pendientes con desde_id < id <= hasta_id"""
+        raise NotImplementedError
+
+    def limpiar_sincronizadas(self, desde_id: Optional[int], hasta_id: int):
+        """Liberar réplicas de un rango ya sincronizado (opcional)"""
+
+    def guardar_configuracion(self, clave: str, valor: Optional[str]):
+        raise NotImplementedError
+
+    def guardar_estado(self, estacion_id: str, estado: Dict[str, Any], version: int):
+        raise NotImplementedError
+
+    def eliminar_sincronizadas(self, antes_de: datetime) -> int:
+        raise NotImplementedError
+
+    def eliminar_rollup(self, granularidad: str, antes_de: str) -> int:
+        """Borrar periodos de un rollup anteriores a antes_de"""
+        raise NotImplementedError
+
+    # Lecturas (cualquier hilo)
+    def pagina_pendientes(self, despues_de: int, tamano: int,
+                          hasta_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Pendientes con id > despues_de en orden de id, timestamp en texto ISO"""
+        raise NotImplementedError
+
+    def primera_pendiente(self) -> Optional[int]:
+        raise NotImplementedError
+
+    def ultima_pendiente(self) -> Optional[int]:
+        raise NotImplementedError
+
+    def ultimo_id(self) -> int:
+        raise NotImplementedError
+
+    def contar_pendientes_despues(self, hasta_id: int) -> int:
+        raise NotImplementedError
+
+    def obtener_configuracion(self, clave: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def obtener_estado(self, estacion_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def obtener_rollup(self, granularidad: str, desde: str, hasta: Optional[str] = None,
+                       estacion_id: Optional[str] = None,
+                       orden: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Filas del rollup con desde <= periodo < hasta, en orden de periodo"""
+        raise NotImplementedError
+
+    def estadisticas(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class AlmacenSQLite(AlmacenCache):
+    """SQLite en WAL: una conexión de escritura y un pool de solo lectura"""
+
+    nombre = 'sqlite'
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.sqlite_conn = None
+        self.conexiones_lectura = config.conexiones_lectura
+        self._pool_lectura = Queue()
+
+    def abrir(self):
+        self.sqlite_conn = sqlite3.connect(
+            self.config.sqlite_file,
+            check_same_thread=False
+        )
+        self.sqlite_conn.row_factory = sqlite3.Row
+
+        # WAL: las escrituras no bloquean lecturas y el fsync se agrupa
+        self.sqlite_conn.execute('PRAGMA journal_mode=WAL')
+        self.sqlite_conn.execute(f'PRAGMA synchronous={self.config.sqlite_synchronous}')
+
+        self.crear_tablas()
+        for _ in range(self.conexiones_lectura):
+            self._pool_lectura.put(self._abrir_lectura())
+        self.logger.info("✅ SQLite inicializado")
+
+    def cerrar(self):
+        while not self._pool_lectura.empty():
+            self._pool_lectura.get_nowait().close()
+        if self.sqlite_conn:
+            self.sqlite_conn.close()
+
+    def crear_tablas(self):
+        """Crear tablas de SQLite si no existen"""
+        cursor = self.sqlite_conn.cursor()
+
+        # Tabla de lecturas de producción
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lecturas_produccion (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                orden_fabricacion TEXT NOT NULL,
+                upc TEXT NOT NULL,
+                cantidad INTEGER NOT NULL,
+                timestamp DATETIME NOT NULL,
+                fuente TEXT NOT NULL,
+                estacion_id TEXT,
+                sincronizada BOOLEAN DEFAULT FALSE,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Migrar bases creadas antes de agrupar por estación
+        columnas = [fila[1] for fila in cursor.execute('PRAGMA table_info(lecturas_produccion)')]
+        if 'estacion_id' not in columnas:
+            cursor.execute('ALTER TABLE lecturas_produccion ADD COLUMN estacion_id TEXT')
+
+        # Tabla de estado de estaciones
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS estado_estaciones (
+                estacion_id TEXT PRIMARY KEY,
+                estado TEXT NOT NULL,
+                orden_actual TEXT,
+                contador INTEGER DEFAULT 0,
+                meta INTEGER DEFAULT 0,
+                ultima_actividad DATETIME,
+                tiempo_inactivo INTEGER DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Tabla de configuración
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS configuracion (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Rollups por minuto y por hora; las claves no admiten NULL, así que
+        # una lectura sin estación se agrupa con estacion_id = ''
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'totales_fuente'")
+        rollups_nuevos = cursor.fetchone() is None
+
+        for granularidad in GRANULARIDADES:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS rollup_{granularidad} (
+                    periodo TEXT NOT NULL,
+                    orden_fabricacion TEXT NOT NULL,
+                    estacion_id TEXT NOT NULL,
+                    fuente TEXT NOT NULL,
+                    lecturas INTEGER NOT NULL,
+                    cantidad INTEGER NOT NULL,
+                    PRIMARY KEY (periodo, orden_fabricacion, estacion_id, fuente)
+                ) WITHOUT ROWID
+            ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS totales_fuente (
+                fuente TEXT PRIMARY KEY,
+                lecturas INTEGER NOT NULL,
+                cantidad INTEGER NOT NULL
+            )
+        ''')
+
+        # Bases anteriores a los rollups: poblarlos una vez desde las lecturas
+        if rollups_nuevos:
+            for granularidad, periodo in (('minuto', 'substr(timestamp, 1, 16)'),
+                                          ('hora', "substr(timestamp, 1, 13) || ':00'")):
+                cursor.execute(f'''
+                    INSERT INTO rollup_{granularidad}
+                    SELECT {periodo}, orden_fabricacion, COALESCE(estacion_id, ''), fuente, COUNT(*), SUM(cantidad)
+                    FROM lecturas_produccion
+                    GROUP BY 1, 2, 3, 4
+                ''')
+            cursor.execute('''
+                INSERT INTO totales_fuente
+                SELECT fuente, COUNT(*), SUM(cantidad)
+                FROM lecturas_produccion
+                GROUP BY fuente
+            ''')
+
+        # Índices para optimizar consultas
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_lecturas_orden
+            ON lecturas_produccion(orden_fabricacion)
+        ''')
+
+        # Índice parcial: solo contiene las lecturas sin sincronizar, por id
+        cursor.execute('DROP INDEX IF EXISTS idx_lecturas_sincronizada')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_lecturas_pendientes
+            ON lecturas_produccion(id) WHERE sincronizada = FALSE
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_lecturas_timestamp
+            ON lecturas_produccion(timestamp)
+        ''')
+
+        self.sqlite_conn.commit()
+        self.logger.info("✅ Tablas de SQLite creadas")
+
+    def _abrir_lectura(self) -> sqlite3.Connection:
+        """Abrir una conexión de solo lectura a la base SQLite"""
+        uri = Path(self.config.sqlite_file).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _lectura(self) -> Iterator[sqlite3.Cursor]:
+        """Tomar una conexión de lectura del pool mientras dura la consulta"""
+        conn = self._pool_lectura.get()
+        try:
+            yield conn.cursor()
+        finally:
+            self._pool_lectura.put(conn)
+
+    @contextmanager
+    def _transaccion(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor de la conexión de escritura con commit o rollback al salir"""
+        cursor = self.sqlite_conn.cursor()
+        try:
+            yield cursor
+            self.sqlite_conn.commit()
+        except Exception:
+            self.sqlite_conn.rollback()
+            raise
+
+    def insertar_lecturas(self, lote: List[tuple],
+                          puntos_control: Optional[Dict[str, int]] = None) -> List[int]:
+        # Un solo commit por lote, rollups y puntos de control incluidos
+        ids = []
+        rollups = agrupar_lote(lote)
+        with self._transaccion() as cursor:
+            for fila in lote:
+                cursor.execute('''
+                    INSERT INTO lecturas_produccion
+                    (orden_fabricacion, upc, cantidad, timestamp, fuente, estacion_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', fila)
+                ids.append(cursor.lastrowid)
+
+            for granularidad, grupos in rollups.items():
+                cursor.executemany(f'''
+                    INSERT INTO rollup_{granularidad}
+                    (periodo, orden_fabricacion, estacion_id, fuente, lecturas, cantidad)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (periodo, orden_fabricacion, estacion_id, fuente) DO UPDATE SET
+                        lecturas = lecturas + excluded.lecturas,
+                        cantidad = cantidad + excluded.cantidad
+                ''', [clave + tuple(acumulado) for clave, acumulado in grupos.items()])
+
+            totales: Dict[str, List[int]] = {}
+            for (_, _, _, fuente), (lecturas, cantidad) in rollups['hora'].items():
+                acumulado = totales.setdefault(fuente, [0, 0])
+                acumulado[0] += lecturas
+                acumulado[1] += cantidad
+            cursor.executemany('''
+                INSERT INTO totales_fuente (fuente, lecturas, cantidad)
+                VALUES (?, ?, ?)
+                ON CONFLICT (fuente) DO UPDATE SET
+                    lecturas = lecturas + excluded.lecturas,
+                    cantidad = cantidad + excluded.cantidad
+            ''', [(fuente, lecturas, cantidad) for fuente, (lecturas, cantidad) in totales.items()])
+
+            if puntos_control:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO configuracion (clave, valor, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                ''', [(clave, str(valor)) for clave, valor in puntos_control.items()])
+        return ids
+
+    def marcar_ids(self, ids: List[int]):
+        placeholders = ','.join(['?' for _ in ids])
+        with self._transaccion() as cursor:
+            cursor.execute(f'''
+                UPDATE lecturas_produccion
+                SET sincronizada = TRUE
+                WHERE id IN ({placeholders})
+            ''', ids)
+
+    def marcar_tramo(self, desde_id: int, hasta_id: int) -> int:
+        with self._transaccion() as cursor:
+            cursor.execute('''
+                UPDATE lecturas_produccion
+                SET sincronizada = TRUE
+                WHERE sincronizada = FALSE AND id > ? AND id <= ?
+            ''', (desde_id, hasta_id))
+            return cursor.rowcount
+
+    def guardar_configuracion(self, clave: str, valor: Optional[str]):
+        with self._transaccion() as cursor:
+            if valor is None:
+                cursor.execute('DELETE FROM configuracion WHERE clave = ?', (clave,))
+            else:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO configuracion (clave, valor, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                ''', (clave, str(valor)))
+
+    def guardar_estado(self, estacion_id: str, estado: Dict[str, Any], version: int):
+        with self._transaccion() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO estado_estaciones
+                (estacion_id, estado, orden_actual, contador, meta, ultima_actividad, tiempo_inactivo)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                estacion_id,
+                estado['estado'],
+                estado['orden_actual'],
+                estado['contador'],
+                estado['meta'],
+                estado['ultima_actividad'],
+                estado['tiempo_inactivo']
+            ))
+
+    def eliminar_sincronizadas(self, antes_de: datetime) -> int:
+        with self._transaccion() as cursor:
+            cursor.execute('''
+                DELETE FROM lecturas_produccion
+                WHERE sincronizada = TRUE
+                AND timestamp < ?
+            ''', (antes_de,))
+            return cursor.rowcount
+
+    def eliminar_rollup(self, granularidad: str, antes_de: str) -> int:
+        validar_granularidad(granularidad)
+        with self._transaccion() as cursor:
+            cursor.execute(f'DELETE FROM rollup_{granularidad} WHERE periodo < ?', (antes_de,))
+            return cursor.rowcount
+
+    def pagina_pendientes(self, despues_de: int, tamano: int,
+                          hasta_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lectura() as cursor:
+            cursor.execute('''
+                SELECT id, orden_fabricacion, upc, cantidad, timestamp, fuente, estacion_id
+                FROM lecturas_produccion
+                WHERE sincronizada = FALSE AND id > ? AND id <= ?
+                ORDER BY id
+                LIMIT ?
+            ''', (despues_de, hasta_id if hasta_id is not None else 2 ** 63 - 1, tamano))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def primera_pendiente(self) -> Optional[int]:
+        with self._lectura() as cursor:
+            cursor.execute('SELECT MIN(id) FROM lecturas_produccion WHERE sincronizada = FALSE')
+            return cursor.fetchone()[0]
+
+    def ultima_pendiente(self) -> Optional[int]:
+        with self._lectura() as cursor:
+            cursor.execute('SELECT MAX(id) FROM lecturas_produccion WHERE sincronizada = FALSE')
+            return cursor.fetchone()[0]
+
+    def ultimo_id(self) -> int:
+        with self._lectura() as cursor:
+            cursor.execute('SELECT MAX(id) FROM lecturas_produccion')
+            return cursor.fetchone()[0] or 0
+
+    def contar_pendientes_despues(self, hasta_id: int) -> int:
+        with self._lectura() as cursor:
+            cursor.execute('''
+                SELECT COUNT(*) FROM lecturas_produccion
+                WHERE sincronizada = FALSE AND id > ?
+            ''', (hasta_id,))
+            return cursor.fetchone()[0]
+
+    def obtener_configuracion(self, clave: str) -> Optional[str]:
+        with self._lectura() as cursor:
+            cursor.execute('SELECT valor FROM configuracion WHERE clave = ?', (clave,))
+            row = cursor.fetchone()
+            return row['valor'] if row else None
+
+    def obtener_estado(self, estacion_id: str) -> Optional[Dict[str, Any]]:
+        with self._lectura() as cursor:
+            cursor.execute('''
+                SELECT * FROM estado_estaciones
+                WHERE estacion_id = ?
+            ''', (estacion_id,))
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+        return {
+            'estado': row['estado'],
+            'orden_actual': row['orden_actual'],
+            'contador': row['contador'],
+            'meta': row['meta'],
+            'ultima_actividad': row['ultima_actividad'],
+            'tiempo_inactivo': row['tiempo_inactivo']
+        }
+
+    def obtener_rollup(self, granularidad: str, desde: str, hasta: Optional[str] = None,
+                       estacion_id: Optional[str] = None,
+                       orden: Optional[str] = None) -> List[Dict[str, Any]]:
+        validar_granularidad(granularidad)
+        condiciones = ['periodo >= ?']
+        parametros: List[Any] = [desde]
+        if hasta is not None:
+            condiciones.append('periodo < ?')
+            parametros.append(hasta)
+        if estacion_id is not None:
+            condiciones.append('estacion_id = ?')
+            parametros.append(estacion_id)
+        if orden is not None:
+            condiciones.append('orden_fabricacion = ?')
+            parametros.append(orden)
+
+        # Recorre la clave primaria desde el periodo pedido, sin tocar lecturas
+        with self._lectura() as cursor:
+            cursor.execute(f'''
+                SELECT periodo, orden_fabricacion, estacion_id, fuente, lecturas, cantidad
+                FROM rollup_{granularidad}
+                WHERE {' AND '.join(condiciones)}
+                ORDER BY periodo
+            ''', parametros)
+            filas = [dict(row) for row in cursor.fetchall()]
+
+        for fila in filas:
+            fila['estacion_id'] = fila['estacion_id'] or None
+        return filas
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lectura() as cursor:
+            # Totales acumulados al insertar (sobreviven a la limpieza de lecturas)
+            cursor.execute('SELECT fuente, lecturas FROM totales_fuente')
+            lecturas_por_fuente = dict(cursor.fetchall())
+            total_lecturas = sum(lecturas_por_fuente.values())
+
+            # Lecturas pendientes (solo recorre el índice parcial)
+            cursor.execute('SELECT COUNT(*) FROM lecturas_produccion WHERE sincronizada = FALSE')
+            lecturas_pendientes = cursor.fetchone()[0]
+
+        return {
+            'total_lecturas': total_lecturas,
+            'lecturas_pendientes': lecturas_pendientes,
+            'lecturas_sincronizadas': total_lecturas - lecturas_pendientes,
+            'lecturas_por_fuente': lecturas_por_fuente
+        }
+
+
+class AlmacenSQLiteRedis(AlmacenSQLite):
+    """SQLite con réplica en Redis; si Redis no responde sigue solo con SQLite"""
+
+    nombre = 'sqlite_redis'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.redis_client = None
+
+    def abrir(self):
+        self.conectar_redis()
+        super().abrir()
+
+    def cerrar(self):
+        super().cerrar()
+        if self.redis_client:
+            self.redis_client.close()
+
+    def conectar_redis(self) -> bool:
+        """Conectar la réplica Redis; sin ella el cache sigue solo con SQLite"""
+        try:
+            # Solo este backend necesita redis (no está en requirements_mac.txt)
+            import redis
+
+            cliente = redis.Redis(
+                host=self.config.redis_host,
+                port=self.config.redis_port,
+                password=self.config.redis_password if self.config.redis_password else None,
+                db=self.config.redis_db,
+                decode_responses=True
+            )
+
+            # Verificar conexión Redis
+            cliente.ping()
+            self.redis_client = cliente
+            self.logger.info("✅ Redis conectado")
+            return True
+
+        except Exception as e:
+            self.redis_client = None
+            self.logger.warning(f"⚠️ Redis no disponible, se continúa solo con SQLite: {e}")
+            return False
+
+    def insertar_lecturas(self, lote: List[tuple],
+                          puntos_control: Optional[Dict[str, int]] = None) -> List[int]:
+        ids = super().insertar_lecturas(lote, puntos_control)
+        if not self.redis_client or not ids:
+            return ids
+
+        try:
+            # Replicar en Redis en un solo viaje
+            pipe = self.redis_client.pipeline(transaction=False)
+            for lectura_id, (orden, upc, cantidad, timestamp, fuente, _) in zip(ids, lote):
+                pipe.hset(f"lectura:{lectura_id}", mapping={
+                    'id': lectura_id,
+                    'orden_fabricacion': orden,
+                    'upc': upc,
+                    'cantidad': cantidad,
+                    'timestamp': timestamp.isoformat(),
+                    'fuente': fuente,
+                    'sincronizada': 'false'
+                })
+
+            # Agregar a lista de lecturas pendientes
+            pipe.lpush('lecturas_pendientes', *ids)
+            pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Lote no replicado en Redis: {e}")
+        return ids
+
+    def marcar_ids(self, ids: List[int]):
+        super().marcar_ids(ids)
+        if not self.redis_client:
+            return
+
+        try:
+            # Limpiar de Redis en un solo viaje
+            pipe = self.redis_client.pipeline(transaction=False)
+            for lectura_id in ids:
+                pipe.unlink(f"lectura:{lectura_id}")
+                pipe.lrem('lecturas_pendientes', 0, lectura_id)
+            pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"⚠️ {len(ids)} lecturas sincronizadas no limpiadas en Redis: {e}")
+
+    def limpiar_sincronizadas(self, desde_id: Optional[int], hasta_id: int):
+        if not self.redis_client:
+            return
+
+        # Lecturas que siguen pendientes (llegaron durante la sincronización)
+        restantes = self.contar_pendientes_despues(hasta_id)
+
+        try:
+            # La lista guarda los ids más nuevos al inicio
+            pipe = self.redis_client.pipeline(transaction=False)
+            if desde_id is not None:
+                ids = range(desde_id, hasta_id + 1)
+                for inicio in range(0, len(ids), 1000):
+                    pipe.unlink(*[f"lectura:{i}" for i in ids[inicio:inicio + 1000]])
+            if restantes:
+                pipe.ltrim('lecturas_pendientes', 0, restantes - 1)
+            else:
+                pipe.delete('lecturas_pendientes')
+            pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Lecturas hasta {hasta_id} no limpiadas en Redis: {e}")
+
+    def guardar_estado(self, estacion_id: str, estado: Dict[str, Any], version: int):
+        super().guardar_estado(estacion_id, estado, version)
+        if not self.redis_client:
+            return
+
+        try:
+            # Réplica para otros procesos; el proceso propio lee de memoria
+            self.redis_client.hset(f"estacion:{estacion_id}", mapping={
+                'estado': estado['estado'],
+                'orden_actual': estado['orden_actual'] or '',
+                'contador': estado['contador'],
+                'meta': estado['meta'],
+                'ultima_actividad': estado['ultima_actividad'] or '',
+                'tiempo_inactivo': estado['tiempo_inactivo'],
+                'version': version
+            })
+        except Exception as e:
+            self.logger.warning(f"⚠️ Estado de {estacion_id} no replicado en Redis: {e}")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        estadisticas = super().estadisticas()
+        estadisticas['redis'] = self.redis_client is not None
+        return estadisticas
+
+
+class AlmacenMemoria(AlmacenCache):
+    """Todo en memoria del proceso; se pierde al cerrar"""
+
+    nombre = 'memoria'
+
+    def __init__(self, config=None):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self._lecturas: Dict[int, Dict[str, Any]] = {}
+        self._pendientes: List[int] = []
+        self._ultimo_id = 0
+        self._configuracion: Dict[str, str] = {}
+        self._estados: Dict[str, Dict[str, Any]] = {}
+        self._rollups = {granularidad: {} for granularidad in GRANULARIDADES}
+        self._totales: Dict[str, int] = {}
+
+    def abrir(self):
+        self.logger.info("✅ Almacén en memoria inicializado")
+
+    def cerrar(self):
+        pass
+
+    def insertar_lecturas(self, lote: List[tuple],
+                          puntos_control: Optional[Dict[str, int]] = None) -> List[int]:
+        ids = []
+        with self.lock:
+            for orden, upc, cantidad, timestamp, fuente, estacion_id in lote:
+                self._ultimo_id += 1
+                self._lecturas[self._ultimo_id] = {
+                    'id': self._ultimo_id,
+                    'orden_fabricacion': orden,
+                    'upc': upc,
+                    'cantidad': cantidad,
+                    # Mismo formato que el adaptador de sqlite3
+                    'timestamp': timestamp.isoformat(' '),
+                    'fuente': fuente,
+                    'estacion_id': estacion_id,
+                    'sincronizada': False
+                }
+                ids.append(self._ultimo_id)
+            # Los ids crecen, así que la lista de pendientes sigue ordenada
+            self._pendientes.extend(ids)
+
+            for granularidad, grupos in agrupar_lote(lote).items():
+                rollup = self._rollups[granularidad]
+                for clave, (lecturas, cantidad) in grupos.items():
+                    acumulado = rollup.setdefault(clave, [0, 0])
+                    acumulado[0] += lecturas
+                    acumulado[1] += cantidad
+            for fila in lote:
+                self._totales[fila[4]] = self._totales.get(fila[4], 0) + 1
+            for clave, valor in (puntos_control or {}).items():
+                self._configuracion[clave] = str(valor)
+        return ids
+
+    def marcar_ids(self, ids: List[int]):
+        with self.lock:
+            marcar = set(ids)
+            for lectura_id in marcar:
+                if lectura_id in self._lecturas:
+                    self._lecturas[lectura_id]['sincronizada'] = True
+            self._pendientes = [i for i in self._pendientes if i not in marcar]
+
+    def marcar_tramo(self, desde_id: int, hasta_id: int) -> int:
+        with self.lock:
+            inicio = bisect_right(self._pendientes, desde_id)
+            fin = bisect_right(self._pendientes, hasta_id)
+            for lectura_id in self._pendientes[inicio:fin]:
+                self._lecturas[lectura_id]['sincronizada'] = True
+            del self._pendientes[inicio:fin]
+            return fin - inicio
+
+    def guardar_configuracion(self, clave: str, valor: Optional[str]):
+        with self.lock:
+            if valor is None:
+                self._configuracion.pop(clave, None)
+            else:
+                self._configuracion[clave] = str(valor)
+
+    def guardar_estado(self, estacion_id: str, estado: Dict[str, Any], version: int):
+        with self.lock:
+            self._estados[estacion_id] = dict(estado)
+
+    def eliminar_sincronizadas(self, antes_de: datetime) -> int:
+        limite = antes_de.isoformat(' ')
+        with self.lock:
+            viejas = [i for i, l in self._lecturas.items() if l['sincronizada'] and l['timestamp'] < limite]
+            for lectura_id in viejas:
+                del self._lecturas[lectura_id]
+            return len(viejas)
+
+    def eliminar_rollup(self, granularidad: str, antes_de: str) -> int:
+        validar_granularidad(granularidad)
+        with self.lock:
+            rollup = self._rollups[granularidad]
+            viejas = [clave for clave in rollup if clave[0] < antes_de]
+            for clave in viejas:
+                del rollup[clave]
+            return len(viejas)
+
+    def pagina_pendientes(self, despues_de: int, tamano: int,
+                          hasta_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            inicio = bisect_right(self._pendientes, despues_de)
+            fin = len(self._pendientes) if hasta_id is None else bisect_right(self._pendientes, hasta_id)
+            return [
+                {k: v for k, v in self._lecturas[i].items() if k != 'sincronizada'}
+                for i in self._pendientes[inicio:min(fin, inicio + tamano)]
+            ]
+
+    def primera_pendiente(self) -> Optional[int]:
+        with self.lock:
+            return self._pendientes[0] if self._pendientes else None
+
+    def ultima_pendiente(self) -> Optional[int]:
+        with self.lock:
+            return self._pendientes[-1] if self._pendientes else None
+
+    def ultimo_id(self) -> int:
+        return self._ultimo_id
+
+    def contar_pendientes_despues(self, hasta_id: int) -> int:
+        with self.lock:
+            return len(self._pendientes) - bisect_left(self._pendientes, hasta_id + 1)
+
+    def obtener_configuracion(self, clave: str) -> Optional[str]:
+        return self._configuracion.get(clave)
+
+    def obtener_estado(self, estacion_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            estado = self._estados.get(estacion_id)
+            return dict(estado) if estado else None
+
+    def obtener_rollup(self, granularidad: str, desde: str, hasta: Optional[str] = None,
+                       estacion_id: Optional[str] = None,
+                       orden: Optional[str] = None) -> List[Dict[str, Any]]:
+        validar_granularidad(granularidad)
+        with self.lock:
+            filas = [
+                {
+                    'periodo': periodo,
+                    'orden_fabricacion': orden_fila,
+                    'estacion_id': estacion_fila or None,
+                    'fuente': fuente,
+                    'lecturas': lecturas,
+                    'cantidad': cantidad
+                }
+                for (periodo, orden_fila, estacion_fila, fuente), (lecturas, cantidad)
+                in self._rollups[granularidad].items()
+                if periodo >= desde and (hasta is None or periodo < hasta)
+                and (estacion_id is None or estacion_fila == estacion_id)
+                and (orden is None or orden_fila == orden)
+            ]
+        filas.sort(key=lambda fila: fila['periodo'])
+        return filas
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self.lock:
+            lecturas_por_fuente = dict(self._totales)
+            total_lecturas = sum(lecturas_por_fuente.values())
+            lecturas_pendientes = len(self._pendientes)
+
+        return {
+            'total_lecturas': total_lecturas,
+            'lecturas_pendientes': lecturas_pendientes,
+            'lecturas_sincronizadas': total_lecturas - lecturas_pendientes,
+            'lecturas_por_fuente': lecturas_por_fuente
+        }
+
+
+ALMACENES = {
+    AlmacenSQLite.nombre: AlmacenSQLite,
+    AlmacenSQLiteRedis.nombre: AlmacenSQLiteRedis,
+    AlmacenMemoria.nombre: AlmacenMemoria
+}
+
+
+def crear_almacen(config) -> AlmacenCache:
+    """Crear el backend indicado en cache.backend"""
+    backend = config.cache_backend
+    if backend not in ALMACENES:
+        raise ValueError(f"Backend de cache desconocido: {backend} (opciones: {', '.join(ALMACENES)})")
+    return ALMACENES[backend](config)
@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Pipeline - RS485 → ingesta → cache → sincronización SISPRO
+
+Alimenta un flujo sintético o grabado de tramas ID:TAG:VAL por el mismo
+camino que en producción (parser de MonitorRS485, procesar_rs485,
+CacheManager y sincronizar_lecturas) contra un servidor SISPRO local y
+reporta tramas/s, percentiles de latencia, amplificación de escritura de
+SQLite y memoria. Redis es opcional, igual que en el monitor.
+
+Uso:
+    python benchmark_pipeline.py --estaciones 8 --piezas-minuto 120 --duracion 30
+    python benchmark_pipeline.py --estaciones 32 --velocidad 0      # máximo throughput
+    python benchmark_pipeline.py --grabacion captura.log           # líneas [segundos] ID:TAG:VAL
+    python benchmark_pipeline.py --pty --maestro --duracion 60     # bus simulado (simulador_bus.py)
+    python benchmark_pipeline.py --backend memoria                 # comparar backends del cache
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Tuple, Iterator, Optional
+
+from protocolo_rs485 import codificar_trama
+from cache_manager import CacheManager, _PuntoControl
+from almacenes_cache import ALMACENES
+from estado_manager import EstadoSistema
+from main import MonitorIndustrial
+from maestro_rs485 import MaestroRS485
+from simulador_bus import SimuladorBus
+
+INTERVALO_HEARTBEAT = 30.0
+
+
+class ServidorSISPROStub:
+    """Servidor HTTP local que responde como SISPRO y cuenta lo recibido"""
+
+    def __init__(self):
+        self.peticiones = 0
+        self.bytes_recibidos = 0
+        self.lecturas_recibidas = 0
+        self.piezas_recibidas = 0
+        self.lock = threading.Lock()
+        self.servidor = None
+        self.hilo = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self.servidor.server_address
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self):
+        stub = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _responder(self, data: Any):
+                cuerpo = json.dumps({'success': True, 'data': data}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.peticiones += 1
+                if self.path.startswith('/api/ordenesDeFabricacion/avance'):
+                    self._responder({'avance': 0, 'cantidadPendiente': 0})
+                else:
+                    self._responder([])
+
+            def do_POST(self):
+                largo = int(self.headers.get('Content-Length', 0))
+                cuerpo = self.rfile.read(largo)
+                with stub.lock:
+                    stub.peticiones += 1
+                    stub.bytes_recibidos += largo
+                    if self.path.startswith('/api/lecturaUPC/registrarLote'):
+                        lecturas = json.loads(cuerpo).get('lecturas', [])
+                        stub.lecturas_recibidas += len(lecturas)
+                        stub.piezas_recibidas += sum(l.get('cantidad', 0) for l in lecturas)
+                self._responder({})
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self.hilo.start()
+
+    def detener(self):
+        if self.servidor:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+
+
+class CacheMedido(CacheManager):
+    """CacheManager que registra cuándo cada lectura queda persistida"""
+
+    def __init__(self, config, medicion: 'Medicion'):
+        super().__init__(config)
+        self.medicion = medicion
+
+    def _guardar_lote(self, lote: List[tuple]):
+        super()._guardar_lote(lote)
+        self.medicion.registrar_persistidas(lote)
+
+
+class Medicion:
+    """Tiempos y contadores del recorrido de cada trama"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enviadas: Dict[Tuple[str, int], float] = {}
+        self.tramas = 0
+        self.bytes_enviados = 0
+        self.mensajes = 0
+
+        # Lecturas guardadas, en el mismo orden en que entran a la cola del cache
+        self._en_cola = deque()
+        self.latencia_procesado: List[float] = []
+        self.latencia_persistido: List[float] = []
+        self.filas = 0
+        self.bytes_logicos = 0
+        self.sincronizaciones: List[float] = []
+
+    def registrar_envio(self, device_id: str, cont: Optional[int], tamano: int):
+        with self.lock:
+            self.tramas += 1
+            self.bytes_enviados += tamano
+            if cont is not None:
+                self.enviadas[(device_id, cont)] = time.perf_counter()
+
+    def registrar_procesado(self, device_id: str, cont: int, guardada: bool):
+        ahora = time.perf_counter()
+        with self.lock:
+            enviada = self.enviadas.pop((device_id, cont), None)
+            if enviada is None:
+                return
+            self.latencia_procesado.append(ahora - enviada)
+            if guardada:
+                self._en_cola.append(enviada)
+
+    def registrar_persistidas(self, lote: List[tuple]):
+        ahora = time.perf_counter()
+        with self.lock:
+            for fila in lote:
+                if isinstance(fila, _PuntoControl):
+                    continue
+                self.filas += 1
+                self.bytes_logicos += sum(len(str(campo)) for campo in fila[:6])
+                if self._en_cola:
+                    self.latencia_persistido.append(ahora - self._en_cola.popleft())
+
+
+def percentiles(valores: List[float]) -> Dict[str, float]:
+    """Percentiles en milisegundos"""
+    if not valores:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordenados = sorted(valores)
+
+    def p(q: float) -> float:
+        return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000
+
+    return {'p50': p(0.50), 'p95': p(0.95), 'p99': p(0.99), 'max': ordenados[-1] * 1000}
+
+
+def leer_io() -> Dict[str, int]:
+    """Contadores de E/S del proceso (Linux)"""
+    try:
+        with open('/proc/self/io') as f:
+            return {k: int(v) for k, v in (linea.split(':') for linea in f)}
+    except OSError:
+        return {}
+
+
+def leer_memoria() -> Dict[str, int]:
+    """Memoria residente actual y pico en KB (Linux)"""
+    memoria = {}
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith(('VmRSS:', 'VmHWM:')):
+                    clave, valor = linea.split(':')
+                    memoria[clave] = int(valor.split()[0])
+    except OSError:
+        import resource
+        memoria['VmHWM'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memoria
+
+
+def codificar(device_id: str, seq: int, campos: List[Tuple[str, int]], binario: bool) -> bytes:
+    """Codificar una transmisión del Pico como trama binaria o líneas de texto"""
+    if binario:
+        return codificar_trama(device_id, seq, campos)
+    lineas = []
+    for tag, valor in campos:
+        if tag == 'CONT' and seq:
+            lineas.append(f"{device_id}:{tag}:{valor}:{seq}\n")
+        else:
+            lineas.append(f"{device_id}:{tag}:{valor}\n")
+    return ''.join(lineas).encode('utf-8')
+
+
+def flujo_sintetico(estaciones: int, piezas_minuto: float, duracion: float,
+                    semilla: int = 1) -> Iterator[Tuple[float, str, List[Tuple[str, int]]]]:
+    """Generar (segundo, estación, campos) como los enviaría cada Pico"""
+    aleatorio = random.Random(semilla)
+    eventos = []
+    for n in range(estaciones):
+        device_id = f"P{n:02d}"
+        contador = 0
+        t = aleatorio.uniform(0, 60.0 / piezas_minuto)
+        while t < duracion:
+            contador += 1
+            eventos.append((t, device_id, [
+                ('CONT', contador), ('TOTAL', contador), ('META', 0), ('ESTADO', 1), ('LOG', contador)
+            ]))
+            t += aleatorio.expovariate(piezas_minuto / 60.0)
+
+        t = aleatorio.uniform(0, INTERVALO_HEARTBEAT)
+        while t < duracion:
+            # El contador del heartbeat se completa al ordenar los eventos
+            eventos.append((t, device_id, [('HEARTBEAT', int(t)), ('CONT', None)]))
+            t += INTERVALO_HEARTBEAT
+
+    eventos.sort(key=lambda e: e[0])
+    contadores: Dict[str, int] = {}
+    for t, device_id, campos in eventos:
+        if campos[0][0] == 'CONT':
+            contadores[device_id] = campos[0][1]
+        else:
+            cont = contadores.get(device_id, 0)
+            campos = [('HEARTBEAT', campos[0][1]), ('CONT', cont), ('TOTAL', cont),
+                      ('META', 0), ('ESTADO', 1), ('LOG', cont), ('INACTIVO', 0)]
+        yield t, device_id, campos
+
+
+def flujo_grabado(ruta: str) -> Iterator[Tuple[float, str, List[Tuple[str, int]]]]:
+    """Leer una captura con líneas '[segundos] ID:TAG:VAL'"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        t = 0.0
+        for linea in f:
+            partes = linea.split()
+            if not partes:
+                continue
+            if len(partes) > 1:
+                t = float(partes[0])
+            campos = partes[-1].split(':')
+            if len(campos) < 3:
+                continue
+            try:
+                yield t, campos[0], [(campos[1], int(campos[2]))]
+            except ValueError:
+                continue
+
+
+class BenchmarkPipeline:
+    def __init__(self, args):
+        self.args = args
+        self.logger = logging.getLogger(__name__)
+        self.medicion = Medicion()
+        self.stub = ServidorSISPROStub()
+        self.directorio = tempfile.mkdtemp(prefix='bench_sispro_')
+        self.monitor = None
+        self.bus = None
+        self.corriendo = False
+
+    def preparar(self):
+        """Armar el monitor sin interfaz ni puerto serie, con SQLite temporal"""
+        self.stub.iniciar()
+
+        # Logs y base de datos del monitor quedan en el directorio temporal
+        self.directorio_original = os.getcwd()
+        os.chdir(self.directorio)
+
+        # MonitorIndustrial agrega handlers al logger raíz (uno escribe en logs/ de
+        # este directorio): se quitan en cerrar() antes de borrarlo
+        self.handlers_originales = list(logging.getLogger().handlers)
+        self.monitor = MonitorIndustrial()
+        self.monitor.config.config_file = os.path.join(self.directorio, 'config.json')
+        self.monitor.config.config['rs485']['protocolo'] = 'binario' if self.args.binario else 'texto'
+        if self.args.backend:
+            self.monitor.config.config['cache']['backend'] = self.args.backend
+        self.monitor.sispro.base_url = self.stub.url
+        self.monitor.cache = CacheMedido(self.monitor.config, self.medicion)
+        self.monitor.ingesta.cache = self.monitor.cache
+        logging.getLogger().setLevel(self.args.log_nivel)
+
+        self.monitor.cache.inicializar()
+        self.monitor.sispro.conectar()
+
+        # Orden en producción como si el operador ya hubiera validado el UPC
+        self.monitor.estacion_actual = {'id': 1, 'nombre': 'BENCH'}
+        self.monitor.orden_actual = {'ordenFabricacion': 'OF-BENCH', 'ptUPC': '7500000000000', 'cantidadFabricar': 0}
+        self.monitor.upc_validado = '7500000000000'
+        self.monitor.estado.cambiar_estado(EstadoSistema.PRODUCIENDO)
+
+        self.monitor.rs485.agregar_callback(self.monitor.procesar_rs485)
+        self.monitor.rs485.agregar_callback(self._medir_mensaje)
+        self._acumulado = self.monitor.lecturas_acumuladas
+
+    def _medir_mensaje(self, mensaje: str):
+        """Callback posterior a procesar_rs485: marca la trama como procesada"""
+        self.medicion.mensajes += 1
+        partes = mensaje.split(':')
+        if len(partes) != 3 or partes[1] != 'CONT':
+            return
+        guardada = self.monitor.lecturas_acumuladas != self._acumulado
+        self._acumulado = self.monitor.lecturas_acumuladas
+        self.medicion.registrar_procesado(partes[0], int(partes[2]), guardada)
+
+    def _sincronizar(self):
+        """Sincronizar periódicamente como sincronizar_periodicamente"""
+        while self.corriendo:
+            time.sleep(self.args.sync_intervalo)
+            self._sincronizar_una_vez()
+
+    def _sincronizar_una_vez(self):
+        inicio = time.perf_counter()
+        self.monitor.sincronizar_lecturas()
+        self.medicion.sincronizaciones.append(time.perf_counter() - inicio)
+
+    def _alimentar(self, datos: bytes):
+        """Entregar bytes al parser y despachar lo decodificado"""
+        rs485 = self.monitor.rs485
+        rs485._agregar_bytes(datos)
+        mensaje = rs485._siguiente_mensaje()
+        while mensaje:
+            rs485._despachar(mensaje)
+            mensaje = rs485._siguiente_mensaje()
+
+    def _enviar_flujo(self, inicio: float) -> Tuple[int, int]:
+        """Alimentar el parser con el flujo sintético o grabado; retorna (estaciones, piezas esperadas)"""
+        args = self.args
+        if args.grabacion:
+            flujo = flujo_grabado(args.grabacion)
+        else:
+            flujo = flujo_sintetico(args.estaciones, args.piezas_minuto, args.duracion, args.semilla)
+
+        secuencias: Dict[str, int] = {}
+        primer_cont: Dict[str, int] = {}
+        ultimo_cont: Dict[str, int] = {}
+        for t, device_id, campos in flujo:
+            if args.velocidad > 0:
+                espera = t / args.velocidad - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+
+            cont = next((valor for tag, valor in campos if tag == 'CONT'), None)
+            seq = 0
+            if cont is not None:
+                primer_cont.setdefault(device_id, cont)
+                ultimo_cont[device_id] = cont
+                seq = secuencias.get(device_id, 0) % 65535 + 1
+                secuencias[device_id] = seq
+            datos = codificar(device_id, seq, campos, args.binario)
+
+            self.medicion.registrar_envio(device_id, cont, len(datos))
+            self._alimentar(datos)
+
+        # La primera lectura de cada estación solo fija la base del contador
+        piezas = sum(ultimo_cont[d] - primer_cont[d] for d in ultimo_cont)
+        return len(secuencias) if args.grabacion else args.estaciones, piezas
+
+    def _enviar_pty(self) -> Tuple[int, int]:
+        """Correr el monitor contra el bus simulado durante la duración indicada"""
+        args = self.args
+        base: Dict[str, int] = {}
+        ultimo_cont: Dict[str, int] = {}
+
+        def al_transmitir(device_id: str, campos: List[Tuple[str, int]], intacta: bool):
+            valores = dict(campos)
+            cont = valores.get('CONT')
+            if intacta and device_id not in base:
+                # RESET:0 del arranque o, si chocó, la primera lectura que llega fija la base
+                if 'RESET' in valores:
+                    base[device_id] = valores['RESET']
+                elif cont is not None:
+                    base[device_id] = cont
+            if cont is not None:
+                ultimo_cont[device_id] = max(cont, ultimo_cont.get(device_id, 0))
+            self.medicion.registrar_envio(device_id, cont, 0)
+
+        self.bus = SimuladorBus(args.estaciones, args.piezas_minuto, args.baudrate, ruido=args.ruido,
+                                truncadas=args.truncadas, semilla=args.semilla,
+                                al_transmitir=al_transmitir)
+        self.bus.iniciar()
+
+        rs485 = self.monitor.rs485
+        rs485.port = self.bus.puerto
+        rs485.baudrate = args.baudrate
+        rs485.timeout = 0.05
+        if not rs485.conectar():
+            raise RuntimeError(f"No se pudo abrir el bus simulado {self.bus.puerto}")
+        threading.Thread(target=rs485.procesar_mensajes, daemon=True).start()
+
+        maestro = None
+        if args.maestro:
+            maestro = MaestroRS485(self.monitor.config, rs485)
+            for estacion in self.bus.estaciones:
+                maestro.registrar_dispositivo(estacion.device_id)
+            threading.Thread(target=maestro.ejecutar, daemon=True).start()
+
+        time.sleep(args.duracion)
+
+        # Dejar de sondear y dar tiempo a que lleguen las últimas tramas y reenvíos
+        if maestro:
+            maestro.detener()
+        time.sleep(1.0)
+        rs485.desconectar()
+        self.bus.detener()
+
+        self.medicion.bytes_enviados = self.bus.estadisticas['bytes']
+        return args.estaciones, sum(ultimo_cont[d] - base.get(d, ultimo_cont[d]) for d in ultimo_cont)
+
+    def ejecutar(self) -> Dict[str, Any]:
+        args = self.args
+        sqlite_file = self.monitor.config.sqlite_file
+        io_inicial = leer_io()
+        memoria_inicial = leer_memoria()
+
+        self.corriendo = True
+        hilo_sync = threading.Thread(target=self._sincronizar, daemon=True)
+        hilo_sync.start()
+
+        inicio = time.perf_counter()
+        if args.pty:
+            estaciones, piezas_esperadas = self._enviar_pty()
+        else:
+            estaciones, piezas_esperadas = self._enviar_flujo(inicio)
+        duracion_envio = time.perf_counter() - inicio
+
+        # Drenar escrituras pendientes y hacer la última sincronización
+        self.corriendo = False
+        self.monitor.cache.vaciar_cola()
+        duracion_persistido = time.perf_counter() - inicio
+        self._sincronizar_una_vez()
+
+        io_final = leer_io()
+        memoria_final = leer_memoria()
+        tamano_sqlite = sum(
+            os.path.getsize(ruta) for ruta in (sqlite_file, f"{sqlite_file}-wal")
+            if os.path.exists(ruta)
+        )
+
+        m = self.medicion
+        escritos = io_final.get('write_bytes', 0) - io_inicial.get('write_bytes', 0)
+        if escritos <= 0:
+            # Sin contabilidad de bloques (p. ej. contenedores): usar bytes escritos por syscalls
+            escritos = io_final.get('wchar', 0) - io_inicial.get('wchar', 0)
+
+        resultados = {
+            'estaciones': estaciones,
+            'protocolo': 'binario' if args.binario else 'texto',
+            'backend': self.monitor.cache.almacen.nombre,
+            'duracion_s': round(duracion_envio, 3),
+            'tramas': m.tramas,
+            'tramas_por_segundo': round(m.tramas / max(duracion_envio, 1e-9), 1),
+            'mensajes_por_segundo': round(m.mensajes / max(duracion_envio, 1e-9), 1),
+            'bytes_bus': m.bytes_enviados,
+            'filas_sqlite': m.filas,
+            'filas_por_segundo': round(m.filas / max(duracion_persistido, 1e-9), 1),
+            'latencia_rs485_procesado_ms': percentiles(m.latencia_procesado),
+            'latencia_rs485_sqlite_ms': percentiles(m.latencia_persistido),
+            'sincronizacion_ms': percentiles(m.sincronizaciones),
+            'sqlite_bytes': tamano_sqlite,
+            'bytes_logicos': m.bytes_logicos,
+            'bytes_escritos': escritos,
+            'amplificacion_escritura': round(escritos / m.bytes_logicos, 2) if m.bytes_logicos else 0,
+            'memoria_rss_kb': memoria_final.get('VmRSS', 0),
+            'memoria_pico_kb': memoria_final.get('VmHWM', 0),
+            'memoria_crecimiento_kb': memoria_final.get('VmRSS', 0) - memoria_inicial.get('VmRSS', 0),
+            'peticiones_sispro': self.stub.peticiones,
+            'lecturas_sispro': self.stub.lecturas_recibidas,
+            'piezas_sispro': self.stub.piezas_recibidas,
+            'piezas_esperadas': piezas_esperadas,
+            'tramas_invalidas': self.monitor.rs485.tramas_invalidas
+        }
+        if self.bus:
+            resultados['bus'] = self.bus.obtener_estadisticas()
+            resultados['secuencias'] = self._totales_secuencia()
+        return resultados
+
+    def _totales_secuencia(self) -> Dict[str, int]:
+        """Sumar huecos, reenvíos y pérdidas de todas las estaciones"""
+        totales: Dict[str, int] = {}
+        for estadisticas in self.monitor.rs485.secuencias.obtener_estadisticas().values():
+            for clave, valor in estadisticas.items():
+                totales[clave] = totales.get(clave, 0) + valor
+        return totales
+
+    def cerrar(self):
+        try:
+            if self.bus:
+                self.bus.detener()
+            if self.monitor:
+                self.monitor.sispro.desconectar()
+                self.monitor.cache.cerrar()
+            self.stub.detener()
+        finally:
+            self._quitar_handlers()
+            os.chdir(getattr(self, 'directorio_original', os.getcwd()))
+            if not self.args.conservar:
+                shutil.rmtree(self.directorio, ignore_errors=True)
+
+    def _quitar_handlers(self):
+        """Cerrar los handlers de logging que instaló el monitor"""
+        raiz = logging.getLogger()
+        originales = getattr(self, 'handlers_originales', None)
+        if originales is None:
+            return
+        for handler in list(raiz.handlers):
+            if handler not in originales:
+                raiz.removeHandler(handler)
+                handler.close()
+
+
+def imprimir_resultados(r: Dict[str, Any]):
+    """Mostrar resultados en formato legible"""
+    print("\n=== Benchmark del pipeline RS485 → cache → SISPRO ===")
+    print(f"Estaciones:            {r['estaciones']} ({r['protocolo']}, cache {r['backend']})")
+    print(f"Duración:              {r['duracion_s']} s")
+    print(f"Tramas:                {r['tramas']} ({r['tramas_por_segundo']}/s, {r['bytes_bus']} bytes)")
+    print(f"Mensajes despachados:  {r['mensajes_por_segundo']}/s")
+    print(f"Filas SQLite:          {r['filas_sqlite']} ({r['filas_por_segundo']}/s)")
+    for clave, titulo in (('latencia_rs485_procesado_ms', 'RS485 → procesado'),
+                          ('latencia_rs485_sqlite_ms', 'RS485 → SQLite'),
+                          ('sincronizacion_ms', 'Sincronización')):
+        p = r[clave]
+        print(f"{titulo + ':':<23}p50 {p['p50']:.2f} ms  p95 {p['p95']:.2f} ms  "
+              f"p99 {p['p99']:.2f} ms  max {p['max']:.2f} ms")
+    print(f"SQLite en disco:       {r['sqlite_bytes']} bytes")
+    print(f"Amplificación escrit.: {r['amplificacion_escritura']}x "
+          f"({r['bytes_escritos']} escritos / {r['bytes_logicos']} lógicos)")
+    print(f"Memoria:               RSS {r['memoria_rss_kb']} KB, pico {r['memoria_pico_kb']} KB, "
+          f"crecimiento {r['memoria_crecimiento_kb']} KB")
+    print(f"SISPRO:                {r['peticiones_sispro']} peticiones, {r['lecturas_sispro']} registros, "
+          f"{r['piezas_sispro']} de {r['piezas_esperadas']} piezas")
+    print(f"Tramas inválidas:      {r['tramas_invalidas']}")
+    if 'bus' in r:
+        b, sec = r['bus'], r['secuencias']
+        print(f"Bus simulado:          {b['colisiones']} colisiones, {b['con_ruido']} con ruido, "
+              f"{b['truncadas']} truncadas, {b['comandos_perdidos']} comandos perdidos")
+        print(f"Secuencias:            {sec.get('huecos', 0)} huecos, {sec.get('recuperadas', 0)} recuperadas, "
+              f"{sec.get('perdidas', 0)} perdidas, {sec.get('reenvios_solicitados', 0)} reenvíos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline RS485 → cache → SISPRO")
+    parser.add_argument('--estaciones', type=int, default=4, help="Estaciones Pico simuladas")
+    parser.add_argument('--piezas-minuto', type=float, default=60, help="Piezas por minuto por estación")
+    parser.add_argument('--duracion', type=float, default=60, help="Segundos de producción simulada")
+    parser.add_argument('--velocidad', type=float, default=0,
+                        help="Factor de tiempo real (1 = tiempo real, 0 = lo más rápido posible)")
+    parser.add_argument('--texto', dest='binario', action='store_false', help="Usar protocolo de texto")
+    parser.add_argument('--grabacion', help="Reproducir una captura '[segundos] ID:TAG:VAL'")
+    parser.add_argument('--pty', action='store_true',
+                        help="Usar el bus simulado sobre pseudo-terminal (tiempo real, --duracion segundos)")
+    parser.add_argument('--maestro', action='store_true', help="Con --pty: sondear las estaciones")
+    parser.add_argument('--baudrate', type=int, default=115200, help="Con --pty: velocidad del bus")
+    parser.add_argument('--ruido', type=float, default=0.0, help="Con --pty: probabilidad de error por byte")
+    parser.add_argument('--truncadas', type=float, default=0.0, help="Con --pty: probabilidad de trama truncada")
+    parser.add_argument('--backend', choices=sorted(ALMACENES),
+                        help="Backend del cache (por defecto el de config.json)")
+    parser.add_argument('--sync-intervalo', type=float, default=5, help="Segundos entre sincronizaciones")
+    parser.add_argument('--semilla', type=int, default=1, help="Semilla del flujo sintético")
+    parser.add_argument('--json', action='store_true', help="Imprimir resultados en JSON")
+    parser.add_argument('--conservar', action='store_true', help="No borrar el directorio temporal")
+    parser.add_argument('--log-nivel', default='WARNING', help="Nivel de log del monitor durante la prueba")
+    args = parser.parse_args()
+
+    benchmark = BenchmarkPipeline(args)
+    try:
+        benchmark.preparar()
+        resultados = benchmark.ejecutar()
+    finally:
+        benchmark.cerrar()
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    else:
+        imprimir_resultados(resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,311 +1,458 @@
 #!/usr/bin/env python3
 """
-Gestor de Cache - Redis + SQLite
+Gestor de Cache - Escritura diferida sobre un backend configurable
+
+El almacenamiento lo resuelve un backend de almacenes_cache.py según
+cache.backend: "sqlite", "sqlite_redis" (réplica Redis opcional) o
+"memoria". Los rollups por minuto y por hora se consultan con
+obtener_rollup; las lecturas por minuto recientes se sirven de memoria.
 """
 
-import redis
-import sqlite3
-import json
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Callable, NamedTuple, Tuple
 import threading
+import time
+from queue import Queue, Empty
+
+from almacenes_cache import crear_almacen, GRANULARIDADES
+from estado_memoria import EstadoMemoria
+
+class _TareaEscritura:
+    """Escritura encolada para el hilo escritor, con su resultado"""
+
+    def __init__(self, funcion: Callable, args: tuple):
+        self.funcion = funcion
+        self.args = args
+        self.hecha = threading.Event()
+        self.resultado = None
+        self.error = None
+
+class _PuntoControl(NamedTuple):
+    """Valor de configuración que se escribe en la transacción del lote"""
+    clave: str
+    valor: int
 
 class CacheManager:
+    # Cada cuánto el hilo escritor aplica la retención de lecturas y rollups
+    INTERVALO_RETENCION = 3600.0
+
     def __init__(self, config):
         self.config = config
-        self.redis_client = None
-        self.sqlite_conn = None
         self.logger = logging.getLogger(__name__)
-        self.lock = threading.Lock()
+        self.almacen = crear_almacen(config)
+
+        # Escritura diferida: las lecturas se agrupan en una transaccion
+        # cada flush_intervalo_ms o cada flush_max_lecturas. Solo el hilo
+        # escritor escribe en el almacén; el resto de escrituras se le encolan
+        self.flush_intervalo = config.flush_intervalo_ms / 1000.0
+        self.flush_max_lecturas = config.flush_max_lecturas
+        self._cola_escritura = Queue()
+        self._hilo_escritor = None
+        self._escribiendo = False
+
+        # Lecturas pendientes se recorren por páginas de id; todo id <= marca
+        # ya está sincronizado, así que el recorrido empieza después de ella
+        self.tamano_pagina = config.tamano_pagina_pendientes
+        self.marca_sincronizadas = 0
+
+        # Estado de estaciones servido desde memoria; el almacén es la réplica
+        self.estados = EstadoMemoria(config.estado_ttl_segundos, config.estado_max_estaciones)
+
+        # Lecturas y cantidad de los últimos minutos por estación:
+        # periodo -> estacion_id en texto ('' sin estación) -> [lecturas, cantidad].
+        # Solo el hilo escritor lo modifica; la interfaz lo lee bajo el lock
+        self._minutos_recientes: Dict[str, Dict[str, List[int]]] = {}
+        self._lock_minutos = threading.Lock()
+        self._proxima_retencion = 0.0
 
     def inicializar(self):
-        """Inicializar cache Redis y SQLite"""
+        """Inicializar el almacén e iniciar el escritor de lotes"""
         try:
-            # Conectar a Redis
-            self.redis_client = redis.Redis(
-                host=self.config.redis_host,
-                port=self.config.redis_port,
-                password=self.config.redis_password if self.config.redis_password else None,
-                db=self.config.redis_db,
-                decode_responses=True
-            )
+            self.almacen.abrir()
+            self.marca_sincronizadas = int(self.almacen.obtener_configuracion('marca_sincronizadas') or 0)
+            self._cargar_minutos_recientes()
+            self.logger.info(f"✅ Cache inicializado (backend {self.almacen.nombre})")
 
-            # Verificar conexión Redis
-            self.redis_client.ping()
-            self.logger.info("✅ Redis conectado")
-
-            # Inicializar SQLite
-            self.sqlite_conn = sqlite3.connect(
-                self.config.sqlite_file,
-                check_same_thread=False
-            )
-            self.sqlite_conn.row_factory = sqlite3.Row
-
-            # Crear tablas si no existen
-            self.crear_tablas()
-            self.logger.info("✅ SQLite inicializado")
+            # Iniciar escritor de lotes
+            self._escribiendo = True
+            self._hilo_escritor = threading.Thread(target=self._escribir_lotes, daemon=True)
+            self._hilo_escritor.start()
 
         except Exception as e:
             self.logger.error(f"❌ Error inicializando cache: {e}")
             raise
 
-    def crear_tablas(self):
-        """Crear tablas de SQLite si no existen"""
+    def _cargar_minutos_recientes(self):
+        """Poblar los minutos recientes desde el rollup al arrancar"""
+        desde = (datetime.now() - timedelta(minutes=1)).strftime(GRANULARIDADES['minuto'])
+        filas = self.almacen.obtener_rollup('minuto', desde)
+        with self._lock_minutos:
+            for fila in filas:
+                minuto = self._minutos_recientes.setdefault(fila['periodo'], {})
+                acumulado = minuto.setdefault(str(fila['estacion_id'] or ''), [0, 0])
+                acumulado[0] += fila['lecturas']
+                acumulado[1] += fila['cantidad']
+
+    def _escribir(self, funcion: Callable, *args, esperar: bool = True) -> Any:
+        """Encolar funcion(*args) al hilo escritor, en orden con los lotes de lecturas"""
+        if not self._hilo_escritor or not self._hilo_escritor.is_alive():
+            return funcion(*args)
+
+        tarea = _TareaEscritura(funcion, args)
+        self._cola_escritura.put(tarea)
+        if not esperar:
+            return None
+        tarea.hecha.wait()
+        if tarea.error:
+            raise tarea.error
+        return tarea.resultado
+
+    def guardar_lectura(self, lectura: Dict[str, Any], punto_control: Optional[Tuple[str, int]] = None):
+        """Guardar lectura de producción (se persiste en el siguiente lote, con su punto de control)"""
         try:
-            cursor = self.sqlite_conn.cursor()
-
-            # Tabla de lecturas de producción
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS lecturas_produccion (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    orden_fabricacion TEXT NOT NULL,
-                    upc TEXT NOT NULL,
-                    cantidad INTEGER NOT NULL,
-                    timestamp DATETIME NOT NULL,
-                    fuente TEXT NOT NULL,
-                    sincronizada BOOLEAN DEFAULT FALSE,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Tabla de estado de estaciones
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS estado_estaciones (
-                    estacion_id TEXT PRIMARY KEY,
-                    estado TEXT NOT NULL,
-                    orden_actual TEXT,
-                    contador INTEGER DEFAULT 0,
-                    meta INTEGER DEFAULT 0,
-                    ultima_actividad DATETIME,
-                    tiempo_inactivo INTEGER DEFAULT 0,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Tabla de configuración
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS configuracion (
-                    clave TEXT PRIMARY KEY,
-                    valor TEXT NOT NULL,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            fila = (
+                lectura['orden_fabricacion'],
+                lectura['upc'],
+                lectura['cantidad'],
+                lectura['timestamp'],
+                lectura['fuente'],
+                lectura.get('estacion_id')
+            )
+            if punto_control:
+                fila += (_PuntoControl(*punto_control),)
+            self._cola_escritura.put(fila)
+        except Exception as e:
+            self.logger.error(f"❌ Error guardando lectura: {e}")
 
-            # Índices para optimizar consultas
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_lecturas_orden
-                ON lecturas_produccion(orden_fabricacion)
-            ''')
+    def guardar_punto_control(self, clave: str, valor: int):
+        """Encolar un punto de control sin lectura (va en la transacción del siguiente lote)"""
+        self._cola_escritura.put(_PuntoControl(clave, valor))
+
+    def _escribir_lotes(self):
+        """Agrupar lecturas encoladas y escribirlas por lotes (para usar en thread)"""
+        while self._escribiendo or not self._cola_escritura.empty():
+            if time.monotonic() >= self._proxima_retencion:
+                self._retencion_periodica()
+
+            try:
+                item = self._cola_escritura.get(timeout=self.flush_intervalo)
+            except Empty:
+                continue
+
+            # Acumular hasta llenar el lote, vencer la ventana de durabilidad
+            # o recibir una marca de vaciado (threading.Event) o una tarea
+            lote = []
+            marca = None
+            limite = time.monotonic() + self.flush_intervalo
+            while True:
+                if isinstance(item, (threading.Event, _TareaEscritura)):
+                    marca = item
+                    break
+                lote.append(item)
+                restante = limite - time.monotonic()
+                if len(lote) >= self.flush_max_lecturas or restante <= 0:
+                    break
+                try:
+                    item = self._cola_escritura.get(timeout=restante)
+                except Empty:
+                    break
+
+            try:
+                if lote:
+                    self._guardar_lote(lote)
+            except Exception as e:
+                self.logger.error(f"❌ Error guardando lote de {len(lote)} lecturas: {e}")
+
+            # La marca o tarea va después del lote que la precede en la cola
+            if isinstance(marca, threading.Event):
+                marca.set()
+            elif marca is not None:
+                try:
+                    marca.resultado = marca.funcion(*marca.args)
+                except Exception as e:
+                    marca.error = e
+                finally:
+                    marca.hecha.set()
+
+    def _guardar_lote(self, lote: List[tuple]):
+        """Guardar un lote de lecturas en una sola transacción (hilo escritor)"""
+        filas = []
+        puntos_control: Dict[str, int] = {}
+        for item in lote:
+            # En orden de cola: gana el último punto de control de cada clave
+            if isinstance(item, _PuntoControl):
+                puntos_control[item.clave] = item.valor
+                continue
+            if len(item) > 6:
+                puntos_control[item[6].clave] = item[6].valor
+                item = item[:6]
+            filas.append(item)
+
+        ids = self.almacen.insertar_lecturas(filas, puntos_control)
+        self._acumular_minutos(filas)
+        self.logger.debug(f"📊 Lote de {len(ids)} lecturas guardado")
+
+    def _acumular_minutos(self, lote: List[tuple]):
+        """Sumar el lote a los minutos recientes y descartar los viejos (hilo escritor)"""
+        formato = GRANULARIDADES['minuto']
+        limite = (datetime.now() - timedelta(minutes=1)).strftime(formato)
+        with self._lock_minutos:
+            for _, _, cantidad, timestamp, _, estacion_id in lote:
+                minuto = self._minutos_recientes.setdefault(timestamp.strftime(formato), {})
+                # En texto, como lo devuelve el rollup de SQLite al recargar
+                acumulado = minuto.setdefault(str(estacion_id or ''), [0, 0])
+                acumulado[0] += 1
+                acumulado[1] += cantidad
+
+            for periodo in [p for p in self._minutos_recientes if p < limite]:
+                del self._minutos_recientes[periodo]
+
+    def vaciar_cola(self, timeout: float = 10.0):
+        """Esperar a que las lecturas encoladas hasta ahora estén persistidas"""
+        if not self._hilo_escritor or not self._hilo_escritor.is_alive():
+            return
+        marca = threading.Event()
+        self._cola_escritura.put(marca)
+        marca.wait(timeout)
+
+    def iterar_lecturas_pendientes(self, hasta_id: Optional[int] = None,
+                                   tamano_pagina: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Recorrer lecturas pendientes en orden de id (timestamp en texto ISO), página por página"""
+        tamano = tamano_pagina or self.tamano_pagina
+        try:
+            self.vaciar_cola()
+            despues_de = self.marca_sincronizadas
+            while True:
+                # Cada página es una consulta corta: el escritor intercala sus lotes
+                pagina = self.almacen.pagina_pendientes(despues_de, tamano, hasta_id)
+                yield from pagina
+                if len(pagina) < tamano:
+                    return
+                despues_de = pagina[-1]['id']
+
+        except Exception as e:
+            self.logger.error(f"❌ Error recorriendo lecturas pendientes: {e}")
 
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_lecturas_sincronizada
-                ON lecturas_produccion(sincronizada)
-            ''')
+    def obtener_lecturas_pendientes(self) -> List[Dict[str, Any]]:
+        """Obtener lecturas pendientes de sincronización"""
+        lecturas = []
+        for lectura in self.iterar_lecturas_pendientes():
+            lectura['timestamp'] = datetime.fromisoformat(lectura['timestamp'])
+            lecturas.append(lectura)
+        return lecturas
 
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_lecturas_timestamp
-                ON lecturas_produccion(timestamp)
-            ''')
+    def _avanzar_marca(self):
+        """Mover la marca hasta justo antes de la primera lectura pendiente (hilo escritor)"""
+        primera = self.almacen.primera_pendiente()
+        marca = self.almacen.ultimo_id() if primera is None else primera - 1
 
-            self.sqlite_conn.commit()
-            self.logger.info("✅ Tablas de SQLite creadas")
+        if marca > self.marca_sincronizadas:
+            self.marca_sincronizadas = marca
+            self.almacen.guardar_configuracion('marca_sincronizadas', marca)
 
-        except Exception as e:
-            self.logger.error(f"❌ Error creando tablas: {e}")
-            raise
+    def _marcar_ids(self, ids: List[int]):
+        self.almacen.marcar_ids(ids)
+        self._avanzar_marca()
 
-    def guardar_lectura(self, lectura: Dict[str, Any]):
-        """Guardar lectura de producción"""
+    def marcar_como_sincronizadas(self, lecturas: List[Dict[str, Any]]):
+        """Marcar lecturas como sincronizadas"""
         try:
-            with self.lock:
-                # Guardar en SQLite (persistencia)
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute('''
-                    INSERT INTO lecturas_produccion
-                    (orden_fabricacion, upc, cantidad, timestamp, fuente)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    lectura['orden_fabricacion'],
-                    lectura['upc'],
-                    lectura['cantidad'],
-                    lectura['timestamp'],
-                    lectura['fuente']
-                ))
-                self.sqlite_conn.commit()
-
-                # Guardar en Redis (acceso rápido)
-                lectura_id = cursor.lastrowid
-                redis_key = f"lectura:{lectura_id}"
-                self.redis_client.hset(redis_key, mapping={
-                    'id': lectura_id,
-                    'orden_fabricacion': lectura['orden_fabricacion'],
-                    'upc': lectura['upc'],
-                    'cantidad': lectura['cantidad'],
-                    'timestamp': lectura['timestamp'].isoformat(),
-                    'fuente': lectura['fuente'],
-                    'sincronizada': 'false'
-                })
-
-                # Agregar a lista de lecturas pendientes
-                self.redis_client.lpush('lecturas_pendientes', lectura_id)
-
-                self.logger.debug(f"📊 Lectura guardada: {lectura_id}")
+            if not lecturas:
+                return
+
+            ids = [lectura['id'] for lectura in lecturas]
+            self._escribir(self._marcar_ids, ids)
+
+            self.logger.info(f"✅ {len(lecturas)} lecturas marcadas como sincronizadas")
 
         except Exception as e:
-            self.logger.error(f"❌ Error guardando lectura: {e}")
+            self.logger.error(f"❌ Error marcando lecturas como sincronizadas: {e}")
 
-    def obtener_lecturas_pendientes(self) -> List[Dict[str, Any]]:
-        """Obtener lecturas pendientes de sincronización"""
+    def obtener_resumen_pendientes(self, hasta_id: Optional[int] = None) -> Dict[str, Any]:
+        """Agrupar lecturas pendientes por (orden, upc, estación) hasta una marca de agua"""
         try:
-            with self.lock:
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute('''
-                    SELECT * FROM lecturas_produccion
-                    WHERE sincronizada = FALSE
-                    ORDER BY timestamp ASC
-                ''')
-
-                lecturas = []
-                for row in cursor.fetchall():
-                    lecturas.append({
-                        'id': row['id'],
-                        'orden_fabricacion': row['orden_fabricacion'],
-                        'upc': row['upc'],
-                        'cantidad': row['cantidad'],
-                        'timestamp': datetime.fromisoformat(row['timestamp']),
-                        'fuente': row['fuente']
-                    })
-
-                return lecturas
+            if hasta_id is None:
+                self.vaciar_cola()
+                hasta_id = self.almacen.ultima_pendiente()
+
+            if hasta_id is None:
+                return {'grupos': [], 'desde_id': None, 'hasta_id': None, 'lecturas': 0}
+
+            # Acumular página por página: memoria proporcional a los grupos, no a las filas
+            grupos: Dict[tuple, Dict[str, Any]] = {}
+            for lectura in self.iterar_lecturas_pendientes(hasta_id):
+                clave = (lectura['orden_fabricacion'], lectura['upc'], lectura['estacion_id'])
+                grupo = grupos.get(clave)
+                if grupo is None:
+                    grupos[clave] = {
+                        'orden_fabricacion': lectura['orden_fabricacion'],
+                        'upc': lectura['upc'],
+                        'estacion_id': lectura['estacion_id'],
+                        'cantidad': lectura['cantidad'],
+                        'lecturas': 1,
+                        'desde_id': lectura['id'],
+                        'hasta_id': lectura['id'],
+                        'ultima_lectura': lectura['timestamp']
+                    }
+                    continue
+                grupo['cantidad'] += lectura['cantidad']
+                grupo['lecturas'] += 1
+                grupo['hasta_id'] = lectura['id']
+                grupo['ultima_lectura'] = max(grupo['ultima_lectura'], lectura['timestamp'])
+
+            return {
+                'grupos': list(grupos.values()),
+                'desde_id': min((g['desde_id'] for g in grupos.values()), default=None),
+                'hasta_id': hasta_id,
+                'lecturas': sum(g['lecturas'] for g in grupos.values())
+            }
 
         except Exception as e:
-            self.logger.error(f"❌ Error obteniendo lecturas pendientes: {e}")
-            return []
+            self.logger.error(f"❌ Error obteniendo resumen de pendientes: {e}")
+            return {'grupos': [], 'desde_id': None, 'hasta_id': None, 'lecturas': 0}
 
-    def marcar_como_sincronizadas(self, lecturas: List[Dict[str, Any]]):
-        """Marcar lecturas como sincronizadas"""
+    def marcar_sincronizadas_hasta(self, hasta_id: int, desde_id: Optional[int] = None):
+        """Marcar como sincronizadas todas las lecturas con id <= hasta_id"""
         try:
-            with self.lock:
-                if not lecturas:
-                    return
+            # Actualizar por tramos de ids: los lotes de lecturas se intercalan
+            marcadas = 0
+            inicio = self.marca_sincronizadas
+            while inicio < hasta_id:
+                fin = min(inicio + self.tamano_pagina, hasta_id)
+                marcadas += self._escribir(self.almacen.marcar_tramo, inicio, fin)
+                inicio = fin
+            self._escribir(self._avanzar_marca)
+            self._escribir(self.almacen.limpiar_sincronizadas, desde_id, hasta_id)
+
+            self.logger.info(f"✅ {marcadas} lecturas marcadas como sincronizadas (id <= {hasta_id})")
 
-                ids = [lectura['id'] for lectura in lecturas]
-                placeholders = ','.join(['?' for _ in ids])
+        except Exception as e:
+            self.logger.error(f"❌ Error marcando lecturas como sincronizadas: {e}")
 
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute(f'''
-                    UPDATE lecturas_produccion
-                    SET sincronizada = TRUE
-                    WHERE id IN ({placeholders})
-                ''', ids)
-                self.sqlite_conn.commit()
+    def guardar_configuracion(self, clave: str, valor: Optional[str], esperar: bool = True):
+        """Guardar (o borrar con None) un valor en la tabla de configuración"""
+        try:
+            self._escribir(self.almacen.guardar_configuracion, clave, valor, esperar=esperar)
 
-                # Limpiar de Redis
-                for lectura in lecturas:
-                    redis_key = f"lectura:{lectura['id']}"
-                    self.redis_client.delete(redis_key)
-                    self.redis_client.lrem('lecturas_pendientes', 0, lectura['id'])
+        except Exception as e:
+            self.logger.error(f"❌ Error guardando configuración {clave}: {e}")
 
-                self.logger.info(f"✅ {len(lecturas)} lecturas marcadas como sincronizadas")
+    def obtener_configuracion(self, clave: str) -> Optional[str]:
+        """Obtener un valor de la tabla de configuración"""
+        try:
+            return self.almacen.obtener_configuracion(clave)
 
         except Exception as e:
-            self.logger.error(f"❌ Error marcando lecturas como sincronizadas: {e}")
+            self.logger.error(f"❌ Error obteniendo configuración {clave}: {e}")
+            return None
 
     def guardar_estado_estacion(self, estacion_id: str, estado: Dict[str, Any]):
-        """Guardar estado de una estación"""
+        """Guardar estado de una estación (memoria; el almacén en diferido)"""
         try:
-            with self.lock:
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute('''
-                    INSERT OR REPLACE INTO estado_estaciones
-                    (estacion_id, estado, orden_actual, contador, meta, ultima_actividad, tiempo_inactivo)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    estacion_id,
-                    estado.get('estado', 'INACTIVO'),
-                    estado.get('orden_actual'),
-                    estado.get('contador', 0),
-                    estado.get('meta', 0),
-                    estado.get('ultima_actividad'),
-                    estado.get('tiempo_inactivo', 0)
-                ))
-                self.sqlite_conn.commit()
-
-                # Guardar en Redis
-                redis_key = f"estacion:{estacion_id}"
-                self.redis_client.hset(redis_key, mapping={
-                    'estado': estado.get('estado', 'INACTIVO'),
-                    'orden_actual': estado.get('orden_actual', ''),
-                    'contador': estado.get('contador', 0),
-                    'meta': estado.get('meta', 0),
-                    'ultima_actividad': estado.get('ultima_actividad', ''),
-                    'tiempo_inactivo': estado.get('tiempo_inactivo', 0)
-                })
+            estado = {
+                'estado': estado.get('estado', 'INACTIVO'),
+                'orden_actual': estado.get('orden_actual'),
+                'contador': estado.get('contador', 0),
+                'meta': estado.get('meta', 0),
+                'ultima_actividad': estado.get('ultima_actividad'),
+                'tiempo_inactivo': estado.get('tiempo_inactivo', 0)
+            }
+            version = self.estados.guardar(estacion_id, estado)
+            self._escribir(self._replicar_estado, estacion_id, version, estado, esperar=False)
 
         except Exception as e:
             self.logger.error(f"❌ Error guardando estado estación: {e}")
 
+    def _replicar_estado(self, estacion_id: str, version: int, estado: Dict[str, Any]):
+        """Persistir un estado de estación si ninguna versión posterior lo reemplazó"""
+        if version < self.estados.version(estacion_id):
+            return
+        self.almacen.guardar_estado(estacion_id, estado, version)
+
     def obtener_estado_estacion(self, estacion_id: str) -> Optional[Dict[str, Any]]:
         """Obtener estado de una estación"""
         try:
-            # Intentar obtener de Redis primero
-            redis_key = f"estacion:{estacion_id}"
-            estado_redis = self.redis_client.hgetall(redis_key)
-
-            if estado_redis:
-                return {
-                    'estado': estado_redis.get('estado', 'INACTIVO'),
-                    'orden_actual': estado_redis.get('orden_actual', ''),
-                    'contador': int(estado_redis.get('contador', 0)),
-                    'meta': int(estado_redis.get('meta', 0)),
-                    'ultima_actividad': estado_redis.get('ultima_actividad', ''),
-                    'tiempo_inactivo': int(estado_redis.get('tiempo_inactivo', 0))
-                }
-
-            # Si no está en Redis, obtener de SQLite
-            with self.lock:
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute('''
-                    SELECT * FROM estado_estaciones
-                    WHERE estacion_id = ?
-                ''', (estacion_id,))
-
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'estado': row['estado'],
-                        'orden_actual': row['orden_actual'],
-                        'contador': row['contador'],
-                        'meta': row['meta'],
-                        'ultima_actividad': row['ultima_actividad'],
-                        'tiempo_inactivo': row['tiempo_inactivo']
-                    }
+            estado = self.estados.obtener(estacion_id)
+            if estado is not None:
+                return estado
 
-            return None
+            # No está en memoria (o venció): obtener del almacén
+            estado = self.almacen.obtener_estado(estacion_id)
+            if estado is not None:
+                self.estados.cargar(estacion_id, estado)
+            return estado
 
         except Exception as e:
             self.logger.error(f"❌ Error obteniendo estado estación: {e}")
             return None
 
-    def limpiar_lecturas_antiguas(self, dias: int = 7):
-        """Limpiar lecturas antiguas ya sincronizadas"""
+    def obtener_rollup(self, granularidad: str, desde: datetime, hasta: Optional[datetime] = None,
+                       estacion_id: Optional[str] = None,
+                       orden: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Obtener lecturas y cantidad por periodo ('minuto' u 'hora'), orden, estación y fuente"""
         try:
-            with self.lock:
-                fecha_limite = datetime.now() - timedelta(days=dias)
+            formato = GRANULARIDADES[granularidad]
+            return self.almacen.obtener_rollup(
+                granularidad,
+                desde.strftime(formato),
+                hasta.strftime(formato) if hasta else None,
+                estacion_id,
+                orden
+            )
 
-                cursor = self.sqlite_conn.cursor()
-                cursor.execute('''
-                    DELETE FROM lecturas_produccion
-                    WHERE sincronizada = TRUE
-                    AND timestamp < ?
-                ''', (fecha_limite,))
+        except Exception as e:
+            self.logger.error(f"❌ Error obteniendo rollup por {granularidad}: {e}")
+            return []
 
-                eliminadas = cursor.rowcount
-                self.sqlite_conn.commit()
+    def obtener_lecturas_por_minuto(self, estacion_id: Optional[str] = None) -> Dict[str, Any]:
+        """Lecturas y cantidad del último minuto completo, sin consultar el almacén"""
+        periodo = (datetime.now() - timedelta(minutes=1)).strftime(GRANULARIDADES['minuto'])
+        with self._lock_minutos:
+            minuto = self._minutos_recientes.get(periodo, {})
+            if estacion_id is not None:
+                acumulados = [list(minuto.get(str(estacion_id), [0, 0]))]
+            else:
+                acumulados = [list(a) for a in minuto.values()]
+        return {
+            'periodo': periodo,
+            'lecturas': sum(a[0] for a in acumulados),
+            'cantidad': sum(a[1] for a in acumulados)
+        }
+
+    def _aplicar_retencion(self, dias_lecturas: float) -> Dict[str, int]:
+        """Borrar lecturas sincronizadas y periodos de rollup vencidos (hilo escritor)"""
+        ahora = datetime.now()
+        eliminadas = {
+            'lecturas': self.almacen.eliminar_sincronizadas(ahora - timedelta(days=dias_lecturas))
+        }
+        for granularidad, dias in (('minuto', self.config.retencion_rollup_minuto_dias),
+                                   ('hora', self.config.retencion_rollup_hora_dias)):
+            limite = (ahora - timedelta(days=dias)).strftime(GRANULARIDADES[granularidad])
+            eliminadas[granularidad] = self.almacen.eliminar_rollup(granularidad, limite)
+        return eliminadas
+
+    def _retencion_periodica(self):
+        """Aplicar la retención configurada desde el hilo escritor"""
+        self._proxima_retencion = time.monotonic() + self.INTERVALO_RETENCION
+        try:
+            eliminadas = self._aplicar_retencion(self.config.retencion_lecturas_dias)
+            if any(eliminadas.values()):
+                self.logger.info(
+                    f"🧹 Retención: {eliminadas['lecturas']} lecturas, "
+                    f"{eliminadas['minuto']} minutos y {eliminadas['hora']} horas de rollup eliminados"
+                )
+        except Exception as e:
+            self.logger.error(f"❌ Error aplicando retención: {e}")
 
-                if eliminadas > 0:
-                    self.logger.info(f"🧹 {eliminadas} lecturas antiguas eliminadas")
+    def limpiar_lecturas_antiguas(self, dias: Optional[float] = None):
+        """Limpiar lecturas antiguas ya sincronizadas (los rollups se conservan)"""
+        try:
+            if dias is None:
+                dias = self.config.retencion_lecturas_dias
+            eliminadas = self._escribir(self._aplicar_retencion, dias)
+            if eliminadas['lecturas'] > 0:
+                self.logger.info(f"🧹 {eliminadas['lecturas']} lecturas antiguas eliminadas")
 
         except Exception as e:
             self.logger.error(f"❌ Error limpiando lecturas antiguas: {e}")
@@ -313,31 +460,11 @@ class CacheManager:
     def obtener_estadisticas(self) -> Dict[str, Any]:
         """Obtener estadísticas del cache"""
         try:
-            with self.lock:
-                cursor = self.sqlite_conn.cursor()
-
-                # Total de lecturas
-                cursor.execute('SELECT COUNT(*) FROM lecturas_produccion')
-                total_lecturas = cursor.fetchone()[0]
-
-                # Lecturas pendientes
-                cursor.execute('SELECT COUNT(*) FROM lecturas_produccion WHERE sincronizada = FALSE')
-                lecturas_pendientes = cursor.fetchone()[0]
-
-                # Lecturas por fuente
-                cursor.execute('''
-                    SELECT fuente, COUNT(*)
-                    FROM lecturas_produccion
-                    GROUP BY fuente
-                ''')
-                lecturas_por_fuente = dict(cursor.fetchall())
-
-                return {
-                    'total_lecturas': total_lecturas,
-                    'lecturas_pendientes': lecturas_pendientes,
-                    'lecturas_sincronizadas': total_lecturas - lecturas_pendientes,
-                    'lecturas_por_fuente': lecturas_por_fuente
-                }
+            estadisticas = self.almacen.estadisticas()
+            estadisticas['backend'] = self.almacen.nombre
+            estadisticas['estados'] = self.estados.obtener_estadisticas()
+            estadisticas['ultimo_minuto'] = self.obtener_lecturas_por_minuto()
+            return estadisticas
 
         except Exception as e:
             self.logger.error(f"❌ Error obteniendo estadísticas: {e}")
@@ -346,10 +473,12 @@ class CacheManager:
     def cerrar(self):
         """Cerrar conexiones"""
         try:
-            if self.sqlite_conn:
-                self.sqlite_conn.close()
-            if self.redis_client:
-                self.redis_client.close()
+            # Persistir lo que quede en cola antes de cerrar
+            self._escribiendo = False
+            if self._hilo_escritor:
+                self._hilo_escritor.join()
+
+            self.almacen.cerrar()
             self.logger.info("✅ Cache cerrado")
         except Exception as e:
             self.logger.error(f"❌ Error cerrando cache: {e}")
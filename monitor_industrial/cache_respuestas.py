@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Cache de Respuestas SISPRO - Lecturas offline-first de la API
+
+Guarda en SQLite la última respuesta exitosa de cada GET (endpoint +
+parámetros) con su ETag y Last-Modified:
+
+- Fresca (edad < TTL del endpoint): se sirve sin ir al servidor.
+- Vencida: se sirve de inmediato y se revalida en segundo plano
+  (stale-while-revalidate) con If-None-Match / If-Modified-Since;
+  un 304 solo renueva la fecha.
+- Sin servidor: se sigue sirviendo la última respuesta conocida.
+
+Las entradas viven en memoria para leerlas sin consultas; SQLite solo las
+conserva entre reinicios.
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlencode
+from typing import Dict, Any, Optional, List
+
+
+class EntradaRespuesta:
+    """Última respuesta conocida de un GET"""
+
+    __slots__ = ('datos', 'etag', 'modificada', 'guardada', 'usada')
+
+    def __init__(self, datos: Any, etag: Optional[str], modificada: Optional[str], guardada: float):
+        self.datos = datos
+        self.etag = etag
+        self.modificada = modificada
+        self.guardada = guardada
+        self.usada = 0.0
+
+    def edad(self) -> float:
+        return time.time() - self.guardada
+
+
+class CacheRespuestas:
+    def __init__(self, archivo: str, ttls: Dict[str, float], ttl_por_defecto: float = 60.0):
+        self.archivo = archivo
+        self.ttls = ttls
+        self.ttl_por_defecto = ttl_por_defecto
+        self.logger = logging.getLogger(__name__)
+
+        self.conn = None
+        self.lock = threading.Lock()
+        self._entradas: Dict[str, EntradaRespuesta] = {}
+        self._renovando = set()
+
+    def abrir(self):
+        """Abrir el archivo y cargar las respuestas guardadas"""
+        try:
+            self.conn = sqlite3.connect(self.archivo, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS respuestas_sispro (
+                    clave TEXT PRIMARY KEY,
+                    datos TEXT NOT NULL,
+                    etag TEXT,
+                    modificada TEXT,
+                    guardada REAL NOT NULL
+                )
+            ''')
+            self.conn.commit()
+
+            filas = self.conn.execute('SELECT clave, datos, etag, modificada, guardada FROM respuestas_sispro')
+            with self.lock:
+                for clave, datos, etag, modificada, guardada in filas:
+                    self._entradas[clave] = EntradaRespuesta(json.loads(datos), etag, modificada, guardada)
+            self.logger.info(f"✅ Cache de respuestas SISPRO: {len(self._entradas)} respuestas guardadas")
+
+        except Exception as e:
+            # Sin archivo el cache sigue funcionando en memoria
+            self.conn = None
+            self.logger.warning(f"⚠️ Cache de respuestas solo en memoria: {e}")
+
+    def cerrar(self):
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    @staticmethod
+    def clave(endpoint: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Clave estable de un GET: la ruta con sus parámetros ordenados (sirve de URL)"""
+        if not params:
+            return endpoint
+        return endpoint + '?' + urlencode(sorted(params.items()))
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.ttl_por_defecto)
+
+    def obtener(self, clave: str, usar: bool = True) -> Optional[EntradaRespuesta]:
+        """Obtener la entrada (fresca o no); usar=True la mantiene en la renovación periódica"""
+        entrada = self._entradas.get(clave)
+        if entrada is not None and usar:
+            entrada.usada = time.time()
+        return entrada
+
+    def fresca(self, entrada: EntradaRespuesta, endpoint: str) -> bool:
+        return entrada.edad() < self.ttl(endpoint)
+
+    @staticmethod
+    def cabeceras_validacion(entrada: Optional[EntradaRespuesta]) -> Dict[str, str]:
+        """Cabeceras para un GET condicional"""
+        cabeceras = {}
+        if entrada is not None:
+            if entrada.etag:
+                cabeceras['If-None-Match'] = entrada.etag
+            if entrada.modificada:
+                cabeceras['If-Modified-Since'] = entrada.modificada
+        return cabeceras
+
+    def guardar(self, clave: str, datos: Any, etag: Optional[str] = None,
+                modificada: Optional[str] = None) -> EntradaRespuesta:
+        """Guardar una respuesta 200"""
+        entrada = EntradaRespuesta(datos, etag, modificada, time.time())
+        entrada.usada = entrada.guardada
+        with self.lock:
+            self._entradas[clave] = entrada
+            self._persistir('''
+                INSERT OR REPLACE INTO respuestas_sispro (clave, datos, etag, modificada, guardada)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (clave, json.dumps(datos), etag, modificada, entrada.guardada))
+        return entrada
+
+    def revalidada(self, clave: str) -> Optional[EntradaRespuesta]:
+        """Renovar la fecha de una entrada tras un 304"""
+        with self.lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            entrada.guardada = time.time()
+            self._persistir('UPDATE respuestas_sispro SET guardada = ? WHERE clave = ?',
+                            (entrada.guardada, clave))
+        return entrada
+
+    def _persistir(self, sql: str, parametros: tuple):
+        """Escribir en SQLite (con lock); un fallo solo deja la entrada en memoria"""
+        if not self.conn:
+            return
+        try:
+            self.conn.execute(sql, parametros)
+            self.conn.commit()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Respuesta SISPRO no persistida: {e}")
+
+    def iniciar_renovacion(self, clave: str) -> bool:
+        """Reservar la revalidación en segundo plano de una clave (una a la vez)"""
+        with self.lock:
+            if clave in self._renovando:
+                return False
+            self._renovando.add(clave)
+            return True
+
+    def terminar_renovacion(self, clave: str):
+        with self.lock:
+            self._renovando.discard(clave)
+
+    def claves(self, endpoints) -> List[str]:
+        """Claves guardadas de los endpoints indicados"""
+        with self.lock:
+            return [clave for clave in self._entradas if clave.split('?', 1)[0] in endpoints]
+
+    def por_renovar(self, usadas_desde: float) -> List[str]:
+        """Claves usadas desde usadas_desde que ya vencieron"""
+        with self.lock:
+            entradas = list(self._entradas.items())
+        return [
+            clave for clave, entrada in entradas
+            if entrada.usada >= usadas_desde and not self.fresca(entrada, clave.split('?', 1)[0])
+        ]
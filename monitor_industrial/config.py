@@ -5,7 +5,7 @@ Configuración del Monitor Industrial
 
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 class Config:
     def __init__(self):
@@ -20,29 +20,59 @@ class Config:
                 "username": "monitor_pi",
                 "password": "password_segura",
                 "empresa_id": 1,
-                "usuario_id": 1
+                "usuario_id": 1,
+                "cache_respuestas": "sispro_respuestas.db",
+                "ttl_estaciones_segundos": 3600,
+                "ttl_ordenes_segundos": 60,
+                "ttl_avance_segundos": 15
             },
             "rs485": {
                 "port": "/dev/ttyUSB0",
                 "baudrate": 9600,
-                "timeout": 1
+                "timeout": 1,
+                "protocolo": "binario",
+                "modo": "libre",
+                "dispositivos": [],
+                "poll_timeout_ms": 200,
+                "poll_intervalo_min_ms": 20,
+                "poll_intervalo_max_ms": 1000,
+                "reenvio_timeout_ms": 500,
+                "negociar_baudrate": True,
+                "baudrates": [57600, 115200, 460800],
+                "pruebas_eco": 20
             },
             "cache": {
+                "backend": "sqlite_redis",
                 "redis_host": "localhost",
                 "redis_port": 6379,
                 "redis_password": "",
                 "redis_db": 0,
-                "sqlite_file": "monitor_cache.db"
+                "sqlite_file": "monitor_cache.db",
+                "sqlite_synchronous": "NORMAL",
+                "flush_intervalo_ms": 200,
+                "flush_max_lecturas": 500,
+                "tamano_pagina": 1000,
+                "conexiones_lectura": 2,
+                "estado_ttl_segundos": 300,
+                "estado_max_estaciones": 64,
+                "retencion_lecturas_dias": 2,
+                "retencion_rollup_minuto_dias": 14,
+                "retencion_rollup_hora_dias": 365
             },
             "interfaz": {
                 "fullscreen": True,
                 "theme": "industrial",
-                "update_interval": 1000
+                "update_interval": 1000,
+                "fps": 10,
+                "ritmo_ventana_segundos": 60,
+                "ritmo_ewma_segundos": 30,
+                "ritmo_inactivo_segundos": 30
             },
             "sincronizacion": {
                 "intervalo_minutos": 5,
                 "max_reintentos": 3,
-                "timeout_segundos": 30
+                "timeout_segundos": 30,
+                "tamano_lote": 500
             },
             "estacion": {
                 "id": None,
@@ -129,6 +159,22 @@ class Config:
     def usuario_id(self) -> int:
         return self.get('sispro.usuario_id')
 
+    @property
+    def sispro_cache_respuestas(self) -> str:
+        return self.get('sispro.cache_respuestas')
+
+    @property
+    def sispro_ttl_estaciones(self) -> float:
+        return self.get('sispro.ttl_estaciones_segundos')
+
+    @property
+    def sispro_ttl_ordenes(self) -> float:
+        return self.get('sispro.ttl_ordenes_segundos')
+
+    @property
+    def sispro_ttl_avance(self) -> float:
+        return self.get('sispro.ttl_avance_segundos')
+
     @property
     def rs485_port(self) -> str:
         return self.get('rs485.port')
@@ -141,6 +187,46 @@ class Config:
     def rs485_timeout(self) -> int:
         return self.get('rs485.timeout')
 
+    @property
+    def rs485_protocolo(self) -> str:
+        return self.get('rs485.protocolo')
+
+    @property
+    def rs485_modo(self) -> str:
+        return self.get('rs485.modo')
+
+    @property
+    def rs485_dispositivos(self) -> List[str]:
+        return self.get('rs485.dispositivos')
+
+    @property
+    def rs485_poll_timeout_ms(self) -> int:
+        return self.get('rs485.poll_timeout_ms')
+
+    @property
+    def rs485_poll_intervalo_min_ms(self) -> int:
+        return self.get('rs485.poll_intervalo_min_ms')
+
+    @property
+    def rs485_poll_intervalo_max_ms(self) -> int:
+        return self.get('rs485.poll_intervalo_max_ms')
+
+    @property
+    def rs485_reenvio_timeout_ms(self) -> int:
+        return self.get('rs485.reenvio_timeout_ms')
+
+    @property
+    def rs485_negociar_baudrate(self) -> bool:
+        return self.get('rs485.negociar_baudrate')
+
+    @property
+    def rs485_baudrates(self) -> List[int]:
+        return self.get('rs485.baudrates')
+
+    @property
+    def rs485_pruebas_eco(self) -> int:
+        return self.get('rs485.pruebas_eco')
+
     @property
     def redis_host(self) -> str:
         return self.get('cache.redis_host')
@@ -161,6 +247,50 @@ class Config:
     def sqlite_file(self) -> str:
         return self.get('cache.sqlite_file')
 
+    @property
+    def cache_backend(self) -> str:
+        return self.get('cache.backend')
+
+    @property
+    def sqlite_synchronous(self) -> str:
+        return self.get('cache.sqlite_synchronous')
+
+    @property
+    def flush_intervalo_ms(self) -> int:
+        return self.get('cache.flush_intervalo_ms')
+
+    @property
+    def flush_max_lecturas(self) -> int:
+        return self.get('cache.flush_max_lecturas')
+
+    @property
+    def tamano_pagina_pendientes(self) -> int:
+        return self.get('cache.tamano_pagina')
+
+    @property
+    def conexiones_lectura(self) -> int:
+        return self.get('cache.conexiones_lectura')
+
+    @property
+    def estado_ttl_segundos(self) -> float:
+        return self.get('cache.estado_ttl_segundos')
+
+    @property
+    def estado_max_estaciones(self) -> int:
+        return self.get('cache.estado_max_estaciones')
+
+    @property
+    def retencion_lecturas_dias(self) -> float:
+        return self.get('cache.retencion_lecturas_dias')
+
+    @property
+    def retencion_rollup_minuto_dias(self) -> float:
+        return self.get('cache.retencion_rollup_minuto_dias')
+
+    @property
+    def retencion_rollup_hora_dias(self) -> float:
+        return self.get('cache.retencion_rollup_hora_dias')
+
     @property
     def fullscreen(self) -> bool:
         return self.get('interfaz.fullscreen')
@@ -173,6 +303,22 @@ class Config:
     def update_interval(self) -> int:
         return self.get('interfaz.update_interval')
 
+    @property
+    def fps(self) -> int:
+        return self.get('interfaz.fps')
+
+    @property
+    def ritmo_ventana_segundos(self) -> float:
+        return self.get('interfaz.ritmo_ventana_segundos')
+
+    @property
+    def ritmo_ewma_segundos(self) -> float:
+        return self.get('interfaz.ritmo_ewma_segundos')
+
+    @property
+    def ritmo_inactivo_segundos(self) -> float:
+        return self.get('interfaz.ritmo_inactivo_segundos')
+
     @property
     def intervalo_sincronizacion(self) -> int:
         return self.get('sincronizacion.intervalo_minutos')
@@ -185,6 +331,10 @@ class Config:
     def timeout_sincronizacion(self) -> int:
         return self.get('sincronizacion.timeout_segundos')
 
+    @property
+    def tamano_lote_sincronizacion(self) -> int:
+        return self.get('sincronizacion.tamano_lote')
+
     @property
     def estacion_id(self) -> Optional[int]:
         return self.get('estacion.id')
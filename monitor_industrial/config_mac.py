@@ -17,22 +17,52 @@ class Config:
         self.sispro_password = "password_segura"
         self.empresa_id = 1
         self.usuario_id = 1
+        self.sispro_cache_respuestas = "sispro_respuestas_mac.db"
+        self.sispro_ttl_estaciones = 3600
+        self.sispro_ttl_ordenes = 60
+        self.sispro_ttl_avance = 15
 
         # RS485 simulado
         self.rs485_port = "/dev/ttyUSB0"  # No se usa en Mac
         self.rs485_baudrate = 9600
         self.rs485_timeout = 1
+        self.rs485_protocolo = "binario"
+        self.rs485_modo = "libre"
+        self.rs485_dispositivos = []
+        self.rs485_poll_timeout_ms = 200
+        self.rs485_poll_intervalo_min_ms = 20
+        self.rs485_poll_intervalo_max_ms = 1000
+        self.rs485_reenvio_timeout_ms = 500
+        self.rs485_negociar_baudrate = True
+        self.rs485_baudrates = [57600, 115200, 460800]
+        self.rs485_pruebas_eco = 20
 
         # Cache simplificado (solo SQLite)
+        self.cache_backend = "sqlite"
         self.redis_host = "localhost"
         self.redis_port = 6379
+        self.redis_password = ""
         self.redis_db = 0
         self.sqlite_file = "monitor_cache_mac.db"
+        self.sqlite_synchronous = "NORMAL"
+        self.flush_intervalo_ms = 200
+        self.flush_max_lecturas = 500
+        self.tamano_pagina_pendientes = 1000
+        self.conexiones_lectura = 2
+        self.estado_ttl_segundos = 300
+        self.estado_max_estaciones = 64
+        self.retencion_lecturas_dias = 2
+        self.retencion_rollup_minuto_dias = 14
+        self.retencion_rollup_hora_dias = 365
 
         # Interfaz
         self.fullscreen = False  # No fullscreen en Mac para pruebas
         self.theme = "industrial"
         self.update_interval = 1000
+        self.fps = 10
+        self.ritmo_ventana_segundos = 60
+        self.ritmo_ewma_segundos = 30
+        self.ritmo_inactivo_segundos = 30
 
         # Sincronización
         self.intervalo_minutos = 1  # Más rápido para pruebas
@@ -57,25 +87,55 @@ class Config:
                 self.sispro_password = sispro_config.get("password", self.sispro_password)
                 self.empresa_id = sispro_config.get("empresa_id", self.empresa_id)
                 self.usuario_id = sispro_config.get("usuario_id", self.usuario_id)
+                self.sispro_cache_respuestas = sispro_config.get("cache_respuestas", self.sispro_cache_respuestas)
+                self.sispro_ttl_estaciones = sispro_config.get("ttl_estaciones_segundos", self.sispro_ttl_estaciones)
+                self.sispro_ttl_ordenes = sispro_config.get("ttl_ordenes_segundos", self.sispro_ttl_ordenes)
+                self.sispro_ttl_avance = sispro_config.get("ttl_avance_segundos", self.sispro_ttl_avance)
 
                 # Cargar configuración RS485
                 rs485_config = config_data.get("rs485", {})
                 self.rs485_port = rs485_config.get("port", self.rs485_port)
                 self.rs485_baudrate = rs485_config.get("baudrate", self.rs485_baudrate)
                 self.rs485_timeout = rs485_config.get("timeout", self.rs485_timeout)
+                self.rs485_protocolo = rs485_config.get("protocolo", self.rs485_protocolo)
+                self.rs485_modo = rs485_config.get("modo", self.rs485_modo)
+                self.rs485_dispositivos = rs485_config.get("dispositivos", self.rs485_dispositivos)
+                self.rs485_poll_timeout_ms = rs485_config.get("poll_timeout_ms", self.rs485_poll_timeout_ms)
+                self.rs485_poll_intervalo_min_ms = rs485_config.get("poll_intervalo_min_ms", self.rs485_poll_intervalo_min_ms)
+                self.rs485_poll_intervalo_max_ms = rs485_config.get("poll_intervalo_max_ms", self.rs485_poll_intervalo_max_ms)
+                self.rs485_reenvio_timeout_ms = rs485_config.get("reenvio_timeout_ms", self.rs485_reenvio_timeout_ms)
+                self.rs485_negociar_baudrate = rs485_config.get("negociar_baudrate", self.rs485_negociar_baudrate)
+                self.rs485_baudrates = rs485_config.get("baudrates", self.rs485_baudrates)
+                self.rs485_pruebas_eco = rs485_config.get("pruebas_eco", self.rs485_pruebas_eco)
 
                 # Cargar configuración de cache
                 cache_config = config_data.get("cache", {})
+                self.cache_backend = cache_config.get("backend", self.cache_backend)
                 self.redis_host = cache_config.get("redis_host", self.redis_host)
                 self.redis_port = cache_config.get("redis_port", self.redis_port)
+                self.redis_password = cache_config.get("redis_password", self.redis_password)
                 self.redis_db = cache_config.get("redis_db", self.redis_db)
                 self.sqlite_file = cache_config.get("sqlite_file", self.sqlite_file)
+                self.sqlite_synchronous = cache_config.get("sqlite_synchronous", self.sqlite_synchronous)
+                self.flush_intervalo_ms = cache_config.get("flush_intervalo_ms", self.flush_intervalo_ms)
+                self.flush_max_lecturas = cache_config.get("flush_max_lecturas", self.flush_max_lecturas)
+                self.tamano_pagina_pendientes = cache_config.get("tamano_pagina", self.tamano_pagina_pendientes)
+                self.conexiones_lectura = cache_config.get("conexiones_lectura", self.conexiones_lectura)
+                self.estado_ttl_segundos = cache_config.get("estado_ttl_segundos", self.estado_ttl_segundos)
+                self.estado_max_estaciones = cache_config.get("estado_max_estaciones", self.estado_max_estaciones)
+                self.retencion_lecturas_dias = cache_config.get("retencion_lecturas_dias", self.retencion_lecturas_dias)
+                self.retencion_rollup_minuto_dias = cache_config.get("retencion_rollup_minuto_dias", self.retencion_rollup_minuto_dias)
+                self.retencion_rollup_hora_dias = cache_config.get("retencion_rollup_hora_dias", self.retencion_rollup_hora_dias)
 
                 # Cargar configuración de interfaz
                 interfaz_config = config_data.get("interfaz", {})
                 self.fullscreen = interfaz_config.get("fullscreen", self.fullscreen)
                 self.theme = interfaz_config.get("theme", self.theme)
                 self.update_interval = interfaz_config.get("update_interval", self.update_interval)
+                self.fps = interfaz_config.get("fps", self.fps)
+                self.ritmo_ventana_segundos = interfaz_config.get("ritmo_ventana_segundos", self.ritmo_ventana_segundos)
+                self.ritmo_ewma_segundos = interfaz_config.get("ritmo_ewma_segundos", self.ritmo_ewma_segundos)
+                self.ritmo_inactivo_segundos = interfaz_config.get("ritmo_inactivo_segundos", self.ritmo_inactivo_segundos)
 
                 # Cargar configuración de sincronización
                 sincronizacion_config = config_data.get("sincronizacion", {})
@@ -101,23 +161,53 @@ class Config:
                     "username": self.sispro_username,
                     "password": self.sispro_password,
                     "empresa_id": self.empresa_id,
-                    "usuario_id": self.usuario_id
+                    "usuario_id": self.usuario_id,
+                    "cache_respuestas": self.sispro_cache_respuestas,
+                    "ttl_estaciones_segundos": self.sispro_ttl_estaciones,
+                    "ttl_ordenes_segundos": self.sispro_ttl_ordenes,
+                    "ttl_avance_segundos": self.sispro_ttl_avance
                 },
                 "rs485": {
                     "port": self.rs485_port,
                     "baudrate": self.rs485_baudrate,
-                    "timeout": self.rs485_timeout
+                    "timeout": self.rs485_timeout,
+                    "protocolo": self.rs485_protocolo,
+                    "modo": self.rs485_modo,
+                    "dispositivos": self.rs485_dispositivos,
+                    "poll_timeout_ms": self.rs485_poll_timeout_ms,
+                    "poll_intervalo_min_ms": self.rs485_poll_intervalo_min_ms,
+                    "poll_intervalo_max_ms": self.rs485_poll_intervalo_max_ms,
+                    "reenvio_timeout_ms": self.rs485_reenvio_timeout_ms,
+                    "negociar_baudrate": self.rs485_negociar_baudrate,
+                    "baudrates": self.rs485_baudrates,
+                    "pruebas_eco": self.rs485_pruebas_eco
                 },
                 "cache": {
+                    "backend": self.cache_backend,
                     "redis_host": self.redis_host,
                     "redis_port": self.redis_port,
+                    "redis_password": self.redis_password,
                     "redis_db": self.redis_db,
-                    "sqlite_file": self.sqlite_file
+                    "sqlite_file": self.sqlite_file,
+                    "sqlite_synchronous": self.sqlite_synchronous,
+                    "flush_intervalo_ms": self.flush_intervalo_ms,
+                    "flush_max_lecturas": self.flush_max_lecturas,
+                    "tamano_pagina": self.tamano_pagina_pendientes,
+                    "conexiones_lectura": self.conexiones_lectura,
+                    "estado_ttl_segundos": self.estado_ttl_segundos,
+                    "estado_max_estaciones": self.estado_max_estaciones,
+                    "retencion_lecturas_dias": self.retencion_lecturas_dias,
+                    "retencion_rollup_minuto_dias": self.retencion_rollup_minuto_dias,
+                    "retencion_rollup_hora_dias": self.retencion_rollup_hora_dias
                 },
                 "interfaz": {
                     "fullscreen": self.fullscreen,
                     "theme": self.theme,
-                    "update_interval": self.update_interval
+                    "update_interval": self.update_interval,
+                    "fps": self.fps,
+                    "ritmo_ventana_segundos": self.ritmo_ventana_segundos,
+                    "ritmo_ewma_segundos": self.ritmo_ewma_segundos,
+                    "ritmo_inactivo_segundos": self.ritmo_inactivo_segundos
                 },
                 "sincronizacion": {
                     "intervalo_minutos": self.intervalo_minutos,
@@ -25,9 +25,11 @@ class EstadoPico(Enum):
     ERROR = "ERROR"
 
 class EstadoManager:
-    def __init__(self):
+    def __init__(self, cache=None):
+        self.cache = cache
         self.estado_actual = EstadoSistema.INACTIVO
         self.estado_pico = {}
+        self.picos = set()
         self.estacion_actual = None
         self.orden_actual = None
         self.ultima_actividad = None
@@ -100,14 +102,32 @@ class EstadoManager:
         """Acciones para estado SINCRONIZANDO"""
         pass
 
-    def actualizar_estado_pico(self, device_id: str, estado: str):
-        """Actualizar estado del Pico"""
+    def _guardar_pico(self, device_id: str, estado: Dict[str, Any]):
+        """Guardar el estado de un Pico (en el estado de estación del cache si hay)"""
+        self.picos.add(device_id)
+        if self.cache:
+            self.cache.guardar_estado_estacion(device_id, estado)
+        else:
+            self.estado_pico[device_id] = estado
+
+    def _leer_pico(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Leer el estado de un Pico (memoria del cache primero, luego el almacén)"""
+        if self.cache:
+            return self.cache.obtener_estado_estacion(device_id)
+        estado = self.estado_pico.get(device_id)
+        return dict(estado) if estado else None
+
+    def actualizar_estado_pico(self, device_id: str, estado: str, **datos):
+        """Actualizar estado del Pico (datos: orden_actual, contador, meta)"""
         try:
-            self.estado_pico[device_id] = {
+            actual = self._leer_pico(device_id) or {}
+            actual.update(datos)
+            actual.update({
                 'estado': estado,
-                'ultima_actividad': datetime.now(),
+                'ultima_actividad': datetime.now().isoformat(),
                 'tiempo_inactivo': 0
-            }
+            })
+            self._guardar_pico(device_id, actual)
 
             self.logger.debug(f"📡 Estado Pico {device_id}: {estado}")
 
@@ -117,9 +137,11 @@ class EstadoManager:
     def actualizar_tiempo_inactivo(self, device_id: str, tiempo: int):
         """Actualizar tiempo de inactividad del Pico"""
         try:
-            if device_id in self.estado_pico:
-                self.estado_pico[device_id]['tiempo_inactivo'] = tiempo
-                self.estado_pico[device_id]['ultima_actividad'] = datetime.now()
+            actual = self._leer_pico(device_id)
+            if actual:
+                actual['tiempo_inactivo'] = tiempo
+                actual['ultima_actividad'] = datetime.now().isoformat()
+                self._guardar_pico(device_id, actual)
 
         except Exception as e:
             self.logger.error(f"❌ Error actualizando tiempo inactivo: {e}")
@@ -128,13 +150,18 @@ class EstadoManager:
         """Obtener estado del Pico"""
         try:
             if device_id:
-                return self.estado_pico.get(device_id, {
+                return self._leer_pico(device_id) or {
                     'estado': 'DESCONECTADO',
                     'ultima_actividad': None,
                     'tiempo_inactivo': 0
-                })
+                }
             else:
-                return self.estado_pico
+                estados = {}
+                for pico in sorted(self.picos):
+                    estado = self._leer_pico(pico)
+                    if estado:
+                        estados[pico] = estado
+                return estados
 
         except Exception as e:
             self.logger.error(f"❌ Error obteniendo estado Pico: {e}")
@@ -143,10 +170,10 @@ class EstadoManager:
     def verificar_estado_pico(self, device_id: str) -> bool:
         """Verificar si el Pico está activo"""
         try:
-            if device_id not in self.estado_pico:
+            estado = self._leer_pico(device_id)
+            if not estado:
                 return False
 
-            estado = self.estado_pico[device_id]
             ultima_actividad = estado.get('ultima_actividad')
 
             if not ultima_actividad:
@@ -154,7 +181,7 @@ class EstadoManager:
 
             # Considerar inactivo si no hay actividad en los últimos 60 segundos
             tiempo_limite = datetime.now() - timedelta(seconds=60)
-            return ultima_actividad > tiempo_limite
+            return datetime.fromisoformat(ultima_actividad) > tiempo_limite
 
         except Exception as e:
             self.logger.error(f"❌ Error verificando estado Pico: {e}")
@@ -186,7 +213,7 @@ class EstadoManager:
                 'orden_actual': self.orden_actual,
                 'ultima_actividad': self.ultima_actividad,
                 'errores_consecutivos': self.errores_consecutivos,
-                'estados_pico': self.estado_pico
+                'estados_pico': self.obtener_estado_pico()
             }
 
         except Exception as e:
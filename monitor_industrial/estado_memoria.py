@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Estado en Memoria - Estado de estaciones con versión, TTL y desalojo LRU
+
+El proceso ya conoce el estado de sus estaciones: se sirve desde un dict
+local en vez de ir a Redis en cada consulta. Cada escritura incrementa la
+versión de la entrada, lo que permite al escritor diferido descartar
+réplicas ya superadas. Una entrada vencida (TTL) se vuelve a leer de
+SQLite, así se ven cambios hechos por otro proceso.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class EstadoMemoria:
+    def __init__(self, ttl: float = 300.0, max_entradas: int = 64):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+
+        # clave -> (version, vence, valor); el orden es el de uso (LRU)
+        self._entradas: 'OrderedDict[str, Tuple[int, float, Dict[str, Any]]]' = OrderedDict()
+        self._versiones: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        # Estadísticas
+        self.aciertos = 0
+        self.fallos = 0
+        self.vencidas = 0
+        self.desalojadas = 0
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Obtener una copia del estado si está vigente, None si hay que cargarlo"""
+        # Lectura sin lock: get y move_to_end son atómicos con el GIL
+        entrada = self._entradas.get(clave)
+        if entrada is None or entrada[1] < time.monotonic():
+            if entrada is not None:
+                with self.lock:
+                    if self._entradas.get(clave) is entrada:
+                        del self._entradas[clave]
+                        self.vencidas += 1
+            self.fallos += 1
+            return None
+        try:
+            self._entradas.move_to_end(clave)
+        except KeyError:
+            # Desalojada entre get y move_to_end; la copia sigue siendo válida
+            pass
+        self.aciertos += 1
+        return dict(entrada[2])
+
+    def guardar(self, clave: str, valor: Dict[str, Any]) -> int:
+        """Guardar el estado y retornar su nueva versión"""
+        with self.lock:
+            version = self._versiones.get(clave, 0) + 1
+            self._versiones[clave] = version
+            self._insertar(clave, version, valor)
+            return version
+
+    def cargar(self, clave: str, valor: Dict[str, Any]):
+        """Poblar desde SQLite sin crear versión nueva (no requiere réplica)"""
+        with self.lock:
+            self._insertar(clave, self._versiones.get(clave, 0), valor)
+
+    def _insertar(self, clave: str, version: int, valor: Dict[str, Any]):
+        self._entradas[clave] = (version, time.monotonic() + self.ttl, dict(valor))
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+            self.desalojadas += 1
+
+    def version(self, clave: str) -> int:
+        """Última versión escrita de una clave (0 si nunca se escribió)"""
+        return self._versiones.get(clave, 0)
+
+    def obtener_estadisticas(self) -> Dict[str, int]:
+        """Obtener aciertos, fallos, vencidas y desalojadas"""
+        with self.lock:
+            return {
+                'entradas': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'vencidas': self.vencidas,
+                'desalojadas': self.desalojadas
+            }
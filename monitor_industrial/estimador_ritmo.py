@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Estimador de Ritmo - Piezas por minuto, tiempo restante e inactividad
+
+Se alimenta con los deltas de conteo a medida que llegan:
+
+- Ventana deslizante: un anillo de tamaño fijo con las piezas de cada
+  ranura de tiempo y su suma corrida; el ritmo de la ventana es la suma
+  sobre su duración.
+- EWMA con constante de tiempo: suaviza el ritmo entre eventos aunque
+  lleguen a intervalos irregulares; se usa para el tiempo restante.
+- Inactividad: segundos desde la última pieza contra un umbral.
+
+Memoria constante y tiempo constante por evento (avanzar el anillo limpia
+a lo sumo sus ranuras), así nunca frena la ingesta.
+"""
+
+import math
+import time
+import threading
+from typing import Dict, Any, Optional
+
+
+def formatear_duracion(segundos: Optional[float]) -> str:
+    """Formatear segundos como '1h 23m', '4m 10s' o '35s'"""
+    if segundos is None:
+        return "--"
+    segundos = int(segundos)
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}h {minutos:02d}m"
+    if minutos:
+        return f"{minutos}m {segundos:02d}s"
+    return f"{segundos}s"
+
+
+class EstimadorRitmo:
+    def __init__(self, ventana_segundos: float = 60.0, ranuras: int = 60,
+                 ewma_segundos: float = 30.0, inactivo_segundos: float = 30.0):
+        self.ventana = ventana_segundos
+        self.ranuras = ranuras
+        self.duracion_ranura = ventana_segundos / ranuras
+        self.ewma_segundos = ewma_segundos
+        self.inactivo_segundos = inactivo_segundos
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvidar el ritmo acumulado (cambio de orden)"""
+        with self.lock:
+            self._anillo = [0] * self.ranuras
+            self._suma = 0
+            self._ranura_actual = None
+            self._inicio = None
+            self._ultima_pieza = None
+            self._ewma = 0.0
+            self._ewma_lista = False
+
+    def _avanzar(self, ranura: int):
+        """Limpiar las ranuras que quedaron fuera de la ventana (con lock)"""
+        if self._ranura_actual is None:
+            self._ranura_actual = ranura
+            return
+        pasos = min(ranura - self._ranura_actual, self.ranuras)
+        for paso in range(1, pasos + 1):
+            indice = (self._ranura_actual + paso) % self.ranuras
+            self._suma -= self._anillo[indice]
+            self._anillo[indice] = 0
+        if ranura > self._ranura_actual:
+            self._ranura_actual = ranura
+
+    def registrar(self, piezas: int, instante: Optional[float] = None):
+        """Registrar un delta de conteo (negativo para un UNDO)"""
+        if not piezas:
+            return
+        if instante is None:
+            instante = time.monotonic()
+
+        with self.lock:
+            self._avanzar(int(instante // self.duracion_ranura))
+            self._anillo[self._ranura_actual % self.ranuras] += piezas
+            self._suma += piezas
+
+            if self._inicio is None:
+                self._inicio = instante
+            if piezas < 0:
+                return
+
+            # EWMA del ritmo instantáneo; el peso depende del tiempo transcurrido
+            # (el primer intervalo la inicializa para no arrancar desde cero)
+            if self._ultima_pieza is not None:
+                intervalo = instante - self._ultima_pieza
+                if intervalo > 0:
+                    instantaneo = piezas * 60.0 / intervalo
+                    if self._ewma_lista:
+                        alfa = 1.0 - math.exp(-intervalo / self.ewma_segundos)
+                        self._ewma += alfa * (instantaneo - self._ewma)
+                    else:
+                        self._ewma = instantaneo
+                        self._ewma_lista = True
+            self._ultima_pieza = instante
+
+    def obtener_ritmo(self, meta: int = 0, contador: int = 0,
+                      instante: Optional[float] = None) -> Dict[str, Any]:
+        """Piezas por minuto, tiempo restante hasta la meta e inactividad"""
+        if instante is None:
+            instante = time.monotonic()
+
+        with self.lock:
+            self._avanzar(int(instante // self.duracion_ranura))
+
+            # Mientras la ventana no se llena, dividir por el tiempo observado
+            observado = self.ventana
+            if self._inicio is not None:
+                observado = min(self.ventana, max(instante - self._inicio, self.duracion_ranura))
+            piezas_minuto = max(self._suma, 0) * 60.0 / observado
+
+            sin_piezas = None if self._ultima_pieza is None else instante - self._ultima_pieza
+            inactivo = sin_piezas is None or sin_piezas >= self.inactivo_segundos
+            ewma = self._ewma
+
+        restante = None
+        if meta > 0 and not inactivo and ewma > 0:
+            restante = max(meta - contador, 0) * 60.0 / ewma
+
+        return {
+            'piezas_minuto': piezas_minuto,
+            'piezas_minuto_ewma': ewma,
+            'segundos_restantes': restante,
+            'segundos_sin_piezas': sin_piezas,
+            'inactivo': inactivo
+        }
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Ingesta de Conteos - Convierte el contador acumulado del Pico en deltas
+
+El Pico reporta en CONT su contador acumulado. Guardar cada instantanea
+hace que la sincronizacion sume valores repetidos; aqui se conserva el
+ultimo valor visto por estacion y solo se entrega la diferencia:
+
+- Primera lectura de una estacion: fija la base (delta 0), salvo que
+  exista un punto de control guardado.
+- RESET:<base>: el Pico reinicio su contador a <base> (tara o arranque).
+- Un CONT menor al anterior sin RESET es un UNDO y produce delta negativo.
+
+El punto de control (ultimo contador por estacion) debe persistirse en la
+misma transaccion que las lecturas que cubre: si quedara atras de ellas,
+tras un reinicio el primer CONT volveria a contar esas piezas. Por eso
+viaja adjunto a la lectura (punto_control) o, si no hubo lectura, solo por
+la cola del escritor con guardar_checkpoint.
+"""
+
+import threading
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+class IngestaConteos:
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.logger = logging.getLogger(__name__)
+
+        # Ultimo contador visto y ultimo encolado como punto de control
+        self.contadores: Dict[str, int] = {}
+        self._guardados: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        # Estadisticas
+        self.resets = 0
+        self.undos = 0
+
+    def _clave_checkpoint(self, device_id: str) -> str:
+        return f"contador_{device_id}"
+
+    def _cargar_checkpoint(self, device_id: str) -> Optional[int]:
+        """Recuperar el ultimo contador guardado de una estacion"""
+        if not self.cache:
+            return None
+        valor = self.cache.obtener_configuracion(self._clave_checkpoint(device_id))
+        return int(valor) if valor is not None else None
+
+    def punto_control(self, device_id: str) -> Optional[Tuple[str, int]]:
+        """Punto de control (clave, contador) para adjuntar a la lectura del delta"""
+        with self.lock:
+            valor = self.contadores.get(device_id)
+            if valor is None:
+                return None
+            self._guardados[device_id] = valor
+            return self._clave_checkpoint(device_id), valor
+
+    def guardar_checkpoint(self, device_id: str):
+        """Encolar el contador de una estacion si cambio sin acompañar una lectura"""
+        if not self.cache:
+            return
+        with self.lock:
+            valor = self.contadores.get(device_id)
+            if valor is None or self._guardados.get(device_id) == valor:
+                return
+            self._guardados[device_id] = valor
+        # Sin esperar al escritor: va en el siguiente lote, en orden con las lecturas
+        self.cache.guardar_punto_control(self._clave_checkpoint(device_id), valor)
+
+    def procesar(self, device_id: str, tag: str, valor: int) -> int:
+        """Procesar un TAG del Pico y retornar las piezas nuevas (0 si no hay)"""
+        if tag == 'RESET':
+            self.registrar_reset(device_id, valor)
+            return 0
+        if tag == 'CONT':
+            return self.procesar_conteo(device_id, valor)
+        return 0
+
+    def procesar_conteo(self, device_id: str, valor: int) -> int:
+        """Convertir una instantanea CONT en delta respecto a la anterior"""
+        with self.lock:
+            anterior = self.contadores.get(device_id)
+            if anterior is None:
+                anterior = self._cargar_checkpoint(device_id)
+                if anterior is None:
+                    # Primera vez que se ve la estacion: solo fijar base
+                    self.contadores[device_id] = valor
+                    return 0
+                self._guardados[device_id] = anterior
+
+            delta = valor - anterior
+            self.contadores[device_id] = valor
+
+            if delta < 0:
+                self.undos += 1
+                self.logger.debug(f"↩️ UNDO en {device_id}: {anterior} -> {valor}")
+            return delta
+
+    def registrar_reset(self, device_id: str, base: int):
+        """Fijar una nueva base tras un RESET del contador en el Pico"""
+        with self.lock:
+            self.contadores[device_id] = base
+            self.resets += 1
+        self.logger.info(f"🔄 Contador de {device_id} reiniciado a {base}")
+
+    def guardar_checkpoints(self):
+        """Guardar el contador actual de todas las estaciones (al detener)"""
+        if not self.cache:
+            return
+        with self.lock:
+            contadores = dict(self.contadores)
+            self._guardados.update(contadores)
+        for device_id, valor in contadores.items():
+            self.cache.guardar_configuracion(self._clave_checkpoint(device_id), valor)
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """Obtener contadores por estacion y eventos de RESET/UNDO"""
+        with self.lock:
+            return {
+                'contadores': dict(self.contadores),
+                'resets': self.resets,
+                'undos': self.undos
+            }
@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import logging
 
+from estimador_ritmo import formatear_duracion
+
 class InterfazIndustrial:
     def __init__(self, monitor):
         self.monitor = monitor
@@ -28,6 +30,17 @@ class InterfazIndustrial:
         self.ultima_sincronizacion_var = tk.StringVar(value="N/A")
         self.estado_pico_var = tk.StringVar(value="DESCONECTADO")
         self.tiempo_inactivo_var = tk.StringVar(value="0s")
+        self.ritmo_var = tk.StringVar(value="0 pzs/min")
+        self.tiempo_restante_var = tk.StringVar(value="--")
+        self.ultimo_minuto_var = tk.StringVar(value="0 pzs")
+        self.hoy_var = tk.StringVar(value="0 pzs")
+        self.ritmo_label = None
+
+        # Estado publicado por los threads; el thread de Tk solo aplica lo que cambio
+        self._estado_ui: Dict[str, Any] = {}
+        self._sucios = set()
+        self._lock_ui = threading.Lock()
+        self._ultimo_muestreo = 0.0
 
         # Colores del tema industrial
         self.colores = {
@@ -259,6 +272,73 @@ class InterfazIndustrial:
                 bg=self.colores['panel']
             ).grid(row=0, column=3, padx=20, sticky=tk.W)
 
+            # Ritmo y tiempo estimado restante
+            tk.Label(
+                meta_frame,
+                text="RITMO:",
+                font=self.fuente_grande,
+                fg=self.colores['texto'],
+                bg=self.colores['panel']
+            ).grid(row=1, column=0, padx=20, pady=(10, 0), sticky=tk.W)
+
+            self.ritmo_label = tk.Label(
+                meta_frame,
+                textvariable=self.ritmo_var,
+                font=self.fuente_grande,
+                fg=self.colores['accento'],
+                bg=self.colores['panel']
+            )
+            self.ritmo_label.grid(row=1, column=1, padx=20, pady=(10, 0), sticky=tk.W)
+
+            tk.Label(
+                meta_frame,
+                text="RESTANTE:",
+                font=self.fuente_grande,
+                fg=self.colores['texto'],
+                bg=self.colores['panel']
+            ).grid(row=1, column=2, padx=20, pady=(10, 0), sticky=tk.W)
+
+            tk.Label(
+                meta_frame,
+                textvariable=self.tiempo_restante_var,
+                font=self.fuente_grande,
+                fg=self.colores['accento'],
+                bg=self.colores['panel']
+            ).grid(row=1, column=3, padx=20, pady=(10, 0), sticky=tk.W)
+
+            # Producción persistida, leída de los rollups del cache
+            tk.Label(
+                meta_frame,
+                text="ÚLTIMO MIN:",
+                font=self.fuente_grande,
+                fg=self.colores['texto'],
+                bg=self.colores['panel']
+            ).grid(row=2, column=0, padx=20, pady=(10, 0), sticky=tk.W)
+
+            tk.Label(
+                meta_frame,
+                textvariable=self.ultimo_minuto_var,
+                font=self.fuente_grande,
+                fg=self.colores['accento'],
+                bg=self.colores['panel']
+            ).grid(row=2, column=1, padx=20, pady=(10, 0), sticky=tk.W)
+
+            tk.Label(
+                meta_frame,
+                text="HOY:",
+                font=self.fuente_grande,
+                fg=self.colores['texto'],
+                bg=self.colores['panel']
+            ).grid(row=2, column=2, padx=20, pady=(10, 0), sticky=tk.W)
+
+            tk.Label(
+                meta_frame,
+                textvariable=self.hoy_var,
+                font=self.fuente_grande,
+                fg=self.colores['accento'],
+                bg=self.colores['panel']
+            ).grid(row=2, column=3, padx=20, pady=(10, 0), sticky=tk.W)
+
             # Barra de progreso
             self.progreso_barra = ttk.Progressbar(
                 panel,
@@ -463,45 +543,96 @@ class InterfazIndustrial:
         """Iniciar actualizaciones automáticas de la interfaz"""
         try:
             self.actualizar_interfaz()
-            self.root.after(self.monitor.config.update_interval, self.iniciar_actualizaciones)
+            self.root.after(max(1, 1000 // self.monitor.config.fps), self.iniciar_actualizaciones)
         except Exception as e:
             self.logger.error(f"❌ Error en actualizaciones: {e}")
 
-    def actualizar_interfaz(self):
-        """Actualizar elementos de la interfaz"""
-        try:
-            # Actualizar estado del sistema
-            self.estado_var.set(self.monitor.estado.estado_actual.value)
+    def publicar(self, **campos):
+        """Publicar valores para la interfaz (seguro desde cualquier thread)"""
+        with self._lock_ui:
+            for campo, valor in campos.items():
+                if self._estado_ui.get(campo) != valor:
+                    self._estado_ui[campo] = valor
+                    self._sucios.add(campo)
+
+    def muestrear_monitor(self):
+        """Publicar el estado del monitor que no llega por eventos"""
+        campos = {
+            'estado': self.monitor.estado.estado_actual.value,
+            'contador': str(self.monitor.lecturas_acumuladas)
+        }
 
-            # Actualizar información de la estación
-            if self.monitor.estacion_actual:
-                self.estacion_var.set(self.monitor.estacion_actual.get('nombre', 'N/A'))
+        if self.monitor.estacion_actual:
+            campos['estacion'] = self.monitor.estacion_actual.get('nombre', 'N/A')
 
-            # Actualizar información de la orden
-            if self.monitor.orden_actual:
-                self.orden_var.set(self.monitor.orden_actual.get('ordenFabricacion', 'N/A'))
-                self.upc_var.set(self.monitor.orden_actual.get('ptUPC', 'N/A'))
+        if self.monitor.orden_actual:
+            campos['orden'] = self.monitor.orden_actual.get('ordenFabricacion', 'N/A')
+            campos['upc'] = self.monitor.orden_actual.get('ptUPC', 'N/A')
+            meta = self.monitor.orden_actual.get('cantidadFabricar', 0)
+            campos['meta'] = str(meta)
+            campos['progreso'] = (self.monitor.lecturas_acumuladas / meta) * 100 if meta > 0 else 0
 
-                # Actualizar meta y progreso
-                meta = self.monitor.orden_actual.get('cantidadFabricar', 0)
-                self.meta_var.set(str(meta))
+            # El ritmo decae sin eventos, por eso se muestrea aquí
+            ritmo = self.monitor.ritmo.obtener_ritmo(meta, self.monitor.lecturas_acumuladas)
+            campos['ritmo'] = f"{ritmo['piezas_minuto']:.0f} pzs/min"
+            campos['tiempo_restante'] = formatear_duracion(ritmo['segundos_restantes'])
+            campos['ritmo_inactivo'] = ritmo['inactivo']
 
-                if meta > 0:
-                    progreso = (self.monitor.lecturas_acumuladas / meta) * 100
-                    self.progreso_var.set(f"{progreso:.1f}%")
-                    self.progreso_barra['value'] = progreso
-                else:
-                    self.progreso_var.set("0%")
-                    self.progreso_barra['value'] = 0
+        if self.monitor.estacion_actual:
+            # Rollups del cache: el minuto desde memoria, el día desde las horas
+            estacion_id = str(self.monitor.estacion_actual.get('id', ''))
+            ultimo_minuto = self.monitor.cache.obtener_lecturas_por_minuto(estacion_id)
+            campos['ultimo_minuto'] = f"{ultimo_minuto['cantidad']} pzs"
+            hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            horas = self.monitor.cache.obtener_rollup('hora', hoy, estacion_id=estacion_id)
+            campos['hoy'] = f"{sum(fila['cantidad'] for fila in horas)} pzs"
 
-            # Actualizar contador
-            self.contador_var.set(str(self.monitor.lecturas_acumuladas))
+        if self.monitor.ultima_sincronizacion:
+            campos['ultima_sincronizacion'] = self.monitor.ultima_sincronizacion.strftime("%H:%M:%S")
 
-            # Actualizar última sincronización
-            if self.monitor.ultima_sincronizacion:
-                self.ultima_sincronizacion_var.set(
-                    self.monitor.ultima_sincronizacion.strftime("%H:%M:%S")
-                )
+        self.publicar(**campos)
+
+    def actualizar_interfaz(self):
+        """Aplicar a los widgets solo los valores que cambiaron"""
+        try:
+            ahora = time.monotonic()
+            if (ahora - self._ultimo_muestreo) * 1000 >= self.monitor.config.update_interval:
+                self._ultimo_muestreo = ahora
+                self.muestrear_monitor()
+
+            with self._lock_ui:
+                if not self._sucios:
+                    return
+                cambios = {campo: self._estado_ui[campo] for campo in self._sucios}
+                self._sucios.clear()
+
+            variables = {
+                'estado': self.estado_var,
+                'estacion': self.estacion_var,
+                'orden': self.orden_var,
+                'upc': self.upc_var,
+                'meta': self.meta_var,
+                'contador': self.contador_var,
+                'ultima_sincronizacion': self.ultima_sincronizacion_var,
+                'estado_pico': self.estado_pico_var,
+                'tiempo_inactivo': self.tiempo_inactivo_var,
+                'ritmo': self.ritmo_var,
+                'tiempo_restante': self.tiempo_restante_var,
+                'ultimo_minuto': self.ultimo_minuto_var,
+                'hoy': self.hoy_var
+            }
+            for campo, valor in cambios.items():
+                if campo in variables:
+                    variables[campo].set(valor)
+
+            if 'progreso' in cambios:
+                progreso = cambios['progreso']
+                self.progreso_var.set(f"{progreso:.1f}%" if progreso else "0%")
+                self.progreso_barra['value'] = progreso
+
+            if 'ritmo_inactivo' in cambios and self.ritmo_label:
+                color = 'advertencia' if cambios['ritmo_inactivo'] else 'accento'
+                self.ritmo_label.configure(fg=self.colores[color])
 
         except Exception as e:
             self.logger.error(f"❌ Error actualizando interfaz: {e}")
@@ -509,15 +640,16 @@ class InterfazIndustrial:
     def actualizar_contador(self, valor: int):
         """Actualizar contador en tiempo real"""
         try:
-            self.contador_var.set(str(valor))
+            campos = {'contador': str(valor)}
 
             # Actualizar progreso si hay meta
-            if self.monitor.orden_actual:
-                meta = self.monitor.orden_actual.get('cantidadFabricar', 0)
+            orden = self.monitor.orden_actual
+            if orden:
+                meta = orden.get('cantidadFabricar', 0)
                 if meta > 0:
-                    progreso = (valor / meta) * 100
-                    self.progreso_var.set(f"{progreso:.1f}%")
-                    self.progreso_barra['value'] = progreso
+                    campos['progreso'] = (valor / meta) * 100
+
+            self.publicar(**campos)
 
         except Exception as e:
             self.logger.error(f"❌ Error actualizando contador: {e}")
@@ -526,11 +658,7 @@ class InterfazIndustrial:
         """Actualizar avance de la orden"""
         try:
             if avance:
-                cantidad_pendiente = avance.get('cantidadPendiente', 0)
-                avance_porcentaje = avance.get('avance', 0) * 100
-
-                self.progreso_var.set(f"{avance_porcentaje:.1f}%")
-                self.progreso_barra['value'] = avance_porcentaje
+                self.publicar(progreso=avance.get('avance', 0) * 100)
 
         except Exception as e:
             self.logger.error(f"❌ Error actualizando avance: {e}")
@@ -539,8 +667,10 @@ class InterfazIndustrial:
         """Actualizar estado del Pico"""
         try:
             if estado:
-                self.estado_pico_var.set(estado.get('estado', 'DESCONECTADO'))
-                self.tiempo_inactivo_var.set(f"{estado.get('tiempo_inactivo', 0)}s")
+                self.publicar(
+                    estado_pico=estado.get('estado', 'DESCONECTADO'),
+                    tiempo_inactivo=f"{estado.get('tiempo_inactivo', 0)}s"
+                )
 
         except Exception as e:
             self.logger.error(f"❌ Error actualizando estado Pico: {e}")
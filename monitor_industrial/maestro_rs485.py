@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Maestro RS485 - Sondeo de multiples estaciones Pico en un mismo bus
+"""
+
+import time
+import threading
+import logging
+from typing import Dict, Any, Optional
+
+class MaestroRS485:
+    def __init__(self, config, rs485):
+        self.config = config
+        self.rs485 = rs485
+        self.timeout_respuesta = config.rs485_poll_timeout_ms / 1000.0
+        self.intervalo_min = config.rs485_poll_intervalo_min_ms / 1000.0
+        self.intervalo_max = config.rs485_poll_intervalo_max_ms / 1000.0
+        self.max_timeouts = 5
+        self.running = False
+        self.logger = logging.getLogger(__name__)
+
+        # Estado y contadores por estacion
+        self.dispositivos: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+        # Transaccion de sondeo en curso
+        self._en_curso: Optional[str] = None
+        self._mensajes_en_curso = 0
+        self._fin_respuesta = threading.Event()
+        self._hay_dispositivos = threading.Event()
+
+        self.rs485.agregar_callback(self._procesar_mensaje)
+
+        for device_id in config.rs485_dispositivos or []:
+            self.registrar_dispositivo(device_id)
+
+    def registrar_dispositivo(self, device_id: str):
+        """Registrar una estacion para sondeo"""
+        with self.lock:
+            if device_id in self.dispositivos:
+                return
+            self.dispositivos[device_id] = {
+                'intervalo': self.intervalo_min,
+                'proximo_poll': time.monotonic(),
+                'timeouts_consecutivos': 0,
+                'en_linea': True,
+                'polls': 0,
+                'respuestas': 0,
+                'timeouts': 0,
+                'mensajes': 0,
+                'latencia_ultima': 0.0,
+                'latencia_promedio': 0.0,
+                'latencia_max': 0.0,
+                'registrado': time.monotonic()
+            }
+        self._hay_dispositivos.set()
+        self.logger.info(f"📡 Estacion registrada en el maestro: {device_id}")
+
+    def eliminar_dispositivo(self, device_id: str):
+        """Quitar una estacion del sondeo"""
+        with self.lock:
+            self.dispositivos.pop(device_id, None)
+            if not self.dispositivos:
+                self._hay_dispositivos.clear()
+
+    def iniciar(self):
+        """Tomar control del bus y pasar las estaciones a modo sondeo"""
+        self.running = True
+        self.rs485.enviar_comando("*:MAESTRO:1")
+
+    def detener(self):
+        """Detener el sondeo"""
+        self.running = False
+        self._hay_dispositivos.set()
+        self._fin_respuesta.set()
+
+    def _procesar_mensaje(self, mensaje: str):
+        """Callback del lector RS485: contar mensajes y detectar fin de respuesta"""
+        partes = mensaje.split(':')
+        if len(partes) != 3:
+            return
+
+        device_id, tag = partes[0], partes[1]
+        if device_id not in self.dispositivos:
+            # Estacion nueva que se anuncio en el bus
+            self.registrar_dispositivo(device_id)
+
+        if device_id != self._en_curso:
+            return
+
+        if tag == 'FIN':
+            self._fin_respuesta.set()
+        else:
+            self._mensajes_en_curso += 1
+
+    def _siguiente_dispositivo(self) -> Optional[str]:
+        """Elegir la estacion con el sondeo mas proximo"""
+        with self.lock:
+            if not self.dispositivos:
+                return None
+            return min(self.dispositivos, key=lambda d: self.dispositivos[d]['proximo_poll'])
+
+    def sondear(self, device_id: str) -> bool:
+        """Sondear una estacion y esperar su respuesta completa"""
+        with self.rs485.lock_bus:
+            self._mensajes_en_curso = 0
+            self._fin_respuesta.clear()
+            self._en_curso = device_id
+
+            # Los pedidos de reenvio viajan antes del sondeo y se responden en el
+            self.rs485.enviar_reenvios_pendientes()
+
+            inicio = time.monotonic()
+            self.rs485.enviar_comando(f"{device_id}:POLL:0")
+            respondio = self._fin_respuesta.wait(self.timeout_respuesta)
+            latencia = time.monotonic() - inicio
+
+            self._en_curso = None
+            mensajes = self._mensajes_en_curso
+
+        self._actualizar_dispositivo(device_id, respondio, mensajes, latencia)
+        return respondio
+
+    def _actualizar_dispositivo(self, device_id: str, respondio: bool, mensajes: int, latencia: float):
+        """Actualizar contadores e intervalo adaptativo de una estacion"""
+        with self.lock:
+            disp = self.dispositivos.get(device_id)
+            if not disp:
+                return
+
+            disp['polls'] += 1
+            if respondio:
+                disp['respuestas'] += 1
+                disp['mensajes'] += mensajes
+                disp['timeouts_consecutivos'] = 0
+                disp['en_linea'] = True
+                disp['latencia_ultima'] = latencia
+                disp['latencia_max'] = max(disp['latencia_max'], latencia)
+                if disp['respuestas'] == 1:
+                    disp['latencia_promedio'] = latencia
+                else:
+                    disp['latencia_promedio'] += (latencia - disp['latencia_promedio']) * 0.1
+
+                # Estaciones con datos se sondean mas seguido
+                if mensajes > 0:
+                    disp['intervalo'] = max(self.intervalo_min, disp['intervalo'] / 2)
+                else:
+                    disp['intervalo'] = min(self.intervalo_max, disp['intervalo'] * 1.5)
+            else:
+                disp['timeouts'] += 1
+                disp['timeouts_consecutivos'] += 1
+                disp['intervalo'] = self.intervalo_max
+                if disp['en_linea'] and disp['timeouts_consecutivos'] >= self.max_timeouts:
+                    disp['en_linea'] = False
+                    self.logger.warning(f"⚠️ Estacion {device_id} sin respuesta al sondeo")
+
+            disp['proximo_poll'] = time.monotonic() + disp['intervalo']
+
+    def ejecutar(self):
+        """Bucle de sondeo (para usar en thread)"""
+        self.iniciar()
+        while self.running:
+            try:
+                device_id = self._siguiente_dispositivo()
+                if not device_id:
+                    self._hay_dispositivos.wait(1)
+                    continue
+
+                espera = self.dispositivos[device_id]['proximo_poll'] - time.monotonic()
+                if espera > 0:
+                    time.sleep(min(espera, self.intervalo_max))
+                    continue
+
+                self.sondear(device_id)
+
+            except Exception as e:
+                self.logger.error(f"❌ Error en sondeo RS485: {e}")
+                time.sleep(1)
+
+    def obtener_estadisticas(self) -> Dict[str, Dict[str, Any]]:
+        """Obtener latencia y throughput por estacion"""
+        ahora = time.monotonic()
+        with self.lock:
+            estadisticas = {}
+            for device_id, disp in self.dispositivos.items():
+                transcurrido = max(ahora - disp['registrado'], 1e-6)
+                estadisticas[device_id] = {
+                    'en_linea': disp['en_linea'],
+                    'intervalo_ms': round(disp['intervalo'] * 1000),
+                    'polls': disp['polls'],
+                    'respuestas': disp['respuestas'],
+                    'timeouts': disp['timeouts'],
+                    'mensajes': disp['mensajes'],
+                    'mensajes_por_segundo': disp['mensajes'] / transcurrido,
+                    'latencia_ultima_ms': disp['latencia_ultima'] * 1000,
+                    'latencia_promedio_ms': disp['latencia_promedio'] * 1000,
+                    'latencia_max_ms': disp['latencia_max'] * 1000
+                }
+            return estadisticas
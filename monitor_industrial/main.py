@@ -24,9 +24,12 @@ import sys
 from config import Config
 from sispro_connector import SISPROConnector
 from monitor_rs485 import MonitorRS485
+from maestro_rs485 import MaestroRS485
 from barcode_validator import BarcodeValidator
 from cache_manager import CacheManager
-from estado_manager import EstadoManager
+from ingesta_conteos import IngestaConteos
+from estimador_ritmo import EstimadorRitmo
+from estado_manager import EstadoManager, EstadoSistema
 from interfaz_industrial import InterfazIndustrial
 
 class MonitorIndustrial:
@@ -35,9 +38,16 @@ class MonitorIndustrial:
         self.config = Config()
         self.sispro = SISPROConnector(self.config)
         self.rs485 = MonitorRS485(self.config)
+        self.maestro = None
         self.barcode = BarcodeValidator()
-        self.cache = CacheManager()
-        self.estado = EstadoManager()
+        self.cache = CacheManager(self.config)
+        self.ingesta = IngestaConteos(self.cache)
+        self.ritmo = EstimadorRitmo(
+            ventana_segundos=self.config.ritmo_ventana_segundos,
+            ewma_segundos=self.config.ritmo_ewma_segundos,
+            inactivo_segundos=self.config.ritmo_inactivo_segundos
+        )
+        self.estado = EstadoManager(self.cache)
         self.interfaz = None
 
         # Estado del sistema
@@ -49,6 +59,7 @@ class MonitorIndustrial:
 
         # Threads
         self.thread_rs485 = None
+        self.thread_maestro = None
         self.thread_sincronizacion = None
         self.thread_estado = None
         self.running = False
@@ -133,10 +144,31 @@ class MonitorIndustrial:
 
     def iniciar_threads(self):
         """Iniciar todos los threads del sistema"""
-        # Thread de comunicación RS485
-        self.thread_rs485 = threading.Thread(target=self.procesar_rs485, daemon=True)
+        # Thread de comunicación RS485 (lectura bloqueante, despacho por callback)
+        self.rs485.agregar_callback(self.procesar_rs485)
+        self.thread_rs485 = threading.Thread(target=self.rs485.procesar_mensajes, daemon=True)
         self.thread_rs485.start()
 
+        # Thread maestro: sondea las estaciones para evitar colisiones en el bus.
+        # En sondeo una estacion solo habla si se la sondea: sin la lista de
+        # dispositivos las que aun no se anunciaron quedarian mudas para siempre
+        modo = self.config.rs485_modo
+        if modo == 'maestro' and not self.config.rs485_dispositivos:
+            self.logger.warning("⚠️ rs485.modo = maestro sin rs485.dispositivos: se usa modo libre")
+            modo = 'libre'
+
+        if modo == 'maestro':
+            self.maestro = MaestroRS485(self.config, self.rs485)
+            self.thread_maestro = threading.Thread(target=self.maestro.ejecutar, daemon=True)
+            self.thread_maestro.start()
+        else:
+            # Estaciones que quedaron en sondeo de una ejecucion anterior vuelven a transmitir solas
+            self.rs485.enviar_comando("*:MAESTRO:0")
+
+        # Subir la velocidad del bus con las estaciones que respondan
+        if self.config.rs485_negociar_baudrate:
+            threading.Thread(target=self.negociar_baudrate_rs485, daemon=True).start()
+
         # Thread de sincronización
         self.thread_sincronizacion = threading.Thread(target=self.sincronizar_periodicamente, daemon=True)
         self.thread_sincronizacion.start()
@@ -147,21 +179,35 @@ class MonitorIndustrial:
 
         self.logger.info("✅ Threads iniciados")
 
-    def procesar_rs485(self):
-        """Procesar mensajes RS485 del Pico"""
-        while self.running:
-            try:
-                if self.estado.estado_actual == "PRODUCIENDO" and self.upc_validado:
-                    mensaje = self.rs485.leer_mensaje()
-                    if mensaje:
-                        self.procesar_mensaje_pico(mensaje)
-                time.sleep(0.1)
-            except Exception as e:
-                self.logger.error(f"❌ Error procesando RS485: {e}")
-                time.sleep(1)
+    def negociar_baudrate_rs485(self):
+        """Negociar la velocidad del bus RS485 con las estaciones configuradas"""
+        try:
+            # Solo con rs485.dispositivos: una estación que no participe quedaría
+            # a la velocidad anterior, sin forma de alcanzarla
+            dispositivos = list(self.config.rs485_dispositivos or [])
+            if not dispositivos:
+                self.logger.info(f"ℹ️ Sin rs485.dispositivos configurados: bus RS485 a {self.rs485.baudrate} bps")
+                return
+
+            # Dar tiempo a que las estaciones se anuncien en el bus
+            time.sleep(5)
+            escuchadas = set(self.rs485.protocolo_dispositivos)
+            if self.maestro:
+                with self.maestro.lock:
+                    escuchadas |= set(self.maestro.dispositivos)
+            ajenas = escuchadas - set(dispositivos)
+            if ajenas:
+                self.logger.warning(f"⚠️ Estaciones fuera de rs485.dispositivos en el bus "
+                                    f"({', '.join(sorted(ajenas))}): no se cambia la velocidad")
+                return
+
+            baudrate = self.rs485.negociar_baudrate(dispositivos)
+            self.logger.info(f"✅ Bus RS485 a {baudrate} bps con {len(dispositivos)} estaciones")
+        except Exception as e:
+            self.logger.error(f"❌ Error negociando velocidad RS485: {e}")
 
-    def procesar_mensaje_pico(self, mensaje: str):
-        """Procesar mensaje recibido del Pico"""
+    def procesar_rs485(self, mensaje: str):
+        """Procesar mensaje RS485 del Pico (callback del lector)"""
         try:
             partes = mensaje.strip().split(':')
             if len(partes) != 3:
@@ -170,28 +216,54 @@ class MonitorIndustrial:
             device_id, tag, valor = partes
             valor = int(valor)
 
+            # El contador se sigue siempre para no atribuir piezas de fuera de producción
+            delta = self.ingesta.procesar(device_id, tag, valor)
+
+            guardada = False
+            if self.estado.estado_actual == EstadoSistema.PRODUCIENDO and self.upc_validado:
+                guardada = self.procesar_mensaje_pico(device_id, tag, valor, delta)
+            if not guardada:
+                # Sin lectura que lo lleve, el punto de control viaja solo
+                self.ingesta.guardar_checkpoint(device_id)
+        except Exception as e:
+            self.logger.error(f"❌ Error procesando RS485: {e}")
+
+    def procesar_mensaje_pico(self, device_id: str, tag: str, valor: int, delta: int = 0) -> bool:
+        """Procesar mensaje recibido del Pico; True si guardó una lectura con su punto de control"""
+        try:
             if tag == 'CONT':
-                # Actualizar contador local
-                self.lecturas_acumuladas = valor
+                if not delta:
+                    return False
 
-                # Guardar en cache
+                # Actualizar contador local y ritmo
+                self.lecturas_acumuladas += delta
+                self.ritmo.registrar(delta)
+
+                # Guardar en cache solo las piezas nuevas (o el UNDO como delta negativo)
                 self.cache.guardar_lectura({
                     'orden_fabricacion': self.orden_actual['ordenFabricacion'],
                     'upc': self.upc_validado,
-                    'cantidad': valor,
+                    'cantidad': delta,
                     'timestamp': datetime.now(),
-                    'fuente': 'RS485'
-                })
+                    'fuente': 'RS485',
+                    'estacion_id': self.estacion_actual['id']
+                }, punto_control=self.ingesta.punto_control(device_id))
 
                 # Actualizar interfaz
                 if self.interfaz:
-                    self.interfaz.actualizar_contador(valor)
+                    self.interfaz.actualizar_contador(self.lecturas_acumuladas)
 
-                self.logger.info(f"📊 Conteo actualizado: {valor}")
+                self.logger.info(f"📊 Conteo actualizado: {self.lecturas_acumuladas} ({delta:+d})")
+                return True
 
             elif tag == 'HEARTBEAT':
-                # Actualizar estado del Pico
-                self.estado.actualizar_estado_pico(device_id, 'ACTIVO')
+                # Actualizar estado del Pico (con la orden y el avance de la estación)
+                self.estado.actualizar_estado_pico(
+                    device_id, 'ACTIVO',
+                    orden_actual=self.orden_actual['ordenFabricacion'] if self.orden_actual else None,
+                    contador=self.lecturas_acumuladas,
+                    meta=self.orden_actual.get('cantidadFabricar', 0) if self.orden_actual else 0
+                )
 
             elif tag == 'INACTIVO':
                 # Actualizar tiempo de inactividad
@@ -199,12 +271,13 @@ class MonitorIndustrial:
 
         except Exception as e:
             self.logger.error(f"❌ Error procesando mensaje Pico: {e}")
+        return False
 
     def sincronizar_periodicamente(self):
         """Sincronizar datos con SISPRO periódicamente"""
         while self.running:
             try:
-                if self.estado.estado_actual == "PRODUCIENDO" and self.orden_actual:
+                if self.estado.estado_actual == EstadoSistema.PRODUCIENDO and self.orden_actual:
                     self.sincronizar_lecturas()
                 time.sleep(300)  # Cada 5 minutos
             except Exception as e:
@@ -214,30 +287,44 @@ class MonitorIndustrial:
     def sincronizar_lecturas(self):
         """Sincronizar lecturas acumuladas con SISPRO"""
         try:
-            lecturas_pendientes = self.cache.obtener_lecturas_pendientes()
-            if not lecturas_pendientes:
+            # Reanudar un lote que quedó en vuelo para conservar sus llaves de idempotencia
+            en_vuelo = self.cache.obtener_configuracion('sync_hasta_id')
+            resumen = self.cache.obtener_resumen_pendientes(int(en_vuelo) if en_vuelo else None)
+            if not resumen['grupos']:
                 return
 
-            # Agregar lecturas acumuladas
-            cantidad_total = sum(lectura['cantidad'] for lectura in lecturas_pendientes)
+            self.cache.guardar_configuracion('sync_hasta_id', resumen['hasta_id'])
+
+            # Una entrada por (orden, upc, estación) con la cantidad acumulada
+            lecturas = []
+            for grupo in resumen['grupos']:
+                if not grupo['cantidad']:
+                    continue
+                estacion_id = grupo['estacion_id'] or self.estacion_actual['id']
+                lecturas.append({
+                    'ordenFabricacion': grupo['orden_fabricacion'],
+                    'upc': grupo['upc'],
+                    'estacionId': estacion_id,
+                    'usuarioId': self.config.usuario_id,
+                    'cantidad': grupo['cantidad'],
+                    'fechaLectura': grupo['ultima_lectura'],
+                    'fuente': 'RS485',
+                    'idempotencyKey': f"{estacion_id}:{grupo['orden_fabricacion']}:{grupo['upc']}:{grupo['desde_id']}-{grupo['hasta_id']}"
+                })
 
             # Enviar a SISPRO
-            success = self.sispro.registrar_lectura_upc(
-                orden_fabricacion=self.orden_actual['ordenFabricacion'],
-                upc=self.upc_validado,
-                estacion_id=self.estacion_actual['id'],
-                usuario_id=self.config.usuario_id
-            )
+            success = self.sispro.registrar_lecturas_lote(lecturas) if lecturas else True
 
             if success:
-                # Marcar como sincronizadas
-                self.cache.marcar_como_sincronizadas(lecturas_pendientes)
+                # Marcar como sincronizadas con una sola actualización por rango
+                self.cache.marcar_sincronizadas_hasta(resumen['hasta_id'], resumen['desde_id'])
+                self.cache.guardar_configuracion('sync_hasta_id', None)
                 self.ultima_sincronizacion = datetime.now()
 
                 # Actualizar avance
                 self.actualizar_avance_orden()
 
-                self.logger.info(f"✅ Sincronizadas {len(lecturas_pendientes)} lecturas")
+                self.logger.info(f"✅ Sincronizadas {resumen['lecturas']} lecturas en {len(lecturas)} registros")
             else:
                 self.logger.warning("⚠️ Error sincronizando lecturas")
 
@@ -302,7 +389,7 @@ class MonitorIndustrial:
             orden = self.interfaz.mostrar_seleccion_orden(ordenes)
             if orden:
                 self.orden_actual = orden
-                self.estado.cambiar_estado("ESPERANDO_UPC")
+                self.estado.cambiar_estado(EstadoSistema.ESPERANDO_UPC)
                 self.logger.info(f"✅ Orden seleccionada: {orden['ordenFabricacion']}")
                 return True
             return False
@@ -320,7 +407,8 @@ class MonitorIndustrial:
             # Validar UPC contra la orden
             if upc == self.orden_actual['ptUPC']:
                 self.upc_validado = upc
-                self.estado.cambiar_estado("PRODUCIENDO")
+                self.ritmo.reiniciar()
+                self.estado.cambiar_estado(EstadoSistema.PRODUCIENDO)
 
                 # Activar comunicación con Pico
                 self.activar_pico()
@@ -371,7 +459,8 @@ class MonitorIndustrial:
                 self.orden_actual = None
                 self.upc_validado = None
                 self.lecturas_acumuladas = 0
-                self.estado.cambiar_estado("INACTIVO")
+                self.ritmo.reiniciar()
+                self.estado.cambiar_estado(EstadoSistema.INACTIVO)
 
                 self.logger.info("✅ Orden finalizada")
 
@@ -393,15 +482,18 @@ class MonitorIndustrial:
             self.running = False
 
             # Finalizar orden si está activa
-            if self.estado.estado_actual == "PRODUCIENDO":
+            if self.estado.estado_actual == EstadoSistema.PRODUCIENDO:
                 self.finalizar_orden()
 
             # Desactivar Pico
             self.desactivar_pico()
 
             # Cerrar conexiones
+            if self.maestro:
+                self.maestro.detener()
             self.rs485.desconectar()
             self.sispro.desconectar()
+            self.ingesta.guardar_checkpoints()
             self.cache.cerrar()
 
             self.logger.info("🛑 Monitor detenido")
@@ -5,10 +5,15 @@ Monitor RS485 - Comunicación con Raspberry Pi Pico
 
 import serial
 import time
+import random
 import threading
 import logging
-from typing import Optional, Callable
-from queue import Queue
+from typing import Optional, Callable, Dict, Any, List, Set
+from queue import Queue, Empty
+from collections import deque
+
+from protocolo_rs485 import SOF, VERSION_BINARIA, decodificar_trama
+from secuencia_rs485 import ControlSecuencia
 
 class MonitorRS485:
     def __init__(self, config):
@@ -16,12 +21,42 @@ class MonitorRS485:
         self.port = config.rs485_port
         self.baudrate = config.rs485_baudrate
         self.timeout = config.rs485_timeout
+        self.protocolo = config.rs485_protocolo
         self.ser = None
         self.running = False
-        self.message_queue = Queue()
+        # Ultimos mensajes para quien lea por cola; los callbacks son la via principal
+        # y nadie la vacia en main.py: acotada, descarta los mas viejos
+        self.message_queue = deque(maxlen=1000)
         self.callbacks = []
+        self.lock_callbacks = threading.Lock()
+
+        # Acceso exclusivo al bus para transacciones del maestro
+        self.lock_bus = threading.RLock()
         self.logger = logging.getLogger(__name__)
 
+        # Buffer reutilizable para separar tramas del flujo serial
+        self._buffer = bytearray()
+        self._mensajes_pendientes = deque()
+        self.max_buffer = 4096
+        # Solo el lector toca el buffer: un cambio de velocidad le pide vaciarlo
+        self._descartar_buffer = False
+
+        # Protocolo negociado por dispositivo ('texto' o 'binario')
+        self.protocolo_dispositivos: Dict[str, str] = {}
+        self.tramas_invalidas = 0
+
+        # Orden y reenvio de tramas de conteo numeradas
+        self.secuencias = ControlSecuencia(
+            self._solicitar_reenvio,
+            timeout=config.rs485_reenvio_timeout_ms / 1000.0
+        )
+        self._reenvios_pendientes = deque()
+
+        # Negociacion de velocidad: el Pico vuelve a la anterior si no recibe BAUDOK
+        # y, tras BAUDOK, si no oye trafico valido a la nueva velocidad (BAUDFIN)
+        self.timeout_prueba_baud = 2.0
+        self.intentos_baudok = 3
+
     def conectar(self) -> bool:
         """Conectar al puerto RS485"""
         try:
@@ -36,6 +71,11 @@ class MonitorRS485:
 
             self.running = True
             self.logger.info(f"✅ Conectado a RS485: {self.port} @ {self.baudrate} bps")
+
+            # Ofrecer protocolo binario a todas las estaciones del bus
+            if self.protocolo == 'binario':
+                self.enviar_comando(f"*:PROTO:{VERSION_BINARIA}")
+
             return True
 
         except Exception as e:
@@ -53,22 +93,166 @@ class MonitorRS485:
             self.logger.error(f"❌ Error desconectando RS485: {e}")
 
     def leer_mensaje(self) -> Optional[str]:
-        """Leer mensaje del Pico"""
+        """Leer mensaje del Pico (sin bloquear)"""
         try:
+            mensaje = self._siguiente_mensaje()
+            if mensaje:
+                return mensaje
+
             if not self.ser or not self.ser.is_open:
                 return None
 
             if self.ser.in_waiting > 0:
-                mensaje = self.ser.readline().decode('utf-8', errors='ignore')
-                if mensaje.strip():
-                    self.logger.debug(f"📨 Mensaje recibido: {mensaje.strip()}")
-                    return mensaje.strip()
-            return None
+                self._agregar_bytes(self.ser.read(self.ser.in_waiting))
+
+            self._revisar_secuencias()
+            return self._siguiente_mensaje()
 
         except Exception as e:
             self.logger.error(f"❌ Error leyendo mensaje: {e}")
             return None
 
+    def _agregar_bytes(self, datos: bytes):
+        """Agregar bytes recibidos al buffer de tramas"""
+        if self._descartar_buffer:
+            # Lo acumulado es de la velocidad anterior
+            self._descartar_buffer = False
+            self._buffer.clear()
+        self._buffer += datos
+
+        while len(self._buffer) > self.max_buffer:
+            # Antes de descartar nada, sacar las tramas completas que ya llegaron
+            while self._extraer_trama():
+                pass
+            if len(self._buffer) <= self.max_buffer:
+                return
+
+            # Lo que queda al frente no cierra: cortar hasta el proximo inicio posible
+            candidatos = [p for p in (self._buffer.find(SOF, 1), self._buffer.find(b'\n')) if p >= 0]
+            corte = min(candidatos) if candidatos else len(self._buffer)
+            if self._buffer[corte:corte + 1] == b'\n':
+                corte += 1
+            self.logger.warning(f"⚠️ Buffer RS485 desbordado, descartando {corte} bytes")
+            del self._buffer[:corte]
+
+    def _siguiente_mensaje(self) -> Optional[str]:
+        """Obtener el siguiente mensaje ID:TAG:VAL completo"""
+        while not self._mensajes_pendientes:
+            if not self._extraer_trama():
+                return None
+        return self._mensajes_pendientes.popleft()
+
+    def _extraer_trama(self) -> bool:
+        """Extraer la siguiente trama (binaria o de texto) del buffer"""
+        while self._buffer:
+            inicio_binaria = self._buffer.find(SOF)
+            fin_linea = self._buffer.find(b'\n')
+
+            if inicio_binaria >= 0 and (fin_linea < 0 or inicio_binaria < fin_linea):
+                if inicio_binaria > 0:
+                    # Fragmento de texto truncado antes de una trama binaria
+                    del self._buffer[:inicio_binaria]
+
+                trama, consumidos = decodificar_trama(self._buffer)
+                if consumidos == 0:
+                    return False
+
+                del self._buffer[:consumidos]
+                if trama is None:
+                    self.tramas_invalidas += 1
+                    continue
+
+                self._registrar_trama_binaria(trama)
+                mensajes = [f"{trama['device_id']}:{tag}:{valor}" for tag, valor in trama['campos']]
+                if trama['seq'] and any(tag in ('CONT', 'RESET') for tag, _ in trama['campos']):
+                    # FIN cierra la respuesta al sondeo y no lleva secuencia: si la
+                    # trama queda retenida por un hueco, el maestro igual lo recibe
+                    fin = [m for (tag, _), m in zip(trama['campos'], mensajes) if tag == 'FIN']
+                    numerados = [m for (tag, _), m in zip(trama['campos'], mensajes) if tag != 'FIN']
+                    mensajes = self.secuencias.recibir(trama['device_id'], trama['seq'], numerados) + fin
+                self._mensajes_pendientes.extend(mensajes)
+                return True
+
+            if fin_linea < 0:
+                return False
+
+            linea = self._buffer[:fin_linea]
+            del self._buffer[:fin_linea + 1]
+
+            mensaje = linea.decode('utf-8', errors='ignore').strip()
+            if mensaje and not mensaje.isprintable():
+                # Restos de una trama binaria corrupta
+                self.tramas_invalidas += 1
+                continue
+            if mensaje:
+                partes = mensaje.split(':')
+                if len(partes) == 4 and partes[3].isdigit():
+                    # CONT/RESET numerado en texto: ID:TAG:VAL:SEQ
+                    mensaje = ':'.join(partes[:3])
+                    self._mensajes_pendientes.extend(
+                        self.secuencias.recibir(partes[0], int(partes[3]), [mensaje])
+                    )
+                    return True
+
+                self._registrar_linea(mensaje)
+                self._mensajes_pendientes.append(mensaje)
+                return True
+
+        return False
+
+    def _registrar_trama_binaria(self, trama: Dict[str, Any]):
+        """Registrar que un dispositivo ya habla el protocolo binario"""
+        device_id = trama['device_id']
+        if self.protocolo_dispositivos.get(device_id) != 'binario':
+            self.protocolo_dispositivos[device_id] = 'binario'
+            self.logger.info(f"🔗 {device_id} usando protocolo binario")
+
+    def _registrar_linea(self, mensaje: str):
+        """Negociar protocolo con dispositivos que aun hablan texto"""
+        partes = mensaje.split(':')
+        if len(partes) != 3:
+            return
+
+        device_id, tag, valor = partes
+        self.protocolo_dispositivos.setdefault(device_id, 'texto')
+
+        if tag == 'PROTO':
+            # El anuncio en texto solo ocurre al arrancar: la secuencia vuelve a empezar
+            self.secuencias.reiniciar(device_id)
+
+            # El Pico anuncia que soporta tramas binarias; confirmar si esta habilitado
+            if self.protocolo == 'binario':
+                self.enviar_comando(f"{device_id}:PROTO:{VERSION_BINARIA}")
+
+    def _solicitar_reenvio(self, device_id: str, desde: int, hasta: int):
+        """Encolar un pedido de reenvio; se envia cuando el bus este libre"""
+        self._reenvios_pendientes.append(f"{device_id}:REENVIAR:{desde}-{hasta}")
+
+    def enviar_reenvios_pendientes(self):
+        """Enviar los pedidos de reenvio sin esperar a que el maestro libere el bus"""
+        if not self._reenvios_pendientes or not self.lock_bus.acquire(blocking=False):
+            return
+        try:
+            while self._reenvios_pendientes:
+                self.enviar_comando(self._reenvios_pendientes.popleft())
+        finally:
+            self.lock_bus.release()
+
+    def _revisar_secuencias(self):
+        """Reintentar o abandonar huecos vencidos y enviar pedidos pendientes"""
+        self._mensajes_pendientes.extend(self.secuencias.revisar())
+        self.enviar_reenvios_pendientes()
+
+    def _despachar(self, mensaje: str):
+        """Entregar un mensaje completo a la cola y a los suscriptores"""
+        self.message_queue.append(mensaje)
+
+        for callback in self.callbacks:
+            try:
+                callback(mensaje)
+            except Exception as e:
+                self.logger.error(f"❌ Error en callback: {e}")
+
     def enviar_comando(self, comando: str) -> bool:
         """Enviar comando al Pico"""
         try:
@@ -77,10 +261,11 @@ class MonitorRS485:
 
             mensaje = f"{comando}\n"
             data = mensaje.encode('utf-8')
-            self.ser.write(data)
-            self.ser.flush()
+            with self.lock_bus:
+                self.ser.write(data)
+                self.ser.flush()
 
-            self.logger.info(f"📤 Comando enviado: {comando}")
+            self.logger.debug(f"📤 Comando enviado: {comando}")
             return True
 
         except Exception as e:
@@ -124,41 +309,165 @@ class MonitorRS485:
 
     def agregar_callback(self, callback: Callable[[str], None]):
         """Agregar callback para procesar mensajes"""
-        self.callbacks.append(callback)
+        # Lista nueva en cada cambio: el lector recorre la anterior sin lock
+        with self.lock_callbacks:
+            self.callbacks = self.callbacks + [callback]
+
+    def quitar_callback(self, callback: Callable[[str], None]):
+        """Quitar un callback registrado"""
+        with self.lock_callbacks:
+            self.callbacks = [c for c in self.callbacks if c is not callback]
+
+    def negociar_baudrate(self, dispositivos: List[str]) -> int:
+        """Subir el bus al mayor baudrate que todas las estaciones superen con prueba de eco
+
+        Todas las de dispositivos deben responder BAUD, ECO y BAUDOK; si falta
+        una, no se cambia ni se guarda la velocidad.
+        """
+        if not dispositivos or not self.ser or not self.ser.is_open:
+            return self.baudrate
+
+        respuestas = Queue()
+
+        def capturar(mensaje: str):
+            partes = mensaje.split(':')
+            if len(partes) == 3 and partes[1] in ('BAUD', 'ECO', 'BAUDOK'):
+                respuestas.put(tuple(partes))
+
+        self.agregar_callback(capturar)
+        try:
+            # Nadie mas usa el bus mientras se cambia la velocidad
+            with self.lock_bus:
+                for candidato in sorted(self.config.rs485_baudrates or []):
+                    if candidato <= self.baudrate:
+                        continue
+                    if not self._probar_baudrate(candidato, dispositivos, respuestas):
+                        break
+        except Exception as e:
+            self.logger.error(f"❌ Error negociando baudrate: {e}")
+        finally:
+            self.quitar_callback(capturar)
+
+        return self.baudrate
+
+    def _esperar_respuestas(self, respuestas: Queue, tag: str, valor: int,
+                            dispositivos: List[str], timeout: float) -> Set[str]:
+        """Esperar ID:TAG:valor de cada estacion; retorna las que no respondieron"""
+        faltan = set(dispositivos)
+        limite = time.monotonic() + timeout
+        while faltan:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                device_id, tag_recibido, valor_recibido = respuestas.get(timeout=restante)
+            except Empty:
+                break
+            if tag_recibido == tag and valor_recibido == str(valor):
+                faltan.discard(device_id)
+        return faltan
+
+    def _pedir_a_cada(self, respuestas: Queue, tag: str, valor: int,
+                      dispositivos: List[str], timeout: float = 0.25) -> Set[str]:
+        """Enviar ID:TAG:valor a cada estacion esperando su respuesta; retorna las que faltan"""
+        faltan = set()
+        for device_id in dispositivos:
+            self.enviar_comando(f"{device_id}:{tag}:{valor}")
+            faltan |= self._esperar_respuestas(respuestas, tag, valor, [device_id], timeout)
+        return faltan
+
+    def _cambiar_baudrate(self, baudrate: int):
+        """Cambiar la velocidad del puerto y descartar lo recibido a la anterior"""
+        self.ser.baudrate = baudrate
+        self.ser.reset_input_buffer()
+        # El hilo lector vacía su buffer antes de agregar lo próximo que lea
+        self._descartar_buffer = True
+
+    def _probar_baudrate(self, candidato: int, dispositivos: List[str], respuestas: Queue) -> bool:
+        """Proponer un baudrate, verificarlo con eco y confirmarlo o volver al anterior"""
+        anterior = self.baudrate
+
+        # Una estacion a la vez: respuestas simultaneas chocarian en el bus
+        faltan = self._pedir_a_cada(respuestas, 'BAUD', candidato, dispositivos)
+        if faltan:
+            self.logger.warning(f"⚠️ Sin respuesta a BAUD:{candidato} de {', '.join(sorted(faltan))}")
+            # Las que aceptaron vuelven solas a la velocidad anterior
+            time.sleep(self.timeout_prueba_baud)
+            return False
+
+        # Dar tiempo al Pico a terminar el ACK y reconfigurar su UART
+        time.sleep(0.05)
+        self._cambiar_baudrate(candidato)
+
+        errores = 0
+        for _ in range(self.config.rs485_pruebas_eco):
+            for device_id in dispositivos:
+                valor = random.randint(1, 0x7FFF)
+                self.enviar_comando(f"{device_id}:ECO:{valor}")
+                if self._esperar_respuestas(respuestas, 'ECO', valor, [device_id], 0.25):
+                    errores += 1
+            if errores:
+                break
+
+        if errores == 0:
+            # BAUDOK no guarda nada en el Pico: se reintenta con las que falten
+            # (cada BAUDOK renueva su plazo) y recien con todas se cierra con BAUDFIN
+            faltan = set(dispositivos)
+            for _ in range(self.intentos_baudok):
+                faltan = self._pedir_a_cada(respuestas, 'BAUDOK', candidato, sorted(faltan))
+                if not faltan:
+                    break
+            if faltan:
+                self.logger.error(f"❌ BAUDOK:{candidato} sin confirmar en {', '.join(sorted(faltan))}")
+                errores += len(faltan)
+
+        if errores:
+            # Sin BAUDFIN las estaciones que aceptaron vuelven a la anterior sin guardar
+            self.logger.warning(f"⚠️ {candidato} bps con errores, se mantiene {anterior} bps")
+            self._cambiar_baudrate(anterior)
+            time.sleep(self.timeout_prueba_baud)
+            return False
+
+        # Trafico a la nueva velocidad: cada estacion la guarda al oirlo
+        for _ in range(self.intentos_baudok):
+            self.enviar_comando(f"*:BAUDFIN:{candidato}")
+
+        self.baudrate = candidato
+        self.config.set('rs485.baudrate', candidato)
+        self.logger.info(f"🚀 Bus RS485 a {candidato} bps")
+        return True
 
     def procesar_mensajes(self):
         """Procesar mensajes recibidos (para usar en thread)"""
         while self.running:
             try:
-                mensaje = self.leer_mensaje()
-                if mensaje:
-                    # Agregar a cola
-                    self.message_queue.put(mensaje)
+                if not self.ser or not self.ser.is_open:
+                    time.sleep(1)
+                    continue
 
-                    # Ejecutar callbacks
-                    for callback in self.callbacks:
-                        try:
-                            callback(mensaje)
-                        except Exception as e:
-                            self.logger.error(f"❌ Error en callback: {e}")
+                # Bloquea sobre el puerto hasta recibir datos o vencer el timeout
+                datos = self.ser.read(max(1, self.ser.in_waiting))
+                if datos:
+                    self._agregar_bytes(datos)
 
-                time.sleep(0.1)
+                self._revisar_secuencias()
+                mensaje = self._siguiente_mensaje()
+                while mensaje:
+                    self._despachar(mensaje)
+                    mensaje = self._siguiente_mensaje()
 
             except Exception as e:
-                self.logger.error(f"❌ Error procesando mensajes: {e}")
-                time.sleep(1)
+                if self.running:
+                    self.logger.error(f"❌ Error procesando mensajes: {e}")
+                    time.sleep(1)
 
     def obtener_mensaje_de_cola(self) -> Optional[str]:
         """Obtener mensaje de la cola"""
         try:
-            return self.message_queue.get_nowait()
-        except:
+            return self.message_queue.popleft()
+        except IndexError:
             return None
 
     def limpiar_cola(self):
         """Limpiar cola de mensajes"""
-        while not self.message_queue.empty():
-            try:
-                self.message_queue.get_nowait()
-            except:
-                break
+        self.message_queue.clear()
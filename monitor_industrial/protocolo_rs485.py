@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Protocolo RS485 - Tramas binarias con CRC16 y respaldo de texto ID:TAG:VAL
+
+Formato de trama binaria:
+
+    SOF(0xA5) LEN | ID_LEN ID SEQ(u16) [TAG(u8) L(u8) VALOR(L bytes)]... | CRC16
+
+LEN cuenta los bytes entre LEN y el CRC. El CRC16 (Modbus, little endian)
+cubre LEN y el contenido. Los valores son enteros con signo big endian de
+1 a 4 bytes. El byte SOF nunca aparece en una linea de texto ASCII, por lo
+que ambos formatos pueden convivir en el mismo bus.
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+
+SOF = 0xA5
+VERSION_BINARIA = 1
+
+TAGS = {
+    'CONT': 1,
+    'TOTAL': 2,
+    'META': 3,
+    'ESTADO': 4,
+    'LOG': 5,
+    'HEARTBEAT': 6,
+    'INACTIVO': 7,
+    'RESET': 8,
+    'PROTO': 9,
+    'FIN': 10,
+    'BAUD': 11,
+    'ECO': 12,
+    'BAUDOK': 13,
+}
+TAGS_POR_CODIGO = {codigo: tag for tag, codigo in TAGS.items()}
+
+
+def crc16(datos: bytes) -> int:
+    """Calcular CRC16 Modbus (polinomio 0xA001, inicial 0xFFFF)"""
+    crc = 0xFFFF
+    for byte in datos:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def _codificar_valor(valor: int) -> bytes:
+    """Codificar entero con signo en el minimo de bytes (1 a 4)"""
+    for longitud in (1, 2, 3, 4):
+        limite = 1 << (8 * longitud - 1)
+        if -limite <= valor < limite:
+            return valor.to_bytes(longitud, 'big', signed=True)
+    raise ValueError(f"Valor fuera de rango para trama binaria: {valor}")
+
+
+def codificar_trama(device_id: str, seq: int, campos: List[Tuple[str, int]]) -> bytes:
+    """Construir una trama binaria con varios pares TAG/VALOR"""
+    id_bytes = device_id.encode('ascii')
+    contenido = bytearray()
+    contenido.append(len(id_bytes))
+    contenido += id_bytes
+    contenido += (seq & 0xFFFF).to_bytes(2, 'big')
+
+    for tag, valor in campos:
+        valor_bytes = _codificar_valor(int(valor))
+        contenido.append(TAGS[tag])
+        contenido.append(len(valor_bytes))
+        contenido += valor_bytes
+
+    if len(contenido) > 255:
+        raise ValueError("Trama binaria demasiado larga")
+
+    cuerpo = bytes([len(contenido)]) + contenido
+    return bytes([SOF]) + cuerpo + crc16(cuerpo).to_bytes(2, 'little')
+
+
+def decodificar_trama(buffer: bytes) -> Tuple[Optional[Dict[str, Any]], int]:
+    """Decodificar una trama binaria al inicio del buffer
+
+    Retorna (trama, consumidos). Con (None, 0) faltan bytes; con
+    (None, n > 0) la trama es invalida y se deben descartar n bytes.
+    """
+    if len(buffer) < 2:
+        return None, 0
+    if buffer[0] != SOF:
+        return None, 1
+
+    longitud = buffer[1]
+    total = 2 + longitud + 2
+    if longitud < 3:
+        return None, 1
+    if len(buffer) < total:
+        return None, 0
+
+    cuerpo = bytes(buffer[1:2 + longitud])
+    crc_recibido = int.from_bytes(buffer[2 + longitud:total], 'little')
+    if crc16(cuerpo) != crc_recibido:
+        # Resincronizar a partir del siguiente byte
+        return None, 1
+
+    try:
+        contenido = cuerpo[1:]
+        id_len = contenido[0]
+        device_id = contenido[1:1 + id_len].decode('ascii')
+        pos = 1 + id_len
+        seq = int.from_bytes(contenido[pos:pos + 2], 'big')
+        pos += 2
+
+        campos = []
+        while pos < len(contenido):
+            codigo = contenido[pos]
+            largo = contenido[pos + 1]
+            valor_bytes = contenido[pos + 2:pos + 2 + largo]
+            if len(valor_bytes) != largo or not 1 <= largo <= 4:
+                return None, 1
+            tag = TAGS_POR_CODIGO.get(codigo, f"T{codigo}")
+            campos.append((tag, int.from_bytes(valor_bytes, 'big', signed=True)))
+            pos += 2 + largo
+
+    except (IndexError, UnicodeDecodeError):
+        return None, 1
+
+    return {
+        'device_id': device_id,
+        'seq': seq,
+        'campos': campos,
+        'binaria': True
+    }, total
+
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Secuencia RS485 - Deteccion de huecos y reenvio de tramas de conteo
+
+El Pico numera cada trama con CONT o RESET (1 a 65535, el 0 indica
+"sin secuencia"). Por estacion se entrega en orden: una trama adelantada se
+retiene mientras se pide ID:REENVIAR:desde-hasta al buffer circular del
+Pico. Si el reenvio no llega a tiempo se da el hueco por perdido y se
+continua con lo retenido.
+"""
+
+import time
+import threading
+import logging
+from typing import Callable, Dict, List, Any, Tuple
+
+SEQ_MAX = 65535
+VENTANA_REENVIO = 32
+
+
+def siguiente_seq(seq: int) -> int:
+    """Secuencia siguiente saltando el 0"""
+    return seq % SEQ_MAX + 1
+
+
+def distancia_seq(desde: int, hasta: int) -> int:
+    """Pasos hacia adelante de una secuencia a otra"""
+    return (hasta - desde) % SEQ_MAX
+
+
+class ControlSecuencia:
+    def __init__(self, solicitar_reenvio: Callable[[str, int, int], None],
+                 timeout: float = 0.5, max_intentos: int = 2, max_retenidas: int = 64):
+        self.solicitar_reenvio = solicitar_reenvio
+        self.timeout = timeout
+        self.max_intentos = max_intentos
+        self.max_retenidas = max_retenidas
+        self.logger = logging.getLogger(__name__)
+
+        self.dispositivos: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+        # Pedidos de reenvio (device_id, desde, hasta) juntados bajo el lock;
+        # solicitar_reenvio se llama despues de soltarlo
+        self._pedidos: List[Tuple[str, int, int]] = []
+
+    def _estado(self, device_id: str) -> Dict[str, Any]:
+        estado = self.dispositivos.get(device_id)
+        if estado is None:
+            estado = {
+                'esperado': None,
+                'retenidas': {},
+                'espera_desde': 0.0,
+                'intentos': 0,
+                'atrasadas_seguidas': 0,
+                'recibidas': 0,
+                'huecos': 0,
+                'recuperadas': 0,
+                'perdidas': 0,
+                'duplicadas': 0,
+                'reenvios_solicitados': 0
+            }
+            self.dispositivos[device_id] = estado
+        return estado
+
+    def reiniciar(self, device_id: str):
+        """Olvidar la secuencia de una estacion (reinicio del Pico)"""
+        with self.lock:
+            estado = self._estado(device_id)
+            estado['esperado'] = None
+            estado['retenidas'].clear()
+            estado['intentos'] = 0
+
+    def recibir(self, device_id: str, seq: int, mensajes: List[str]) -> List[str]:
+        """Registrar una trama numerada y retornar los mensajes listos, en orden"""
+        with self.lock:
+            listos = self._recibir(device_id, seq, mensajes)
+        self._enviar_pedidos()
+        return listos
+
+    def _recibir(self, device_id: str, seq: int, mensajes: List[str]) -> List[str]:
+        estado = self._estado(device_id)
+        estado['recibidas'] += 1
+
+        if estado['esperado'] is None:
+            estado['esperado'] = seq
+
+        adelanto = distancia_seq(estado['esperado'], seq)
+
+        if adelanto >= SEQ_MAX // 2:
+            # Trama atrasada: duplicado o reinicio del Pico sin anuncio
+            estado['atrasadas_seguidas'] += 1
+            if seq == 1 or estado['atrasadas_seguidas'] >= 3:
+                self.logger.info(f"🔄 Secuencia de {device_id} reiniciada en {seq}")
+                estado['retenidas'].clear()
+                estado['esperado'] = seq
+                adelanto = 0
+            else:
+                estado['duplicadas'] += 1
+                return []
+
+        estado['atrasadas_seguidas'] = 0
+
+        if seq in estado['retenidas']:
+            estado['duplicadas'] += 1
+            return []
+
+        if estado['retenidas']:
+            # Esperando un hueco: ver si esta trama lo llena
+            if adelanto < distancia_seq(estado['esperado'], self._primera_retenida(estado)):
+                estado['recuperadas'] += 1
+            estado['retenidas'][seq] = mensajes
+        else:
+            estado['retenidas'][seq] = mensajes
+            if adelanto > 0:
+                estado['huecos'] += 1
+                self._pedir_hueco(device_id, estado)
+
+        listos = self._liberar(estado)
+
+        if len(estado['retenidas']) > self.max_retenidas:
+            listos += self._saltar_hueco(device_id, estado)
+
+        return listos
+
+    def _primera_retenida(self, estado: Dict[str, Any]) -> int:
+        return min(estado['retenidas'], key=lambda s: distancia_seq(estado['esperado'], s))
+
+    def _pedir_hueco(self, device_id: str, estado: Dict[str, Any]):
+        """Solicitar al Pico las tramas que faltan antes de la primera retenida"""
+        primera = self._primera_retenida(estado)
+        faltan = distancia_seq(estado['esperado'], primera)
+        desde = estado['esperado']
+        if faltan > VENTANA_REENVIO:
+            # El Pico solo conserva las ultimas tramas
+            desde = (primera - VENTANA_REENVIO - 1) % SEQ_MAX + 1
+        hasta = (primera - 2) % SEQ_MAX + 1
+
+        estado['espera_desde'] = time.monotonic()
+        estado['intentos'] += 1
+        estado['reenvios_solicitados'] += 1
+        self._pedidos.append((device_id, desde, hasta))
+
+    def _enviar_pedidos(self):
+        """Pasar a solicitar_reenvio los pedidos juntados, fuera del lock"""
+        with self.lock:
+            pedidos, self._pedidos = self._pedidos, []
+        for device_id, desde, hasta in pedidos:
+            self.solicitar_reenvio(device_id, desde, hasta)
+
+    def _liberar(self, estado: Dict[str, Any]) -> List[str]:
+        """Entregar las tramas consecutivas a partir de la esperada"""
+        listos = []
+        while estado['esperado'] in estado['retenidas']:
+            listos.extend(estado['retenidas'].pop(estado['esperado']))
+            estado['esperado'] = siguiente_seq(estado['esperado'])
+
+        if not estado['retenidas']:
+            estado['intentos'] = 0
+        return listos
+
+    def _saltar_hueco(self, device_id: str, estado: Dict[str, Any]) -> List[str]:
+        """Dar por perdido el hueco actual y seguir con lo retenido"""
+        primera = self._primera_retenida(estado)
+        perdidas = distancia_seq(estado['esperado'], primera)
+        estado['perdidas'] += perdidas
+        self.logger.warning(f"⚠️ {device_id}: {perdidas} tramas perdidas ({estado['esperado']}-{primera - 1})")
+
+        estado['esperado'] = primera
+        estado['intentos'] = 0
+        listos = self._liberar(estado)
+        if estado['retenidas']:
+            # Queda otro hueco mas adelante
+            estado['huecos'] += 1
+            self._pedir_hueco(device_id, estado)
+        return listos
+
+    def revisar(self) -> List[str]:
+        """Reintentar o abandonar huecos vencidos; retorna mensajes liberados"""
+        listos = []
+        ahora = time.monotonic()
+        with self.lock:
+            for device_id, estado in self.dispositivos.items():
+                if not estado['retenidas'] or ahora - estado['espera_desde'] < self.timeout:
+                    continue
+                if estado['intentos'] < self.max_intentos:
+                    self._pedir_hueco(device_id, estado)
+                else:
+                    listos += self._saltar_hueco(device_id, estado)
+        self._enviar_pedidos()
+        return listos
+
+    def obtener_estadisticas(self) -> Dict[str, Dict[str, int]]:
+        """Obtener contadores de huecos, reenvios y perdidas por estacion"""
+        with self.lock:
+            return {
+                device_id: {
+                    clave: valor for clave, valor in estado.items()
+                    if clave in ('recibidas', 'huecos', 'recuperadas', 'perdidas',
+                                 'duplicadas', 'reenvios_solicitados')
+                }
+                for device_id, estado in self.dispositivos.items()
+            }
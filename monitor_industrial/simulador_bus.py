@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Simulador de Bus RS485 - Estaciones Pico emuladas sobre un pseudo-terminal
+
+Crea un par pty y emula N Picos con la lógica del firmware (pico/main.py):
+ráfagas de on_detect y heartbeat, negociación PROTO, modo sondeo con
+POLL/FIN, REENVIAR desde el historial y BAUD/ECO. Modela el tiempo en el
+cable a la velocidad configurada, el giro de DE y el retardo del bucle
+principal, y puede inyectar ruido, líneas truncadas y colisiones cuando
+dos estaciones transmiten a la vez. MonitorRS485 se conecta al puerto
+esclavo como si fuera /dev/ttyUSB0.
+
+Uso:
+    with SimuladorBus(estaciones=8, piezas_minuto=120, ruido=0.001) as bus:
+        config.set('rs485.port', bus.puerto)
+        ...
+        print(bus.obtener_estadisticas())
+
+    python simulador_bus.py --estaciones 4      # deja el bus corriendo
+"""
+
+import os
+import pty
+import time
+import tty
+import random
+import select
+import logging
+import argparse
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from protocolo_rs485 import codificar_trama
+
+SECUENCIADOS = ('CONT', 'RESET')
+VENTANA_REENVIO = 32
+
+
+class PicoSimulado:
+    """Una estación Pico con el comportamiento de protocolo del firmware"""
+
+    def __init__(self, device_id: str, piezas_minuto: float, heartbeat_intervalo: float,
+                 aleatorio: random.Random, inicio: float):
+        self.device_id = device_id
+        self.piezas_minuto = piezas_minuto
+        self.heartbeat_intervalo = heartbeat_intervalo
+        self.aleatorio = aleatorio
+
+        # Estado de conteo
+        self.contador = 0
+        self.total = 0
+        self.meta = 0
+        self.log_contador = 0
+        self.activo = True
+
+        # Estado de protocolo
+        self.protocolo_binario = False
+        self.modo_polling = False
+        self.pendientes: Dict[str, int] = {}
+        self.cerrados: List[Tuple[str, int]] = []
+        self.seq_trama = 0
+        self.historial: List[Optional[Tuple[int, List[Tuple[str, int]]]]] = [None] * VENTANA_REENVIO
+        self.reenvios: List[Tuple[int, List[Tuple[str, int]]]] = []
+        self.baud_anterior = 0
+        self.baudrate = 0
+
+        # Anuncio de arranque en texto (PROTO y RESET) con un desfase al azar
+        self.arranque = inicio + aleatorio.uniform(0, 0.5)
+        self.anunciado = False
+
+        self.proxima_pieza = inicio + self._intervalo_pieza() if piezas_minuto > 0 else float('inf')
+        self.proximo_heartbeat = inicio + aleatorio.uniform(0, heartbeat_intervalo)
+
+    def _intervalo_pieza(self) -> float:
+        return self.aleatorio.expovariate(self.piezas_minuto / 60.0)
+
+    def proximo_evento(self) -> float:
+        if not self.anunciado:
+            return self.arranque
+        return min(self.proxima_pieza, self.proximo_heartbeat)
+
+    def _estado(self) -> List[Tuple[str, int]]:
+        return [
+            ('CONT', self.contador),
+            ('TOTAL', self.total),
+            ('META', self.meta),
+            ('ESTADO', 1 if self.activo else 0),
+            ('LOG', self.log_contador)
+        ]
+
+    def _registrar_secuencia(self, campos: List[Tuple[str, int]]) -> int:
+        self.seq_trama = self.seq_trama % 65535 + 1
+        self.historial[self.seq_trama % VENTANA_REENVIO] = (
+            self.seq_trama, [c for c in campos if c[0] != 'FIN']
+        )
+        return self.seq_trama
+
+    def transmitir_campos(self, campos: List[Tuple[str, int]], seq: Optional[int] = None) -> bytes:
+        """Bytes que el firmware pondría en el bus para estos campos"""
+        if self.protocolo_binario:
+            if seq is None:
+                seq = 0
+                if any(tag in SECUENCIADOS for tag, _ in campos):
+                    seq = self._registrar_secuencia(campos)
+            return codificar_trama(self.device_id, seq, campos)
+
+        lineas = []
+        for tag, valor in campos:
+            if tag in SECUENCIADOS:
+                numero = seq or self._registrar_secuencia([(tag, valor)])
+                lineas.append(f"{self.device_id}:{tag}:{valor}:{numero}\n")
+            else:
+                lineas.append(f"{self.device_id}:{tag}:{valor}\n")
+        return ''.join(lineas).encode('utf-8')
+
+    def send_trama(self, campos: List[Tuple[str, int]]) -> List[Tuple[bytes, List[Tuple[str, int]]]]:
+        """Transmitir ahora o, en modo sondeo, dejar para el próximo POLL"""
+        if self.modo_polling:
+            for tag, valor in campos:
+                if tag == 'RESET':
+                    self.cerrados.extend(self.pendientes.items())
+                    self.pendientes.clear()
+                    self.cerrados.append((tag, valor))
+                else:
+                    self.pendientes[tag] = valor
+            return []
+        return [(self.transmitir_campos(campos), campos)]
+
+    def eventos(self, ahora: float) -> List[Tuple[bytes, List[Tuple[str, int]]]]:
+        """Piezas y heartbeats vencidos"""
+        salida = []
+        if not self.anunciado:
+            if self.arranque > ahora:
+                return salida
+            self.anunciado = True
+            anuncio = [('PROTO', 1), ('RESET', self.contador)]
+            salida.append((
+                f"{self.device_id}:PROTO:1\n{self.device_id}:RESET:{self.contador}\n".encode('utf-8'),
+                anuncio
+            ))
+
+        while self.proxima_pieza <= ahora:
+            self.contador += 1
+            self.total += 1
+            self.log_contador += 1
+            salida += self.send_trama(self._estado())
+            self.proxima_pieza += self._intervalo_pieza()
+
+        if self.proximo_heartbeat <= ahora:
+            salida += self.send_trama(
+                [('HEARTBEAT', int(ahora))] + self._estado() + [('INACTIVO', 0)]
+            )
+            self.proximo_heartbeat = ahora + self.heartbeat_intervalo
+        return salida
+
+    def resetear(self, base: int = 0) -> List[Tuple[bytes, List[Tuple[str, int]]]]:
+        """Reset con PIN desde el teclado"""
+        self.contador = base
+        self.total = 0
+        return self.send_trama([('RESET', base)]) + self.send_trama(self._estado())
+
+    def comando(self, linea: str, baudrate: int) -> List[Tuple[bytes, List[Tuple[str, int]]]]:
+        """Procesar un comando ID:CMD:VAL del maestro"""
+        partes = linea.split(':')
+        if len(partes) != 3:
+            return []
+        destino, comando, valor = partes
+        if destino != self.device_id and destino != '*':
+            return []
+
+        if comando == 'POLL':
+            self.modo_polling = True
+            salida = [(self.transmitir_campos(campos, seq), campos) for seq, campos in self.reenvios]
+            self.reenvios.clear()
+            campos = self.cerrados + list(self.pendientes.items())
+            self.cerrados.clear()
+            self.pendientes.clear()
+            campos.append(('FIN', len(campos)))
+            salida.append((self.transmitir_campos(campos), campos))
+            return salida
+
+        if comando == 'MAESTRO':
+            self.modo_polling = valor == '1'
+            return []
+
+        if comando == 'PROTO':
+            try:
+                self.protocolo_binario = int(valor) >= 1
+            except ValueError:
+                return []
+            if destino == '*':
+                return []
+            return self.send_trama([('PROTO', 1 if self.protocolo_binario else 0)])
+
+        if comando == 'REENVIAR':
+            try:
+                desde, hasta = (int(v) for v in valor.split('-'))
+            except ValueError:
+                return []
+            cantidad = min((hasta - desde) % 65535 + 1, VENTANA_REENVIO)
+            salida = []
+            seq = desde
+            for _ in range(cantidad):
+                entrada = self.historial[seq % VENTANA_REENVIO]
+                if entrada and entrada[0] == seq:
+                    if self.modo_polling:
+                        self.reenvios.append(entrada)
+                    else:
+                        salida.append((self.transmitir_campos(entrada[1], seq), entrada[1]))
+                seq = seq % 65535 + 1
+            return salida
+
+        if comando == 'BAUDFIN':
+            # El maestro siguió a la nueva velocidad: la prueba queda cerrada
+            self.baud_anterior = 0
+            return []
+
+        if comando in ('BAUD', 'ECO', 'BAUDOK'):
+            try:
+                numero = int(valor)
+            except ValueError:
+                return []
+            if comando == 'BAUD':
+                self.baud_anterior = self.baud_anterior or baudrate
+                self.baudrate = numero
+            elif comando == 'BAUDOK':
+                if not self.baud_anterior or numero != self.baudrate:
+                    return []
+                if destino == '*':
+                    return []
+            campos = [(comando, numero)]
+            return [(self.transmitir_campos(campos), campos)]
+
+        return []
+
+
+class SimuladorBus:
+    """Bus RS485 con varias estaciones Pico detrás de un pseudo-terminal"""
+
+    def __init__(self, estaciones: int = 4, piezas_minuto: float = 60, baudrate: int = 9600,
+                 heartbeat_intervalo: float = 30, latencia_respuesta_ms: float = 5,
+                 retardo_alerta_ms: float = 100, ruido: float = 0.0, truncadas: float = 0.0,
+                 colisiones: bool = True, semilla: int = 1,
+                 al_transmitir: Optional[Callable[[str, List[Tuple[str, int]], bool], None]] = None):
+        self.baudrate = baudrate
+        self.latencia_respuesta = latencia_respuesta_ms / 1000.0
+        self.retardo_alerta = retardo_alerta_ms / 1000.0
+        self.ruido = ruido
+        self.truncadas = truncadas
+        self.colisiones = colisiones
+        self.al_transmitir = al_transmitir
+        self.aleatorio = random.Random(semilla)
+        self.logger = logging.getLogger(__name__)
+
+        inicio = time.monotonic()
+        self.estaciones = [
+            PicoSimulado(f"P{n:02d}", piezas_minuto, heartbeat_intervalo, self.aleatorio, inicio)
+            for n in range(estaciones)
+        ]
+
+        self.maestro_fd = None
+        self.esclavo_fd = None
+        self.puerto = None
+        self.corriendo = False
+        self.hilo = None
+        self.lock = threading.Lock()
+        self._rx = bytearray()
+
+        # Transmisiones en el aire: [inicio, fin, device_id, datos, campos, colisionada]
+        self._en_aire: List[List[Any]] = []
+        self._libre_por_estacion: Dict[str, float] = {}
+
+        self.estadisticas = {
+            'tramas': 0,
+            'bytes': 0,
+            'colisiones': 0,
+            'con_ruido': 0,
+            'truncadas': 0,
+            'comandos': 0,
+            'comandos_perdidos': 0
+        }
+
+    def __enter__(self) -> 'SimuladorBus':
+        self.iniciar()
+        return self
+
+    def __exit__(self, *args):
+        self.detener()
+
+    def iniciar(self):
+        """Crear el pty y arrancar el bus"""
+        self.maestro_fd, self.esclavo_fd = pty.openpty()
+        tty.setraw(self.esclavo_fd)
+        self.puerto = os.ttyname(self.esclavo_fd)
+        self.corriendo = True
+        self.hilo = threading.Thread(target=self._bucle, name="simulador-bus", daemon=True)
+        self.hilo.start()
+        self.logger.info(f"🔌 Bus simulado en {self.puerto} con {len(self.estaciones)} estaciones")
+
+    def detener(self):
+        """Detener el bus y cerrar el pty"""
+        self.corriendo = False
+        if self.hilo:
+            self.hilo.join(timeout=2)
+        for fd in (self.maestro_fd, self.esclavo_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.maestro_fd = self.esclavo_fd = None
+
+    def tiempo_en_cable(self, largo: int) -> float:
+        """10 bits por byte (start + 8 datos + stop)"""
+        return largo * 10.0 / self.baudrate
+
+    def resetear_estacion(self, indice: int, base: int = 0):
+        """Simular un RESET con PIN en una estación"""
+        with self.lock:
+            estacion = self.estaciones[indice]
+            ahora = time.monotonic()
+            for datos, campos in estacion.resetear(base):
+                self._poner_en_aire(estacion.device_id, datos, campos, ahora)
+
+    def _poner_en_aire(self, device_id: str, datos: bytes, campos: List[Tuple[str, int]], desde: float):
+        """Programar una transmisión y detectar si se pisa con otra"""
+        inicio = max(desde, self._libre_por_estacion.get(device_id, 0.0))
+        fin = inicio + self.tiempo_en_cable(len(datos))
+        # El firmware mantiene DE un poco más tras el último byte
+        self._libre_por_estacion[device_id] = fin + 0.0002
+
+        transmision = [inicio, fin, device_id, datos, campos, False]
+        if self.colisiones:
+            for otra in self._en_aire:
+                if otra[2] != device_id and otra[0] < fin and inicio < otra[1]:
+                    otra[5] = True
+                    transmision[5] = True
+        self._en_aire.append(transmision)
+
+    def _corromper(self, datos: bytes, probabilidad: float) -> Tuple[bytes, bool]:
+        """Invertir bits al azar con la probabilidad dada por byte"""
+        if probabilidad <= 0:
+            return datos, False
+        salida = bytearray(datos)
+        alterado = False
+        for i in range(len(salida)):
+            if self.aleatorio.random() < probabilidad:
+                salida[i] ^= 1 << self.aleatorio.randrange(8)
+                alterado = True
+        return bytes(salida), alterado
+
+    def _escribir_vencidas(self, ahora: float):
+        """Entregar al pty las transmisiones que ya terminaron en el cable"""
+        vencidas = [t for t in self._en_aire if t[1] <= ahora]
+        if not vencidas:
+            return
+        self._en_aire = [t for t in self._en_aire if t[1] > ahora]
+
+        for inicio, fin, device_id, datos, campos, colisionada in sorted(vencidas, key=lambda t: t[0]):
+            intacta = True
+            if colisionada:
+                # Dos drivers a la vez: el receptor ve basura
+                datos, _ = self._corromper(datos, 0.5)
+                self.estadisticas['colisiones'] += 1
+                intacta = False
+            else:
+                datos, alterado = self._corromper(datos, self.ruido)
+                if alterado:
+                    self.estadisticas['con_ruido'] += 1
+                    intacta = False
+
+            if self.truncadas and self.aleatorio.random() < self.truncadas:
+                datos = datos[:self.aleatorio.randrange(1, max(2, len(datos)))]
+                self.estadisticas['truncadas'] += 1
+                intacta = False
+
+            try:
+                os.write(self.maestro_fd, datos)
+            except OSError:
+                return
+            self.estadisticas['tramas'] += 1
+            self.estadisticas['bytes'] += len(datos)
+
+            if self.al_transmitir:
+                self.al_transmitir(device_id, campos, intacta)
+
+    def _recibir_comandos(self, datos: bytes, ahora: float):
+        """Entregar a las estaciones los comandos escritos por el Pi"""
+        self._rx += datos
+        while True:
+            fin = self._rx.find(b'\n')
+            if fin < 0:
+                break
+            linea = bytes(self._rx[:fin]).decode('utf-8', errors='ignore').strip()
+            del self._rx[:fin + 1]
+            if not linea:
+                continue
+            self.estadisticas['comandos'] += 1
+
+            # El comando ocupó el cable justo antes de llegar
+            inicio = ahora - self.tiempo_en_cable(len(linea) + 1)
+            pisado = False
+            if self.colisiones:
+                for otra in self._en_aire:
+                    if otra[0] < ahora and inicio < otra[1]:
+                        otra[5] = True
+                        pisado = True
+            if pisado:
+                self.estadisticas['comandos_perdidos'] += 1
+                continue
+
+            for estacion in self.estaciones:
+                respuestas = estacion.comando(linea, self.baudrate)
+                for respuesta, campos in respuestas:
+                    self._poner_en_aire(estacion.device_id, respuesta, campos, ahora + self.latencia_respuesta)
+
+            if linea.split(':')[1:2] == ['BAUDFIN']:
+                # La velocidad acordada define el tiempo en el cable de ahí en adelante
+                self.baudrate = int(linea.split(':')[2])
+
+    def _bucle(self):
+        """Bucle del bus: comandos del Pi, eventos de estaciones y escritura"""
+        while self.corriendo:
+            try:
+                with self.lock:
+                    ahora = time.monotonic()
+                    proximo = min([e.proximo_evento() + self.retardo_alerta for e in self.estaciones] +
+                                  [t[1] for t in self._en_aire] + [ahora + 0.05])
+                espera = max(0.0, proximo - ahora)
+
+                listos, _, _ = select.select([self.maestro_fd], [], [], espera)
+
+                with self.lock:
+                    ahora = time.monotonic()
+                    if listos:
+                        datos = os.read(self.maestro_fd, 4096)
+                        if datos:
+                            self._recibir_comandos(datos, ahora)
+
+                    for estacion in self.estaciones:
+                        # La trama sale tras la alerta de buzzer/LED de on_detect
+                        for datos, campos in estacion.eventos(ahora - self.retardo_alerta):
+                            self._poner_en_aire(estacion.device_id, datos, campos, ahora)
+
+                    self._escribir_vencidas(ahora)
+
+            except OSError:
+                if self.corriendo:
+                    self.logger.error("❌ Error en el bus simulado, deteniendo")
+                break
+            except Exception as e:
+                self.logger.error(f"❌ Error en el bus simulado: {e}")
+
+    def piezas_producidas(self) -> Dict[str, int]:
+        """Contador actual de cada estación"""
+        with self.lock:
+            return {e.device_id: e.log_contador for e in self.estaciones}
+
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """Tramas, bytes, colisiones y errores inyectados"""
+        with self.lock:
+            estadisticas = dict(self.estadisticas)
+            estadisticas['piezas'] = sum(e.log_contador for e in self.estaciones)
+            return estadisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bus RS485 simulado sobre un pseudo-terminal")
+    parser.add_argument('--estaciones', type=int, default=4)
+    parser.add_argument('--piezas-minuto', type=float, default=60)
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--ruido', type=float, default=0.0, help="Probabilidad de error por byte")
+    parser.add_argument('--truncadas', type=float, default=0.0, help="Probabilidad de trama truncada")
+    parser.add_argument('--sin-colisiones', dest='colisiones', action='store_false')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    with SimuladorBus(args.estaciones, args.piezas_minuto, args.baudrate, ruido=args.ruido,
+                      truncadas=args.truncadas, colisiones=args.colisiones) as bus:
+        print(f"Bus simulado en {bus.puerto} (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(10)
+                print(bus.obtener_estadisticas())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,33 @@
 #!/usr/bin/env python3
 """
 Conector SISPRO - Comunicación con APIs de Next.js
+
+Las consultas de estaciones, órdenes asignadas y avance pasan por un cache
+de respuestas persistente (cache_respuestas.py): se sirven al instante y
+siguen funcionando sin servidor.
 """
 
 import aiohttp
 import asyncio
 import json
 import logging
+import threading
+import hashlib
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from cache_respuestas import CacheRespuestas
+
+ENDPOINT_ESTACIONES = '/api/estacionesTrabajo'
+ENDPOINT_ORDENES_ASIGNADAS = '/api/ordenesDeFabricacion/listarAsignadas'
+ENDPOINT_AVANCE = '/api/ordenesDeFabricacion/avance'
+
 class SISPROConnector:
+    # Renovación en segundo plano: cada cuánto y qué tan reciente debe ser el uso
+    INTERVALO_REFRESCO = 10.0
+    USO_RECIENTE_SEGUNDOS = 3600.0
+
     def __init__(self, config):
         self.config = config
         self.base_url = config.sispro_base_url
@@ -18,21 +35,88 @@ class SISPROConnector:
         self.usuario_id = config.usuario_id
         self.token = None
         self.session = None
+        self.timeout = config.timeout_sincronizacion
+        self.tamano_lote = config.tamano_lote_sincronizacion
         self.logger = logging.getLogger(__name__)
 
+        # Pool de conexiones HTTP (keep-alive) y cache DNS
+        self.max_conexiones = 10
+        self.keepalive_segundos = 60
+        self.ttl_dns_segundos = 300
+
+        # Loop de eventos persistente en un thread dedicado
+        self.loop = None
+        self._hilo_loop = None
+
+        # Últimas respuestas de las consultas, con TTL por endpoint
+        self.respuestas = CacheRespuestas(config.sispro_cache_respuestas, {
+            ENDPOINT_ESTACIONES: config.sispro_ttl_estaciones,
+            ENDPOINT_ORDENES_ASIGNADAS: config.sispro_ttl_ordenes,
+            ENDPOINT_AVANCE: config.sispro_ttl_avance
+        })
+        self._refresco = None
+
     def conectar(self) -> bool:
         """Conectar a SISPRO"""
         try:
-            # Crear sesión HTTP
-            self.session = aiohttp.ClientSession()
+            if not self.respuestas.conn:
+                self.respuestas.abrir()
+            self._iniciar_loop()
+
+            # Crear sesión HTTP dentro del loop que la va a usar
+            self._ejecutar(self._crear_sesion())
+            if not self._refresco:
+                self._refresco = asyncio.run_coroutine_threadsafe(self._refrescar_periodicamente(), self.loop)
 
             # Autenticar
-            return asyncio.run(self.autenticar())
+            return self._ejecutar(self.autenticar(), False)
 
         except Exception as e:
             self.logger.error(f"❌ Error conectando a SISPRO: {e}")
             return False
 
+    def _iniciar_loop(self):
+        """Iniciar el loop de eventos del conector si no está corriendo"""
+        if self._hilo_loop and self._hilo_loop.is_alive():
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self._hilo_loop = threading.Thread(target=self.loop.run_forever, name="sispro-loop", daemon=True)
+        self._hilo_loop.start()
+
+    def _ejecutar(self, coro, por_defecto: Any = None) -> Any:
+        """Ejecutar una corrutina en el loop del conector desde código síncrono"""
+        if not self.loop:
+            coro.close()
+            self.logger.error("❌ Conector SISPRO no conectado")
+            return por_defecto
+
+        if threading.current_thread() is self._hilo_loop:
+            coro.close()
+            raise RuntimeError("Use la versión async desde el loop del conector")
+
+        try:
+            futuro = asyncio.run_coroutine_threadsafe(coro, self.loop)
+            return futuro.result(self.timeout + 5)
+        except Exception as e:
+            self.logger.error(f"❌ Error ejecutando petición SISPRO: {e}")
+            return por_defecto
+
+    async def _crear_sesion(self):
+        """Crear la sesión HTTP con pool de conexiones persistentes"""
+        if self.session and not self.session.closed:
+            return
+
+        conector = aiohttp.TCPConnector(
+            limit=self.max_conexiones,
+            keepalive_timeout=self.keepalive_segundos,
+            ttl_dns_cache=self.ttl_dns_segundos
+        )
+        self.session = aiohttp.ClientSession(
+            connector=conector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
     async def autenticar(self) -> bool:
         """Autenticar con SISPRO"""
         try:
@@ -49,25 +133,33 @@ class SISPROConnector:
     def desconectar(self):
         """Desconectar de SISPRO"""
         try:
-            if self.session:
-                asyncio.run(self.session.close())
+            if self._refresco:
+                self._refresco.cancel()
+                self._refresco = None
+            if self.session and self.loop:
+                self._ejecutar(self.session.close())
+            if self.loop:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._hilo_loop.join(timeout=5)
+                self.loop.close()
+            self.session = None
+            self.loop = None
+            self.respuestas.cerrar()
             self.logger.info("✅ Desconectado de SISPRO")
         except Exception as e:
             self.logger.error(f"❌ Error desconectando: {e}")
 
     async def _make_request(self, method: str, endpoint: str, **kwargs) -> Optional[Dict]:
         """Realizar petición HTTP a SISPRO"""
+        if asyncio.get_running_loop() is not self.loop:
+            # La sesión pertenece al loop del conector: ejecutar ahí
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self._make_request(method, endpoint, **kwargs), self.loop
+            ))
+
         try:
             url = f"{self.base_url}{endpoint}"
-            headers = {
-                'empresa-id': str(self.empresa_id),
-                'Content-Type': 'application/json'
-            }
-
-            if self.token:
-                headers['Authorization'] = f'Bearer {self.token}'
-
-            kwargs['headers'] = headers
+            kwargs['headers'] = self._cabeceras(kwargs.pop('headers', {}))
 
             async with self.session.request(method, url, **kwargs) as response:
                 if response.status == 200:
@@ -81,10 +173,90 @@ class SISPROConnector:
             self.logger.error(f"❌ Error en petición HTTP: {e}")
             return None
 
-    def obtener_estaciones(self) -> List[Dict]:
-        """Obtener estaciones de trabajo"""
+    def _cabeceras(self, extra: Dict[str, str]) -> Dict[str, str]:
+        """Cabeceras comunes de las peticiones a SISPRO"""
+        headers = {
+            'empresa-id': str(self.empresa_id),
+            'Content-Type': 'application/json'
+        }
+        headers.update(extra)
+
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return headers
+
+    async def _consultar_cacheado(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+        """GET servido desde el cache de respuestas; si venció se revalida en segundo plano"""
+        clave = CacheRespuestas.clave(endpoint, params)
+        entrada = self.respuestas.obtener(clave)
+        if entrada is None:
+            return await self._revalidar(clave)
+
+        if not self.respuestas.fresca(entrada, endpoint):
+            self._renovar_en_segundo_plano(clave)
+        return entrada.datos
+
+    def _renovar_en_segundo_plano(self, clave: str):
+        """Agendar la revalidación de una clave en el loop del conector (una a la vez)"""
+        if self.loop and self.respuestas.iniciar_renovacion(clave):
+            asyncio.run_coroutine_threadsafe(self._renovar(clave), self.loop)
+
+    async def _renovar(self, clave: str):
         try:
-            result = asyncio.run(self._make_request('GET', '/api/estacionesTrabajo'))
+            await self._revalidar(clave)
+        finally:
+            self.respuestas.terminar_renovacion(clave)
+
+    async def _revalidar(self, clave: str) -> Optional[Dict]:
+        """GET condicional (If-None-Match / If-Modified-Since); sin servidor retorna lo último conocido"""
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                self._revalidar(clave), self.loop
+            ))
+
+        entrada = self.respuestas.obtener(clave, usar=False)
+        try:
+            headers = self._cabeceras(CacheRespuestas.cabeceras_validacion(entrada))
+            async with self.session.get(f"{self.base_url}{clave}", headers=headers) as response:
+                if response.status == 304 and entrada is not None:
+                    return self.respuestas.revalidada(clave).datos
+
+                if response.status == 200:
+                    data = await response.json()
+                    if data and data.get('success'):
+                        self.respuestas.guardar(
+                            clave, data,
+                            response.headers.get('ETag'),
+                            response.headers.get('Last-Modified')
+                        )
+                    return data
+
+                self.logger.error(f"❌ Error HTTP {response.status}: {await response.text()}")
+
+        except Exception as e:
+            self.logger.warning(f"⚠️ SISPRO no respondió {clave}: {e}")
+
+        if entrada is not None:
+            self.logger.debug(f"📦 Usando última respuesta conocida de {clave} ({entrada.edad():.0f}s)")
+            return entrada.datos
+        return None
+
+    async def _refrescar_periodicamente(self):
+        """Revalidar en segundo plano las respuestas vencidas que se usan"""
+        while True:
+            await asyncio.sleep(self.INTERVALO_REFRESCO)
+            for clave in self.respuestas.por_renovar(time.time() - self.USO_RECIENTE_SEGUNDOS):
+                self._renovar_en_segundo_plano(clave)
+
+    def _vencer_consultas(self, *endpoints: str):
+        """Renovar ya las respuestas de endpoints afectados por un cambio"""
+        for clave in self.respuestas.claves(endpoints):
+            self._renovar_en_segundo_plano(clave)
+
+    async def obtener_estaciones_async(self) -> List[Dict]:
+        """Obtener estaciones de trabajo (async)"""
+        try:
+            result = await self._consultar_cacheado(ENDPOINT_ESTACIONES)
             if result and result.get('success'):
                 return result.get('data', [])
             return []
@@ -92,15 +264,15 @@ class SISPROConnector:
             self.logger.error(f"❌ Error obteniendo estaciones: {e}")
             return []
 
-    def obtener_ordenes_asignadas(self, estacion_id: int) -> List[Dict]:
-        """Obtener órdenes asignadas a una estación"""
+    def obtener_estaciones(self) -> List[Dict]:
+        """Obtener estaciones de trabajo"""
+        return self._ejecutar(self.obtener_estaciones_async(), [])
+
+    async def obtener_ordenes_asignadas_async(self, estacion_id: int) -> List[Dict]:
+        """Obtener órdenes asignadas a una estación (async)"""
         try:
             params = {'estacionTrabajoId': estacion_id}
-            result = asyncio.run(self._make_request(
-                'GET',
-                '/api/ordenesDeFabricacion/listarAsignadas',
-                params=params
-            ))
+            result = await self._consultar_cacheado(ENDPOINT_ORDENES_ASIGNADAS, params)
             if result and result.get('success'):
                 return result.get('data', [])
             return []
@@ -108,8 +280,12 @@ class SISPROConnector:
             self.logger.error(f"❌ Error obteniendo órdenes: {e}")
             return []
 
-    def registrar_lectura_upc(self, orden_fabricacion: str, upc: str, estacion_id: int, usuario_id: int) -> bool:
-        """Registrar lectura UPC"""
+    def obtener_ordenes_asignadas(self, estacion_id: int) -> List[Dict]:
+        """Obtener órdenes asignadas a una estación"""
+        return self._ejecutar(self.obtener_ordenes_asignadas_async(estacion_id), [])
+
+    async def registrar_lectura_upc_async(self, orden_fabricacion: str, upc: str, estacion_id: int, usuario_id: int) -> bool:
+        """Registrar lectura UPC (async)"""
         try:
             data = {
                 'ordenFabricacion': orden_fabricacion,
@@ -117,25 +293,55 @@ class SISPROConnector:
                 'estacionId': estacion_id,
                 'usuarioId': usuario_id
             }
-            result = asyncio.run(self._make_request(
+            result = await self._make_request(
                 'POST',
                 '/api/lecturaUPC/registrar',
                 json=data
-            ))
+            )
             return result and result.get('success', False)
         except Exception as e:
             self.logger.error(f"❌ Error registrando lectura UPC: {e}")
             return False
 
-    def consultar_avance_orden(self, orden_fabricacion: str) -> Optional[Dict]:
-        """Consultar avance de una orden"""
+    def registrar_lectura_upc(self, orden_fabricacion: str, upc: str, estacion_id: int, usuario_id: int) -> bool:
+        """Registrar lectura UPC"""
+        return self._ejecutar(self.registrar_lectura_upc_async(orden_fabricacion, upc, estacion_id, usuario_id), False)
+
+    async def registrar_lecturas_lote_async(self, lecturas: List[Dict]) -> bool:
+        """Registrar lecturas agregadas en lotes con llave de idempotencia (async)"""
+        try:
+            for inicio in range(0, len(lecturas), self.tamano_lote):
+                lote = lecturas[inicio:inicio + self.tamano_lote]
+
+                # La misma llave para el mismo lote permite reintentar sin duplicar
+                llaves = '|'.join(lectura['idempotencyKey'] for lectura in lote)
+                llave_lote = hashlib.sha1(llaves.encode('utf-8')).hexdigest()
+
+                result = await self._make_request(
+                    'POST',
+                    '/api/lecturaUPC/registrarLote',
+                    json={'lecturas': lote},
+                    headers={'Idempotency-Key': llave_lote}
+                )
+                if not (result and result.get('success', False)):
+                    self.logger.warning(f"⚠️ Lote {inicio // self.tamano_lote + 1} no registrado")
+                    return False
+
+            self._vencer_consultas(ENDPOINT_AVANCE)
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ Error registrando lote de lecturas: {e}")
+            return False
+
+    def registrar_lecturas_lote(self, lecturas: List[Dict]) -> bool:
+        """Registrar lecturas agregadas en lotes con llave de idempotencia"""
+        return self._ejecutar(self.registrar_lecturas_lote_async(lecturas), False)
+
+    async def consultar_avance_orden_async(self, orden_fabricacion: str) -> Optional[Dict]:
+        """Consultar avance de una orden (async)"""
         try:
             params = {'ordenFabricacion': orden_fabricacion}
-            result = asyncio.run(self._make_request(
-                'GET',
-                '/api/ordenesDeFabricacion/avance',
-                params=params
-            ))
+            result = await self._consultar_cacheado(ENDPOINT_AVANCE, params)
             if result and result.get('success'):
                 return result.get('data')
             return None
@@ -143,71 +349,96 @@ class SISPROConnector:
             self.logger.error(f"❌ Error consultando avance: {e}")
             return None
 
-    def cambiar_prioridad_orden(self, orden_fabricacion: str, prioridad: str, estacion_id: int) -> bool:
-        """Cambiar prioridad de una orden"""
+    def consultar_avance_orden(self, orden_fabricacion: str) -> Optional[Dict]:
+        """Consultar avance de una orden"""
+        return self._ejecutar(self.consultar_avance_orden_async(orden_fabricacion), None)
+
+    async def cambiar_prioridad_orden_async(self, orden_fabricacion: str, prioridad: str, estacion_id: int) -> bool:
+        """Cambiar prioridad de una orden (async)"""
         try:
             data = {
                 'ordenFabricacion': orden_fabricacion,
                 'prioridad': prioridad,
                 'estacionId': estacion_id
             }
-            result = asyncio.run(self._make_request(
+            result = await self._make_request(
                 'POST',
                 '/api/ordenesDeFabricacion/cambiarPrioridad',
                 json=data
-            ))
-            return result and result.get('success', False)
+            )
+            if result and result.get('success', False):
+                self._vencer_consultas(ENDPOINT_ORDENES_ASIGNADAS)
+                return True
+            return False
         except Exception as e:
             self.logger.error(f"❌ Error cambiando prioridad: {e}")
             return False
 
-    def cerrar_orden(self, orden_fabricacion: str, estacion_id: int) -> bool:
-        """Cerrar una orden"""
+    def cambiar_prioridad_orden(self, orden_fabricacion: str, prioridad: str, estacion_id: int) -> bool:
+        """Cambiar prioridad de una orden"""
+        return self._ejecutar(self.cambiar_prioridad_orden_async(orden_fabricacion, prioridad, estacion_id), False)
+
+    async def cerrar_orden_async(self, orden_fabricacion: str, estacion_id: int) -> bool:
+        """Cerrar una orden (async)"""
         try:
             data = {
                 'ordenFabricacion': orden_fabricacion,
                 'estacionId': estacion_id
             }
-            result = asyncio.run(self._make_request(
+            result = await self._make_request(
                 'POST',
                 '/api/ordenesDeFabricacion/cerrarOrden',
                 json=data
-            ))
-            return result and result.get('success', False)
+            )
+            if result and result.get('success', False):
+                self._vencer_consultas(ENDPOINT_ORDENES_ASIGNADAS, ENDPOINT_AVANCE)
+                return True
+            return False
         except Exception as e:
             self.logger.error(f"❌ Error cerrando orden: {e}")
             return False
 
-    def reabrir_orden(self, orden_fabricacion: str, estacion_id: int) -> bool:
-        """Reabrir una orden"""
+    def cerrar_orden(self, orden_fabricacion: str, estacion_id: int) -> bool:
+        """Cerrar una orden"""
+        return self._ejecutar(self.cerrar_orden_async(orden_fabricacion, estacion_id), False)
+
+    async def reabrir_orden_async(self, orden_fabricacion: str, estacion_id: int) -> bool:
+        """Reabrir una orden (async)"""
         try:
             data = {
                 'ordenFabricacion': orden_fabricacion,
                 'estacionId': estacion_id
             }
-            result = asyncio.run(self._make_request(
+            result = await self._make_request(
                 'POST',
                 '/api/ordenesDeFabricacion/reabrirOrden',
                 json=data
-            ))
-            return result and result.get('success', False)
+            )
+            if result and result.get('success', False):
+                self._vencer_consultas(ENDPOINT_ORDENES_ASIGNADAS, ENDPOINT_AVANCE)
+                return True
+            return False
         except Exception as e:
             self.logger.error(f"❌ Error reabriendo orden: {e}")
             return False
 
-    def consultar_lecturas_upc(self, fecha_inicial: str, fecha_final: str, estacion_id: int) -> List[Dict]:
-        """Consultar lecturas UPC"""
+    def reabrir_orden(self, orden_fabricacion: str, estacion_id: int) -> bool:
+        """Reabrir una orden"""
+        return self._ejecutar(self.reabrir_orden_async(orden_fabricacion, estacion_id), False)
+
+    async def consultar_lecturas_upc_async(self, fecha_inicial: str, fecha_final: str, estacion_id: int) -> List[Dict]:
+        """Consultar lecturas UPC (async)"""
         try:
             params = {
                 'fechaInicial': fecha_inicial,
                 'fechaFinal': fecha_final,
                 'estacionId': estacion_id
             }
-            result = asyncio.run(self._make_request(
+            result = await self._make_request(
                 'GET',
                 '/api/lecturaUPC/consultar',
                 params=params
-            ))
+            )
             if result and result.get('success'):
                 return result.get('data', [])
             return []
@@ -215,11 +446,19 @@ class SISPROConnector:
             self.logger.error(f"❌ Error consultando lecturas: {e}")
             return []
 
-    def verificar_conexion(self) -> bool:
-        """Verificar conexión con SISPRO"""
+    def consultar_lecturas_upc(self, fecha_inicial: str, fecha_final: str, estacion_id: int) -> List[Dict]:
+        """Consultar lecturas UPC"""
+        return self._ejecutar(self.consultar_lecturas_upc_async(fecha_inicial, fecha_final, estacion_id), [])
+
+    async def verificar_conexion_async(self) -> bool:
+        """Verificar conexión con SISPRO (async)"""
         try:
-            result = asyncio.run(self._make_request('GET', '/api/estacionesTrabajo'))
+            result = await self._make_request('GET', ENDPOINT_ESTACIONES)
             return result is not None
         except Exception as e:
             self.logger.error(f"❌ Error verificando conexión: {e}")
             return False
+
+    def verificar_conexion(self) -> bool:
+        """Verificar conexión con SISPRO"""
+        return self._ejecutar(self.verificar_conexion_async(), False)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Pruebas de almacenes_cache - El mismo contrato en los backends sqlite y memoria
+"""
+
+from datetime import datetime
+
+import pytest
+
+from config import Config
+from almacenes_cache import AlmacenSQLite, AlmacenMemoria, crear_almacen
+
+
+@pytest.fixture(params=['sqlite', 'memoria'])
+def almacen(request, tmp_path):
+    config = Config()
+    config.config['cache']['backend'] = request.param
+    config.config['cache']['sqlite_file'] = str(tmp_path / 'cache.db')
+    almacen = crear_almacen(config)
+    almacen.abrir()
+    yield almacen
+    almacen.cerrar()
+
+
+def fila(cantidad=1, estacion_id='1', fuente='RS485', timestamp=None, orden='OF-1'):
+    return (orden, '750', cantidad, timestamp or datetime(2024, 5, 1, 10, 30, 15), fuente, estacion_id)
+
+
+def test_crear_almacen_por_backend(tmp_path):
+    config = Config()
+    config.config['cache']['sqlite_file'] = str(tmp_path / 'cache.db')
+    config.config['cache']['backend'] = 'sqlite'
+    assert isinstance(crear_almacen(config), AlmacenSQLite)
+    config.config['cache']['backend'] = 'memoria'
+    assert isinstance(crear_almacen(config), AlmacenMemoria)
+    config.config['cache']['backend'] = 'otro'
+    with pytest.raises(ValueError):
+        crear_almacen(config)
+
+
+def test_insertar_y_paginar_pendientes(almacen):
+    ids = almacen.insertar_lecturas([fila(cantidad=i) for i in range(1, 6)])
+    assert ids == sorted(ids) and len(ids) == 5
+
+    pagina = almacen.pagina_pendientes(0, 3)
+    assert [l['cantidad'] for l in pagina] == [1, 2, 3]
+    siguiente = almacen.pagina_pendientes(pagina[-1]['id'], 3)
+    assert [l['cantidad'] for l in siguiente] == [4, 5]
+
+    assert [l['cantidad'] for l in almacen.pagina_pendientes(0, 10, hasta_id=ids[1])] == [1, 2]
+    assert almacen.primera_pendiente() == ids[0]
+    assert almacen.ultima_pendiente() == ids[-1]
+    assert almacen.ultimo_id() == ids[-1]
+
+
+def test_marcar_ids_y_tramo(almacen):
+    ids = almacen.insertar_lecturas([fila() for _ in range(6)])
+
+    almacen.marcar_ids([ids[0], ids[2]])
+    assert almacen.primera_pendiente() == ids[1]
+    assert almacen.contar_pendientes_despues(ids[2]) == 3
+
+    assert almacen.marcar_tramo(ids[0], ids[4]) == 3
+    assert [l['id'] for l in almacen.pagina_pendientes(0, 10)] == [ids[5]]
+
+    estadisticas = almacen.estadisticas()
+    assert estadisticas['total_lecturas'] == 6
+    assert estadisticas['lecturas_pendientes'] == 1
+
+
+def test_rollups_y_totales(almacen):
+    almacen.insertar_lecturas([
+        fila(cantidad=2),
+        fila(cantidad=3),
+        fila(cantidad=5, estacion_id=None, fuente='MANUAL'),
+        fila(cantidad=1, timestamp=datetime(2024, 5, 1, 10, 31, 0))
+    ])
+
+    minutos = almacen.obtener_rollup('minuto', '2024-05-01 10:30', estacion_id=None)
+    por_clave = {(f['periodo'], f['estacion_id'], f['fuente']): (f['lecturas'], f['cantidad']) for f in minutos}
+    assert por_clave[('2024-05-01 10:30', '1', 'RS485')] == (2, 5)
+    assert por_clave[('2024-05-01 10:30', None, 'MANUAL')] == (1, 5)
+    assert por_clave[('2024-05-01 10:31', '1', 'RS485')] == (1, 1)
+
+    horas = almacen.obtener_rollup('hora', '2024-05-01 10')
+    assert sum(f['cantidad'] for f in horas) == 11
+
+    assert almacen.obtener_rollup('minuto', '2024-05-01 10:31') == [
+        {'periodo': '2024-05-01 10:31', 'orden_fabricacion': 'OF-1', 'estacion_id': '1',
+         'fuente': 'RS485', 'lecturas': 1, 'cantidad': 1}
+    ]
+    assert almacen.estadisticas()['lecturas_por_fuente'] == {'RS485': 3, 'MANUAL': 1}
+
+
+def test_granularidad_invalida(almacen):
+    with pytest.raises(ValueError):
+        almacen.obtener_rollup('semana', '2024')
+
+
+def test_configuracion(almacen):
+    assert almacen.obtener_configuracion('clave') is None
+    almacen.guardar_configuracion('clave', 42)
+    assert almacen.obtener_configuracion('clave') == '42'
+    almacen.guardar_configuracion('clave', None)
+    assert almacen.obtener_configuracion('clave') is None
+
+
+def test_puntos_control_con_el_lote(almacen):
+    almacen.insertar_lecturas([fila()], {'contador_P1': 120, 'contador_P2': 7})
+    assert almacen.obtener_configuracion('contador_P1') == '120'
+    assert almacen.obtener_configuracion('contador_P2') == '7'
+
+    # Un lote solo con puntos de control no crea lecturas
+    assert almacen.insertar_lecturas([], {'contador_P1': 121}) == []
+    assert almacen.obtener_configuracion('contador_P1') == '121'
+    assert almacen.ultimo_id() == 1
+
+
+def test_estado_de_estacion(almacen):
+    estado = {
+        'estado': 'ACTIVO',
+        'orden_actual': 'OF-1',
+        'contador': 10,
+        'meta': 100,
+        'ultima_actividad': '2024-05-01T10:30:00',
+        'tiempo_inactivo': 0
+    }
+    almacen.guardar_estado('E1', estado, 1)
+    assert almacen.obtener_estado('E1') == estado
+    assert almacen.obtener_estado('E2') is None
+
+
+def test_eliminar_sincronizadas_y_rollup(almacen):
+    ids = almacen.insertar_lecturas([fila(), fila()])
+    almacen.marcar_ids([ids[0]])
+
+    assert almacen.eliminar_sincronizadas(datetime(2030, 1, 1)) == 1
+    assert almacen.estadisticas()['lecturas_pendientes'] == 1
+
+    assert almacen.eliminar_rollup('minuto', '2030-01-01 00:00') == 1
+    assert almacen.obtener_rollup('minuto', '2000-01-01 00:00') == []
+    # Los totales sobreviven a la limpieza
+    assert almacen.estadisticas()['total_lecturas'] == 2
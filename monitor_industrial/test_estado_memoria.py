@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Pruebas de estado_memoria - Versiones, copias, TTL, desalojo LRU y estado de los Pico
+"""
+
+from config import Config
+from cache_manager import CacheManager
+from estado_manager import EstadoManager
+from estado_memoria import EstadoMemoria
+
+
+def test_guardar_incrementa_version():
+    estados = EstadoMemoria()
+    assert estados.version('E1') == 0
+    assert estados.guardar('E1', {'estado': 'ACTIVO'}) == 1
+    assert estados.guardar('E1', {'estado': 'PAUSA'}) == 2
+    assert estados.obtener('E1') == {'estado': 'PAUSA'}
+
+
+def test_cargar_no_crea_version():
+    estados = EstadoMemoria()
+    estados.cargar('E1', {'estado': 'ACTIVO'})
+    assert estados.version('E1') == 0
+    assert estados.obtener('E1') == {'estado': 'ACTIVO'}
+
+
+def test_obtener_devuelve_copia():
+    estados = EstadoMemoria()
+    valor = {'contador': 1}
+    estados.guardar('E1', valor)
+    valor['contador'] = 99
+    copia = estados.obtener('E1')
+    copia['contador'] = 50
+    assert estados.obtener('E1') == {'contador': 1}
+
+
+def test_entrada_vencida_se_vuelve_a_cargar():
+    estados = EstadoMemoria(ttl=-1)
+    estados.guardar('E1', {'estado': 'ACTIVO'})
+    assert estados.obtener('E1') is None
+    assert estados.version('E1') == 1
+
+    estadisticas = estados.obtener_estadisticas()
+    assert estadisticas['vencidas'] == 1
+    assert estadisticas['entradas'] == 0
+
+
+def test_desalojo_lru():
+    estados = EstadoMemoria(max_entradas=2)
+    estados.guardar('E1', {'n': 1})
+    estados.guardar('E2', {'n': 2})
+    estados.obtener('E1')  # E2 pasa a ser la menos usada
+    estados.guardar('E3', {'n': 3})
+
+    assert estados.obtener('E2') is None
+    assert estados.obtener('E1') == {'n': 1}
+    assert estados.obtener('E3') == {'n': 3}
+    assert estados.obtener_estadisticas()['desalojadas'] == 1
+
+
+def test_aciertos_y_fallos():
+    estados = EstadoMemoria()
+    estados.obtener('E1')
+    estados.guardar('E1', {})
+    estados.obtener('E1')
+
+    estadisticas = estados.obtener_estadisticas()
+    assert estadisticas['aciertos'] == 1
+    assert estadisticas['fallos'] == 1
+
+
+def test_estado_pico_pasa_por_el_cache(tmp_path):
+    config = Config()
+    config.config['cache']['backend'] = 'sqlite'
+    config.config['cache']['sqlite_file'] = str(tmp_path / 'cache.db')
+    cache = CacheManager(config)
+    cache.inicializar()
+    try:
+        estado = EstadoManager(cache)
+        estado.actualizar_estado_pico('P1', 'ACTIVO', orden_actual='OF-1', contador=7, meta=100)
+        estado.actualizar_tiempo_inactivo('P1', 30)
+
+        assert cache.estados.version('P1') == 2
+        assert estado.obtener_estado_pico()['P1']['tiempo_inactivo'] == 30
+        assert estado.obtener_estado_pico('P1')['contador'] == 7
+        assert estado.verificar_estado_pico('P1')
+        assert estado.obtener_estado_pico('P2')['estado'] == 'DESCONECTADO'
+
+        # Solo la última versión llega al almacén
+        cache.vaciar_cola()
+        assert cache.almacen.obtener_estado('P1')['tiempo_inactivo'] == 30
+    finally:
+        cache.cerrar()
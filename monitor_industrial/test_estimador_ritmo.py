@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Pruebas de estimador_ritmo - Ventana deslizante, EWMA, tiempo restante e inactividad
+"""
+
+import pytest
+
+from estimador_ritmo import EstimadorRitmo, formatear_duracion
+
+
+def test_formatear_duracion():
+    assert formatear_duracion(None) == "--"
+    assert formatear_duracion(35) == "35s"
+    assert formatear_duracion(250) == "4m 10s"
+    assert formatear_duracion(4980) == "1h 23m"
+
+
+def test_ritmo_constante():
+    estimador = EstimadorRitmo(ventana_segundos=60, ranuras=60)
+    for segundo in range(1, 61):
+        estimador.registrar(2, instante=1000.0 + segundo)
+
+    ritmo = estimador.obtener_ritmo(instante=1060.5)
+    assert ritmo['piezas_minuto'] == pytest.approx(120, rel=0.05)
+    assert ritmo['piezas_minuto_ewma'] == pytest.approx(120)
+    assert not ritmo['inactivo']
+
+
+def test_ventana_parcial_divide_por_lo_observado():
+    estimador = EstimadorRitmo(ventana_segundos=60, ranuras=60)
+    estimador.registrar(10, instante=500.0)
+    estimador.registrar(10, instante=510.0)
+    assert estimador.obtener_ritmo(instante=520.0)['piezas_minuto'] == pytest.approx(60)
+
+
+def test_piezas_salen_de_la_ventana():
+    estimador = EstimadorRitmo(ventana_segundos=60, ranuras=60, inactivo_segundos=30)
+    estimador.registrar(30, instante=100.0)
+
+    ritmo = estimador.obtener_ritmo(instante=200.0)
+    assert ritmo['piezas_minuto'] == 0
+    assert ritmo['inactivo']
+    assert ritmo['segundos_sin_piezas'] == pytest.approx(100)
+
+
+def test_undo_resta_de_la_ventana():
+    estimador = EstimadorRitmo(ventana_segundos=60, ranuras=60)
+    estimador.registrar(5, instante=10.0)
+    estimador.registrar(-1, instante=11.0)
+    estimador.registrar(5, instante=40.0)
+    # 9 piezas en los 30 s observados
+    assert estimador.obtener_ritmo(instante=40.0)['piezas_minuto'] == pytest.approx(18)
+
+
+def test_tiempo_restante_con_meta():
+    estimador = EstimadorRitmo()
+    for segundo in range(0, 11):
+        estimador.registrar(1, instante=float(segundo))
+
+    # 60 piezas/minuto y faltan 30
+    ritmo = estimador.obtener_ritmo(meta=100, contador=70, instante=10.5)
+    assert ritmo['segundos_restantes'] == pytest.approx(30)
+
+    # Sin meta o inactivo no hay estimación
+    assert estimador.obtener_ritmo(instante=10.5)['segundos_restantes'] is None
+    assert estimador.obtener_ritmo(meta=100, contador=70, instante=100.0)['segundos_restantes'] is None
+
+
+def test_reiniciar_olvida_el_ritmo():
+    estimador = EstimadorRitmo()
+    estimador.registrar(10, instante=1.0)
+    estimador.registrar(10, instante=2.0)
+    estimador.reiniciar()
+
+    ritmo = estimador.obtener_ritmo(instante=3.0)
+    assert ritmo['piezas_minuto'] == 0
+    assert ritmo['piezas_minuto_ewma'] == 0
+    assert ritmo['segundos_sin_piezas'] is None
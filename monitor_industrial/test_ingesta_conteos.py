@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Pruebas de ingesta_conteos - Deltas, RESET/UNDO y punto de control tras reinicio
+"""
+
+from datetime import datetime
+
+from config import Config
+from cache_manager import CacheManager
+from ingesta_conteos import IngestaConteos
+
+
+class CacheFalso:
+    """Solo la configuración que usa la ingesta"""
+
+    def __init__(self):
+        self.configuracion = {}
+        self.puntos_control = []
+
+    def obtener_configuracion(self, clave):
+        return self.configuracion.get(clave)
+
+    def guardar_configuracion(self, clave, valor, esperar=True):
+        self.configuracion[clave] = str(valor)
+
+    def guardar_punto_control(self, clave, valor):
+        self.puntos_control.append((clave, valor))
+        self.configuracion[clave] = str(valor)
+
+
+def test_primera_lectura_fija_la_base():
+    ingesta = IngestaConteos()
+    assert ingesta.procesar('P1', 'CONT', 50) == 0
+    assert ingesta.procesar('P1', 'CONT', 53) == 3
+    assert ingesta.procesar('P1', 'CONT', 53) == 0
+
+
+def test_undo_da_delta_negativo():
+    ingesta = IngestaConteos()
+    ingesta.procesar('P1', 'CONT', 10)
+    assert ingesta.procesar('P1', 'CONT', 9) == -1
+    assert ingesta.obtener_estadisticas()['undos'] == 1
+
+
+def test_reset_del_pico_no_es_undo():
+    ingesta = IngestaConteos()
+    ingesta.procesar('P1', 'CONT', 120)
+    assert ingesta.procesar('P1', 'RESET', 0) == 0
+    assert ingesta.procesar('P1', 'CONT', 2) == 2
+
+    estadisticas = ingesta.obtener_estadisticas()
+    assert estadisticas['resets'] == 1
+    assert estadisticas['undos'] == 0
+
+
+def test_estaciones_independientes():
+    ingesta = IngestaConteos()
+    ingesta.procesar('P1', 'CONT', 10)
+    ingesta.procesar('P2', 'CONT', 500)
+    assert ingesta.procesar('P1', 'CONT', 11) == 1
+    assert ingesta.procesar('P2', 'CONT', 505) == 5
+
+
+def test_otros_tags_no_cuentan():
+    ingesta = IngestaConteos()
+    assert ingesta.procesar('P1', 'HEARTBEAT', 1) == 0
+    assert ingesta.obtener_estadisticas()['contadores'] == {}
+
+
+def test_punto_control_tras_reinicio_del_pi():
+    cache = CacheFalso()
+    ingesta = IngestaConteos(cache)
+    ingesta.procesar('P1', 'CONT', 10)
+    ingesta.guardar_checkpoint('P1')
+    ingesta.procesar('P1', 'CONT', 14)
+    clave, valor = ingesta.punto_control('P1')
+    cache.configuracion[clave] = str(valor)  # Lo escribe el lote de la lectura del delta
+
+    # El Pi reinicia y el Pico siguió contando
+    ingesta = IngestaConteos(cache)
+    assert ingesta.procesar('P1', 'CONT', 20) == 6
+
+
+def test_guardar_checkpoint_solo_si_cambio():
+    cache = CacheFalso()
+    ingesta = IngestaConteos(cache)
+    ingesta.procesar('P1', 'CONT', 10)
+    ingesta.guardar_checkpoint('P1')
+    ingesta.guardar_checkpoint('P1')
+    assert cache.puntos_control == [('contador_P1', 10)]
+
+    ingesta.procesar('P1', 'CONT', 12)
+    assert ingesta.punto_control('P1') == ('contador_P1', 12)
+    ingesta.guardar_checkpoint('P1')
+    assert cache.puntos_control == [('contador_P1', 10)]
+
+    ingesta.procesar('P1', 'RESET', 0)
+    ingesta.guardar_checkpoint('P1')
+    assert cache.puntos_control[-1] == ('contador_P1', 0)
+
+
+def test_punto_control_en_la_transaccion_del_lote(tmp_path):
+    config = Config()
+    config.config['cache']['backend'] = 'sqlite'
+    config.config['cache']['sqlite_file'] = str(tmp_path / 'cache.db')
+    cache = CacheManager(config)
+    cache.inicializar()
+    try:
+        ingesta = IngestaConteos(cache)
+        ingesta.procesar('P1', 'CONT', 100)
+        ingesta.guardar_checkpoint('P1')
+        for valor in (101, 103, 110):
+            delta = ingesta.procesar('P1', 'CONT', valor)
+            cache.guardar_lectura({
+                'orden_fabricacion': 'OF-1',
+                'upc': '750',
+                'cantidad': delta,
+                'timestamp': datetime.now(),
+                'fuente': 'RS485',
+                'estacion_id': '1'
+            }, punto_control=ingesta.punto_control('P1'))
+        cache.vaciar_cola()
+
+        assert sum(l['cantidad'] for l in cache.obtener_lecturas_pendientes()) == 10
+        assert cache.obtener_configuracion('contador_P1') == '110'
+
+        # Reinicio sin detener: el primer CONT solo aporta lo nuevo
+        assert IngestaConteos(cache).procesar('P1', 'CONT', 112) == 2
+    finally:
+        cache.cerrar()
@@ -21,6 +21,7 @@ from config_mac import Config
 from barcode_validator import BarcodeValidator
 from cache_manager_mac import CacheManager
 from estado_manager import EstadoManager
+from estimador_ritmo import EstimadorRitmo
 from interfaz_industrial import InterfazIndustrial
 
 class SimuladorRS485:
@@ -250,6 +251,11 @@ class MonitorIndustrialMac:
         self.barcode = BarcodeValidator()
         self.cache = CacheManager(self.config)
         self.estado = EstadoManager()
+        self.ritmo = EstimadorRitmo(
+            ventana_segundos=self.config.ritmo_ventana_segundos,
+            ewma_segundos=self.config.ritmo_ewma_segundos,
+            inactivo_segundos=self.config.ritmo_inactivo_segundos
+        )
         self.interfaz = None
 
         # Estado del sistema
@@ -386,7 +392,8 @@ class MonitorIndustrialMac:
             valor = int(valor)
 
             if tag == 'CONT':
-                # Actualizar contador local
+                # Actualizar contador local y ritmo
+                self.ritmo.registrar(valor - self.lecturas_acumuladas)
                 self.lecturas_acumuladas = valor
 
                 # Guardar en cache
@@ -535,6 +542,7 @@ class MonitorIndustrialMac:
             # Validar UPC contra la orden
             if upc == self.orden_actual['ptUPC']:
                 self.upc_validado = upc
+                self.ritmo.reiniciar()
                 self.estado.cambiar_estado(EstadoManager.EstadoSistema.PRODUCIENDO)
 
                 # Activar comunicación con Pico
@@ -586,6 +594,7 @@ class MonitorIndustrialMac:
                 self.orden_actual = None
                 self.upc_validado = None
                 self.lecturas_acumuladas = 0
+                self.ritmo.reiniciar()
                 self.estado.cambiar_estado(EstadoManager.EstadoSistema.INACTIVO)
 
                 self.logger.info("✅ Orden finalizada")
@@ -13,8 +13,11 @@ import logging
 import requests
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from cache_respuestas import CacheRespuestas
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -131,6 +134,74 @@ class MonitorIndustrialCloud:
         # Archivo de configuración local
         self.config_file = "monitor_config.json"
 
+        # Últimas respuestas reales de SISPRO (se usan antes que las simuladas)
+        self.respuestas = CacheRespuestas("sispro_respuestas_cloud.db", {
+            '/api/estacionesTrabajo': 3600,
+            '/api/ordenesDeFabricacion/listarAsignadas': 60,
+            '/api/ordenesDeFabricacion/avance': 15
+        })
+        self.respuestas.abrir()
+
+        # Consultas de detalle fuera del thread de Tk; los resultados vuelven con after().
+        # La precarga usa su propio pool para no retrasar la orden que se abre
+        self.ejecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sispro")
+        self.ejecutor_precarga = ThreadPoolExecutor(max_workers=3, thread_name_prefix="sispro-precarga")
+        self.detalles_futuros = {}
+        self.orden_abriendo = None
+
+    def consultar_cacheado(self, endpoint, params=None):
+        """GET con cache persistente: vencida se revalida en segundo plano, sin servidor la última real"""
+        clave = CacheRespuestas.clave(endpoint, params)
+        entrada = self.respuestas.obtener(clave)
+        if entrada is not None:
+            if self.conectado_cloud and not self.respuestas.fresca(entrada, endpoint):
+                if self.respuestas.iniciar_renovacion(clave):
+                    threading.Thread(target=self.renovar_respuesta, args=(clave,), daemon=True).start()
+            return entrada.datos
+
+        if not self.conectado_cloud:
+            return None
+        return self.revalidar_respuesta(clave)
+
+    def renovar_respuesta(self, clave):
+        """Revalidar una respuesta en segundo plano"""
+        try:
+            self.revalidar_respuesta(clave)
+        finally:
+            self.respuestas.terminar_renovacion(clave)
+
+    def revalidar_respuesta(self, clave):
+        """GET condicional con ETag / Last-Modified; si falla retorna la última respuesta real"""
+        entrada = self.respuestas.obtener(clave, usar=False)
+        try:
+            headers = {
+                'empresa-id': str(self.empresa_id),
+                'Content-Type': 'application/json'
+            }
+            headers.update(CacheRespuestas.cabeceras_validacion(entrada))
+
+            response = requests.get(f"{self.base_url}{clave}", headers=headers, timeout=5)
+
+            if response.status_code == 304 and entrada is not None:
+                return self.respuestas.revalidada(clave).datos
+
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success', False):
+                    self.respuestas.guardar(
+                        clave, data,
+                        response.headers.get('ETag'),
+                        response.headers.get('Last-Modified')
+                    )
+                return data
+
+            logger.warning(f"⚠️ Error consultando {clave} ({response.status_code})")
+
+        except Exception as e:
+            logger.warning(f"⚠️ Error consultando {clave}: {e}")
+
+        return entrada.datos if entrada else None
+
     def guardar_configuracion(self):
         """Guardar configuración en archivo local"""
         try:
@@ -207,69 +278,34 @@ class MonitorIndustrialCloud:
             return False
 
     def obtener_estaciones(self):
-        """Obtener estaciones de trabajo desde SISPRO o usar simuladas"""
-        if not self.conectado_cloud:
+        """Obtener estaciones de trabajo desde SISPRO (o su última respuesta) o usar simuladas"""
+        try:
+            data = self.consultar_cacheado('/api/estacionesTrabajo')
+            if data and data.get('success', False):
+                self.estaciones = data.get('data', [])
+                logger.info(f"✅ Obtenidas {len(self.estaciones)} estaciones desde SISPRO")
+                return True
+
             logger.info("📡 Usando datos simulados para estaciones")
             self.estaciones = self.estaciones_simuladas
             return True
 
-        try:
-            url = f"{self.base_url}/api/estacionesTrabajo"
-            headers = {
-                'empresa-id': str(self.empresa_id),  # Solo necesita empresa-id
-                'Content-Type': 'application/json'
-            }
-
-            response = requests.get(url, headers=headers, timeout=5)
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success', False):
-                    self.estaciones = data.get('data', [])
-                    logger.info(f"✅ Obtenidas {len(self.estaciones)} estaciones desde SISPRO")
-                    return True
-                else:
-                    logger.warning(f"⚠️ Respuesta SISPRO no exitosa, usando simuladas")
-                    self.estaciones = self.estaciones_simuladas
-                    return True
-            else:
-                logger.warning(f"⚠️ Error obteniendo estaciones ({response.status_code}), usando simuladas")
-                self.estaciones = self.estaciones_simuladas
-                return True
-
         except Exception as e:
             logger.warning(f"⚠️ Error obteniendo estaciones, usando simuladas: {e}")
             self.estaciones = self.estaciones_simuladas
             return True
 
     def obtener_carga_trabajo(self, estacion_id):
-        """Obtener carga de trabajo asignada desde SISPRO o usar simulada"""
-        if not self.conectado_cloud:
-            logger.info("📡 Usando datos simulados para carga de trabajo")
-            self.carga_trabajo = self.carga_trabajo_simulada
-            self.calcular_estadisticas()
-            return True
-
+        """Obtener carga de trabajo asignada desde SISPRO (o su última respuesta) o usar simulada"""
         try:
-            url = f"{self.base_url}/api/ordenesDeFabricacion/listarAsignadas"
-            headers = {
-                'empresa-id': str(self.empresa_id),  # Solo necesita empresa-id
-                'Content-Type': 'application/json'
-            }
             params = {'estacionTrabajoId': estacion_id}
+            data = self.consultar_cacheado('/api/ordenesDeFabricacion/listarAsignadas', params)
 
-            response = requests.get(url, headers=headers, params=params, timeout=5)
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success', False):
-                    self.carga_trabajo = data.get('data', [])
-                    logger.info(f"✅ Obtenida carga de trabajo desde SISPRO: {len(self.carga_trabajo)} órdenes")
-                else:
-                    logger.warning(f"⚠️ Respuesta SISPRO no exitosa, usando simulada")
-                    self.carga_trabajo = self.carga_trabajo_simulada
+            if data and data.get('success', False):
+                self.carga_trabajo = data.get('data', [])
+                logger.info(f"✅ Obtenida carga de trabajo desde SISPRO: {len(self.carga_trabajo)} órdenes")
             else:
-                logger.warning(f"⚠️ Error obteniendo carga de trabajo ({response.status_code}), usando simulada")
+                logger.info("📡 Usando datos simulados para carga de trabajo")
                 self.carga_trabajo = self.carga_trabajo_simulada
 
             self.calcular_estadisticas()
@@ -331,33 +367,22 @@ class MonitorIndustrialCloud:
             return True
 
     def consultar_avance_orden(self, orden_fabricacion):
-        """Consultar avance de orden en SISPRO"""
-        if not self.conectado_cloud:
-            logger.info(f"📡 Simulando consulta de avance para orden: {orden_fabricacion}")
-            return {"cantidadPendiente": 0, "avance": 100.0}
-
+        """Consultar avance de orden en SISPRO (o su última respuesta)"""
         try:
-            url = f"{self.base_url}/api/ordenesDeFabricacion/avance"
-            headers = {
-                'empresa-id': str(self.empresa_id),  # Solo necesita empresa-id
-                'Content-Type': 'application/json'
-            }
             params = {'ordenFabricacion': orden_fabricacion}
+            data = self.consultar_cacheado('/api/ordenesDeFabricacion/avance', params)
 
-            response = requests.get(url, headers=headers, params=params, timeout=5)
+            if data and data.get('success', False):
+                avance_data = data.get('data', {})
+                logger.info(f"✅ Avance consultado para {orden_fabricacion}: {avance_data}")
+                return avance_data
 
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success', False):
-                    avance_data = data.get('data', {})
-                    logger.info(f"✅ Avance consultado para {orden_fabricacion}: {avance_data}")
-                    return avance_data
-                else:
-                    logger.warning(f"⚠️ Respuesta SISPRO no exitosa para avance")
-                    return {"cantidadPendiente": 0, "avance": 0.0}
-            else:
-                logger.warning(f"⚠️ Error consultando avance ({response.status_code})")
-                return {"cantidadPendiente": 0, "avance": 0.0}
+            if not self.conectado_cloud:
+                logger.info(f"📡 Simulando consulta de avance para orden: {orden_fabricacion}")
+                return {"cantidadPendiente": 0, "avance": 100.0}
+
+            logger.warning(f"⚠️ Respuesta SISPRO no exitosa para avance")
+            return {"cantidadPendiente": 0, "avance": 0.0}
 
         except Exception as e:
             logger.warning(f"⚠️ Error consultando avance, simulando: {e}")
@@ -868,9 +893,14 @@ class MonitorIndustrialCloud:
         self.tabla.column('Prioridad', width=80)
         self.tabla.column('Acciones', width=150)
 
-        # Scrollbar
+        # Scrollbar (al desplazarse se precargan los detalles de las filas visibles)
         scrollbar = ttk.Scrollbar(tabla_container, orient=tk.VERTICAL, command=self.tabla.yview)
-        self.tabla.configure(yscrollcommand=scrollbar.set)
+
+        def desplazar(*args):
+            scrollbar.set(*args)
+            self.root.after_idle(self.precargar_detalles_visibles)
+
+        self.tabla.configure(yscrollcommand=desplazar)
 
         # Pack tabla y scrollbar
         self.tabla.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -900,6 +930,36 @@ class MonitorIndustrialCloud:
                 "Leer UPC | Prioridad"
             ))
 
+        # Olvidar detalles de órdenes que ya no están y precargar las visibles
+        ordenes = {str(item.get('ordenFabricacion')) for item in self.carga_trabajo}
+        self.detalles_futuros = {of: f for of, f in self.detalles_futuros.items() if of in ordenes}
+        self.root.after_idle(self.precargar_detalles_visibles)
+
+    def precargar_detalles_visibles(self):
+        """Consultar en segundo plano los detalles de las filas visibles"""
+        try:
+            filas = self.tabla.get_children()
+            visibles = [fila for fila in filas if self.tabla.bbox(fila)]
+            if not visibles:
+                # Aún sin dibujar: las primeras filas que caben en la tabla
+                visibles = filas[:int(self.tabla.cget('height'))]
+
+            for fila in visibles:
+                self.futuro_detalles(str(self.tabla.item(fila)['values'][0]), self.ejecutor_precarga)
+        except Exception as e:
+            logger.error(f"❌ Error precargando detalles: {e}")
+
+    def futuro_detalles(self, of, ejecutor=None):
+        """Consulta de detalles de una orden (reusa la precargada si no falló)"""
+        futuro = self.detalles_futuros.get(of)
+        if futuro is not None and not futuro.done() and ejecutor is None and futuro.cancel():
+            # Precarga aún en cola: pedirla ya en el pool interactivo
+            futuro = None
+        if futuro is None or futuro.cancelled() or (futuro.done() and (futuro.exception() or not futuro.result())):
+            futuro = (ejecutor or self.ejecutor).submit(self.consultar_detalles_orden, of)
+            self.detalles_futuros[of] = futuro
+        return futuro
+
     def actualizar_estadisticas_globales(self):
         """Actualizar estadísticas globales en la interfaz"""
         self.total_fabricar_var.set(str(self.total_fabricar))
@@ -916,11 +976,7 @@ class MonitorIndustrialCloud:
                 pt = item['values'][1]
 
                 logger.info(f"📋 Orden seleccionada: {of} - {pt}")
-                logger.info(f"📊 Carga de trabajo disponible: {len(self.carga_trabajo)} órdenes")
-
-                # Debug: mostrar las órdenes disponibles con todos los campos
-                for i, item in enumerate(self.carga_trabajo):
-                    logger.info(f"   {i}: {item}")
+                logger.debug(f"📊 Carga de trabajo disponible: {len(self.carga_trabajo)} órdenes")
 
                 # Buscar el item en la carga de trabajo
                 trabajo_item = None
@@ -938,48 +994,72 @@ class MonitorIndustrialCloud:
                         break
 
                 if trabajo_item:
+                    if self.orden_abriendo == of:
+                        return
                     logger.info(f"🔍 Iniciando consulta de detalles para: {trabajo_item.get('ptDescripcion', 'N/A')}")
 
-                    # Consultar detalles completos de la orden
-                    detalles = self.consultar_detalles_orden(of)
-                    if detalles:
-                        logger.info(f"📋 Detalles obtenidos: {detalles.get('descripcionPT', 'N/A')}")
-
-                        # Obtener UPC del producto
-                        upc = trabajo_item.get('ptUPC', '')
-                        if not upc and detalles:
-                            upc = detalles.get('ptUPC', '')
-
-                        # Consultar cajas ya registradas
-                        cajas_registradas = self.consultar_cajas_registradas(of)
-
-                        # Obtener imagen del artículo
-                        imagen_url = self.obtener_imagen_articulo(pt)
-
-                        # Agregar información adicional al trabajo_item
-                        trabajo_item.update({
-                            'detalles_completos': detalles,
-                            'upc_producto': upc,
-                            'cajas_registradas': cajas_registradas,
-                            'imagen_url': imagen_url
-                        })
-
-                        logger.info(f"🎯 UPC del producto: {upc}")
-                        logger.info(f"📦 Cajas registradas: {cajas_registradas}")
-                        logger.info(f"🖼️ Imagen: {imagen_url if imagen_url else 'No disponible'}")
-
-                        # Abrir pantalla de lectura con toda la información
-                        self.mostrar_pantalla_lectura(trabajo_item)
-                    else:
-                        logger.warning(f"⚠️ No se pudieron obtener los detalles de la orden {of}")
-                        # Abrir con datos básicos
-                        self.mostrar_pantalla_lectura(trabajo_item)
+                    # Detalles (quizá ya precargados), cajas e imagen en paralelo
+                    futuros = {
+                        'detalles': self.futuro_detalles(str(of)),
+                        'cajas': self.ejecutor.submit(self.consultar_cajas_registradas, of),
+                        'imagen': self.ejecutor.submit(self.obtener_imagen_articulo, pt)
+                    }
+                    self.orden_abriendo = of
+                    self.root.after(0, self.esperar_info_orden, of, trabajo_item, futuros)
                 else:
                     logger.warning(f"⚠️ No se encontró la orden {of} - {pt} en la carga de trabajo")
 
         except Exception as e:
             logger.error(f"❌ Error en clic de tabla: {e}")
 
+    def esperar_info_orden(self, of, trabajo_item, futuros):
+        """Esperar sin bloquear Tk las consultas de una orden y abrir la lectura"""
+        try:
+            if self.orden_abriendo != of:
+                # El usuario eligió otra orden mientras tanto
+                return
+            if not all(futuro.done() for futuro in futuros.values()):
+                self.root.after(20, self.esperar_info_orden, of, trabajo_item, futuros)
+                return
+            self.orden_abriendo = None
+
+            resultados = {
+                nombre: None if futuro.cancelled() or futuro.exception() else futuro.result()
+                for nombre, futuro in futuros.items()
+            }
+            detalles = resultados['detalles']
+            if detalles:
+                logger.info(f"📋 Detalles obtenidos: {detalles.get('descripcionPT', 'N/A')}")
+
+                # Obtener UPC del producto
+                upc = trabajo_item.get('ptUPC', '')
+                if not upc and detalles:
+                    upc = detalles.get('ptUPC', '')
+
+                cajas_registradas = resultados['cajas'] or 0
+                imagen_url = resultados['imagen'] or ''
+
+                # Agregar información adicional al trabajo_item
+                trabajo_item.update({
+                    'detalles_completos': detalles,
+                    'upc_producto': upc,
+                    'cajas_registradas': cajas_registradas,
+                    'imagen_url': imagen_url
+                })
+
+                logger.info(f"🎯 UPC del producto: {upc}")
+                logger.info(f"📦 Cajas registradas: {cajas_registradas}")
+                logger.info(f"🖼️ Imagen: {imagen_url if imagen_url else 'No disponible'}")
+            else:
+                logger.warning(f"⚠️ No se pudieron obtener los detalles de la orden {of}")
+
+            # Abrir pantalla de lectura (con datos básicos si no hubo detalles)
+            self.mostrar_pantalla_lectura(trabajo_item)
+
+        except Exception as e:
+            self.orden_abriendo = None
+            logger.error(f"❌ Error abriendo orden {of}: {e}")
+
     def abrir_lectura(self, event):
         """Abrir pantalla de lectura para el item seleccionado"""
         try:
@@ -1298,6 +1378,8 @@ class MonitorIndustrialCloud:
         try:
             if messagebox.askyesno("Confirmar", "¿Salir del Monitor Industrial?"):
                 self.running = False
+                self.ejecutor.shutdown(wait=False, cancel_futures=True)
+                self.ejecutor_precarga.shutdown(wait=False, cancel_futures=True)
                 self.root.quit()
         except Exception as e:
             logger.error(f"❌ Error saliendo: {e}")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Pruebas de protocolo_rs485 - CRC16, ida y vuelta de TLV y tramas truncadas
+"""
+
+import pytest
+
+from protocolo_rs485 import SOF, crc16, codificar_trama, decodificar_trama
+
+
+def test_crc16_modbus():
+    # Vector de referencia del CRC16 Modbus
+    assert crc16(b"123456789") == 0x4B37
+
+
+def test_ida_y_vuelta():
+    campos = [('CONT', 7), ('TOTAL', -1), ('META', 300), ('LOG', 2 ** 31 - 1), ('FIN', 4)]
+    trama = codificar_trama('PICO1', 65535, campos)
+
+    decodificada, consumidos = decodificar_trama(trama)
+
+    assert consumidos == len(trama)
+    assert decodificada == {'device_id': 'PICO1', 'seq': 65535, 'campos': campos, 'binaria': True}
+
+
+def test_valores_en_minimo_de_bytes():
+    # SOF, LEN, ID_LEN, ID, SEQ(2) y un TLV con valor de 1 byte + CRC
+    assert len(codificar_trama('P', 1, [('CONT', 127)])) == 2 + 1 + 1 + 2 + 3 + 2
+    assert len(codificar_trama('P', 1, [('CONT', 128)])) == 2 + 1 + 1 + 2 + 4 + 2
+
+
+def test_valor_fuera_de_rango():
+    with pytest.raises(ValueError):
+        codificar_trama('P', 1, [('CONT', 2 ** 31)])
+
+
+def test_trama_truncada_espera_mas_bytes():
+    trama = codificar_trama('PICO1', 3, [('CONT', 10), ('FIN', 1)])
+    for corte in range(len(trama)):
+        assert decodificar_trama(trama[:corte]) == (None, 0)
+
+
+def test_crc_invalido_descarta_un_byte():
+    trama = bytearray(codificar_trama('PICO1', 3, [('CONT', 10)]))
+    trama[-3] ^= 0xFF
+    assert decodificar_trama(bytes(trama)) == (None, 1)
+
+
+def test_basura_antes_del_sof():
+    assert decodificar_trama(b"x" + codificar_trama('P', 1, [('CONT', 1)])) == (None, 1)
+
+
+def test_largo_menor_al_minimo():
+    assert decodificar_trama(bytes([SOF, 2, 0, 0, 0, 0])) == (None, 1)
+
+
+def test_dos_tramas_seguidas():
+    primera = codificar_trama('A', 1, [('CONT', 1)])
+    segunda = codificar_trama('B', 2, [('RESET', 0)])
+    buffer = primera + segunda
+
+    trama, consumidos = decodificar_trama(buffer)
+    assert trama['device_id'] == 'A' and consumidos == len(primera)
+
+    trama, consumidos = decodificar_trama(buffer[consumidos:])
+    assert trama['device_id'] == 'B' and trama['campos'] == [('RESET', 0)]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Pruebas de secuencia_rs485 - Huecos, vuelta en 65535 y reinicio del Pico
+"""
+
+from secuencia_rs485 import SEQ_MAX, ControlSecuencia, siguiente_seq, distancia_seq
+
+
+def crear_control(**kwargs):
+    pedidos = []
+    control = ControlSecuencia(lambda device_id, desde, hasta: pedidos.append((device_id, desde, hasta)),
+                               **kwargs)
+    return control, pedidos
+
+
+def test_siguiente_y_distancia_saltan_el_cero():
+    assert siguiente_seq(1) == 2
+    assert siguiente_seq(SEQ_MAX) == 1
+    assert distancia_seq(SEQ_MAX, 1) == 1
+    assert distancia_seq(5, 5) == 0
+
+
+def test_en_orden_se_entrega_directo():
+    control, pedidos = crear_control()
+    assert control.recibir('P1', 1, ['a']) == ['a']
+    assert control.recibir('P1', 2, ['b']) == ['b']
+    assert pedidos == []
+
+
+def test_hueco_retiene_y_pide_reenvio():
+    control, pedidos = crear_control()
+    control.recibir('P1', 1, ['a'])
+
+    assert control.recibir('P1', 4, ['d']) == []
+    assert pedidos == [('P1', 2, 3)]
+
+    assert control.recibir('P1', 3, ['c']) == []
+    assert control.recibir('P1', 2, ['b']) == ['b', 'c', 'd']
+
+    estadisticas = control.obtener_estadisticas()['P1']
+    assert estadisticas['huecos'] == 1
+    assert estadisticas['recuperadas'] == 2
+    assert estadisticas['perdidas'] == 0
+
+
+def test_vuelta_en_65535_no_es_hueco():
+    control, pedidos = crear_control()
+    assert control.recibir('P1', SEQ_MAX - 1, ['a']) == ['a']
+    assert control.recibir('P1', SEQ_MAX, ['b']) == ['b']
+    assert control.recibir('P1', 1, ['c']) == ['c']
+    assert pedidos == []
+
+
+def test_hueco_a_traves_de_la_vuelta():
+    control, pedidos = crear_control()
+    control.recibir('P1', SEQ_MAX, ['a'])
+    assert control.recibir('P1', 2, ['c']) == []
+    assert pedidos == [('P1', 1, 1)]
+    assert control.recibir('P1', 1, ['b']) == ['b', 'c']
+
+
+def test_duplicado_se_descarta():
+    control, _ = crear_control()
+    control.recibir('P1', 1, ['a'])
+    control.recibir('P1', 2, ['b'])
+    assert control.recibir('P1', 2, ['b']) == []
+    assert control.obtener_estadisticas()['P1']['duplicadas'] == 1
+
+
+def test_reinicio_del_pico_en_seq_1():
+    control, pedidos = crear_control()
+    for seq in range(100, 103):
+        control.recibir('P1', seq, [str(seq)])
+
+    assert control.recibir('P1', 1, ['reinicio']) == ['reinicio']
+    assert control.recibir('P1', 2, ['siguiente']) == ['siguiente']
+    assert pedidos == []
+
+
+def test_tres_atrasadas_seguidas_reinician():
+    control, _ = crear_control()
+    control.recibir('P1', 500, ['a'])
+    assert control.recibir('P1', 10, ['x']) == []
+    assert control.recibir('P1', 11, ['y']) == []
+    assert control.recibir('P1', 12, ['z']) == ['z']
+
+
+def test_reiniciar_olvida_la_secuencia():
+    control, pedidos = crear_control()
+    control.recibir('P1', 1, ['a'])
+    control.recibir('P1', 5, ['e'])
+    control.reiniciar('P1')
+    assert control.recibir('P1', 40, ['nueva']) == ['nueva']
+
+
+def test_hueco_vencido_se_da_por_perdido():
+    control, pedidos = crear_control(timeout=0.0, max_intentos=2)
+    control.recibir('P1', 1, ['a'])
+    control.recibir('P1', 3, ['c'])
+
+    # Primer vencimiento: reintento; segundo: se salta el hueco
+    assert control.revisar() == []
+    assert pedidos == [('P1', 2, 2), ('P1', 2, 2)]
+    assert control.revisar() == ['c']
+    assert control.obtener_estadisticas()['P1']['perdidas'] == 1
+
+
+def test_reenvio_se_pide_fuera_del_lock():
+    libre = []
+    control = ControlSecuencia(lambda *pedido: libre.append(control.lock.acquire(blocking=False)))
+    control.recibir('P1', 1, ['a'])
+    control.recibir('P1', 3, ['c'])
+    assert libre == [True]
+    control.lock.release()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Pruebas de simulador_bus - Sondeo, hueco y reenvío entre el maestro y el bus simulado
+"""
+
+import time
+import threading
+
+import pytest
+
+from config import Config
+from simulador_bus import SimuladorBus
+from monitor_rs485 import MonitorRS485
+from maestro_rs485 import MaestroRS485
+
+
+def esperar(condicion, limite=5.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def bus_con_maestro():
+    config = Config()
+    config.config['rs485']['protocolo'] = 'binario'
+    config.config['rs485']['dispositivos'] = []
+
+    # Sin piezas ni heartbeats propios: la prueba decide qué se produce
+    with SimuladorBus(estaciones=1, piezas_minuto=0, heartbeat_intervalo=3600) as bus:
+        rs485 = MonitorRS485(config)
+        rs485.port = bus.puerto
+        rs485.timeout = 0.05
+        assert rs485.conectar()
+
+        recibidos = []
+        rs485.agregar_callback(recibidos.append)
+        threading.Thread(target=rs485.procesar_mensajes, daemon=True).start()
+
+        maestro = MaestroRS485(config, rs485)
+        estacion = bus.estaciones[0]
+        maestro.registrar_dispositivo(estacion.device_id)
+        try:
+            # Anuncio de arranque en texto y paso a binario
+            assert esperar(lambda: estacion.protocolo_binario)
+            maestro.iniciar()
+            assert maestro.sondear(estacion.device_id)
+            assert estacion.modo_polling
+            yield bus, rs485, maestro, estacion, recibidos
+        finally:
+            maestro.detener()
+            rs485.desconectar()
+
+
+def test_sondeo_entrega_lo_pendiente(bus_con_maestro):
+    bus, rs485, maestro, estacion, recibidos = bus_con_maestro
+
+    with bus.lock:
+        estacion.contador = 3
+        estacion.send_trama([('CONT', 3)])
+    assert maestro.sondear(estacion.device_id)
+
+    assert esperar(lambda: f"{estacion.device_id}:CONT:3" in recibidos)
+    assert rs485.protocolo_dispositivos[estacion.device_id] == 'binario'
+    assert maestro.obtener_estadisticas()[estacion.device_id]['respuestas'] >= 2
+
+
+def test_trama_perdida_se_recupera_con_reenvio(bus_con_maestro):
+    bus, rs485, maestro, estacion, recibidos = bus_con_maestro
+
+    with bus.lock:
+        estacion.send_trama([('CONT', 4)])
+    assert maestro.sondear(estacion.device_id)
+    assert esperar(lambda: f"{estacion.device_id}:CONT:4" in recibidos)
+
+    with bus.lock:
+        # CONT:5 sale al cable pero no llega: solo queda en el historial del Pico
+        estacion.transmitir_campos([('CONT', 5)])
+        estacion.send_trama([('CONT', 6)])
+    assert maestro.sondear(estacion.device_id)
+
+    # CONT:6 queda retenido hasta cerrar el hueco
+    assert esperar(lambda: rs485.secuencias.obtener_estadisticas()[estacion.device_id]['huecos'] == 1)
+    assert f"{estacion.device_id}:CONT:6" not in recibidos
+
+    # El REENVIAR viaja antes del próximo POLL y la respuesta trae la trama perdida
+    assert maestro.sondear(estacion.device_id)
+    assert esperar(lambda: f"{estacion.device_id}:CONT:6" in recibidos)
+
+    conteos = [m for m in recibidos if ':CONT:' in m]
+    assert conteos == [f"{estacion.device_id}:CONT:{n}" for n in (4, 5, 6)]
+    estadisticas = rs485.secuencias.obtener_estadisticas()[estacion.device_id]
+    assert estadisticas['recuperadas'] == 1
+    assert estadisticas['perdidas'] == 0
+    assert bus.obtener_estadisticas()['comandos'] >= 4
@@ -0,0 +1,68 @@
+import rp2
+from machine import Pin
+
+# --- Contador de pulsos por PIO (RP2040) ---
+# Cada carril es una máquina de estado que filtra y cuenta los flancos de
+# bajada del sensor sin intervención de la CPU; el firmware solo lee la cuenta.
+FRECUENCIA_SM = 1_000_000  # 1 ciclo = 1 us
+CICLOS_POR_VUELTA = 2  # Cada vuelta del filtro (jmp pin + jmp y--) dura 2 ciclos
+MAX_CARRILES = 8  # 2 PIO x 4 máquinas
+
+@rp2.asm_pio()
+def _contar_flancos():
+    pull(block)                 # Vueltas de filtro enviadas por el firmware (quedan en OSR)
+    mov(x, invert(null))        # X cuenta hacia atrás desde 0xFFFFFFFF
+    wrap_target()
+    label("alto")
+    wait(1, pin, 0)
+    mov(y, osr)
+    label("alto_estable")       # El nivel alto debe sostenerse todo el filtro
+    jmp(pin, "sigue_alto")
+    jmp("alto")
+    label("sigue_alto")
+    jmp(y_dec, "alto_estable")
+    label("bajo")
+    wait(0, pin, 0)
+    mov(y, osr)
+    label("bajo_estable")       # Y el bajo también: un rebote vuelve a esperar
+    jmp(pin, "bajo")
+    jmp(y_dec, "bajo_estable")
+    jmp(x_dec, "alto")          # Pieza contada
+    wrap()
+
+class ContadorPIO:
+    def __init__(self, pines, filtro_us=1000, primera_sm=0):
+        if not 0 < len(pines) <= MAX_CARRILES - primera_sm:
+            raise ValueError("carriles PIO")
+        vueltas = max(filtro_us // CICLOS_POR_VUELTA, 1)
+        self.maquinas = []
+        for i, numero in enumerate(pines):
+            pin = Pin(numero, Pin.IN, Pin.PULL_UP)
+            sm = rp2.StateMachine(primera_sm + i, _contar_flancos, freq=FRECUENCIA_SM,
+                                  in_base=pin, jmp_pin=pin)
+            sm.put(vueltas)
+            sm.active(1)
+            self.maquinas.append(sm)
+        self._ultimas = self.leer()
+
+    def leer(self):
+        """Cuenta acumulada de cada carril"""
+        cuentas = []
+        for sm in self.maquinas:
+            # Copiar X al FIFO sin detener la máquina
+            sm.exec("mov(isr, x)")
+            sm.exec("push()")
+            cuentas.append(0xFFFFFFFF - sm.get())
+        return cuentas
+
+    def piezas_nuevas(self):
+        """Piezas de todos los carriles desde la lectura anterior"""
+        piezas = 0
+        for i, cuenta in enumerate(self.leer()):
+            piezas += (cuenta - self._ultimas[i]) & 0xFFFFFFFF
+            self._ultimas[i] = cuenta
+        return piezas
+
+    def detener(self):
+        for sm in self.maquinas:
+            sm.active(0)
@@ -0,0 +1,78 @@
+import struct
+
+# --- Diario de conteo en flash ---
+# Registros de tamaño fijo (log_contador, contador, total) que se agregan al
+# final de archivos rotativos en vez de reescribir /config.json. Al arrancar
+# gana el registro válido con la secuencia más alta; uno incompleto o dañado
+# no pasa el CRC y se ignora.
+FORMATO = "<HIiii"  # Magia, secuencia, log_contador, contador, total
+MAGIA = 0x5A17
+TAM_DATOS = struct.calcsize(FORMATO)
+TAM_REGISTRO = TAM_DATOS + 2  # + CRC16
+
+def _crc16(datos):
+    """CRC16 Modbus (polinomio 0xA001)"""
+    crc = 0xFFFF
+    for byte in datos:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+class DiarioConteo:
+    def __init__(self, prefijo="/diario", archivos=4, registros_por_archivo=200):
+        self.prefijo = prefijo
+        self.archivos = archivos
+        self.registros_por_archivo = registros_por_archivo
+        self.secuencia = 0
+        self.actual = archivos - 1  # La primera rotación abre el archivo 0
+        self.escritos = 0
+        self.archivo = None
+
+    def _ruta(self, indice):
+        return "%s%d.bin" % (self.prefijo, indice)
+
+    def recuperar(self):
+        """Último registro válido (log_contador, contador, total) o None si no hay"""
+        ultimo = None
+        for indice in range(self.archivos):
+            try:
+                f = open(self._ruta(indice), "rb")
+            except OSError:
+                continue
+            with f:
+                while True:
+                    registro = f.read(TAM_REGISTRO)
+                    if len(registro) < TAM_REGISTRO:
+                        break
+                    datos = registro[:TAM_DATOS]
+                    if struct.unpack("<H", registro[TAM_DATOS:])[0] != _crc16(datos):
+                        continue
+                    magia, secuencia, log_contador, contador, total = struct.unpack(FORMATO, datos)
+                    if magia == MAGIA and secuencia > self.secuencia:
+                        self.secuencia = secuencia
+                        self.actual = indice
+                        ultimo = (log_contador, contador, total)
+        # Se sigue en el archivo siguiente: el del último registro queda intacto
+        return ultimo
+
+    def _rotar(self):
+        """Pasa al siguiente archivo, descartando el más viejo"""
+        if self.archivo:
+            self.archivo.close()
+        self.actual = (self.actual + 1) % self.archivos
+        self.archivo = open(self._ruta(self.actual), "wb")
+        self.escritos = 0
+
+    def guardar(self, log_contador, contador, total):
+        """Agrega un registro y lo asienta en flash"""
+        if self.archivo is None or self.escritos >= self.registros_por_archivo:
+            self._rotar()
+        self.secuencia += 1
+        datos = struct.pack(FORMATO, MAGIA, self.secuencia, log_contador, contador, total)
+        self.archivo.write(datos + struct.pack("<H", _crc16(datos)))
+        self.archivo.flush()
+        self.escritos += 1
@@ -1,7 +1,12 @@
 from machine import Pin, I2C, UART
+from array import array
+import micropython
+import uasyncio as asyncio
 import time
 import json
 from lcd16x2 import LCD1602
+from pantalla_lcd import PantallaLCD
+from diario_conteo import DiarioConteo
 
 # --- CONFIGURACIÓN RS485 ---
 BAUDRATE = 9600
@@ -9,9 +14,20 @@ uart = UART(1, baudrate=BAUDRATE, tx=Pin(20), rx=Pin(21))
 dere = Pin(22, Pin.OUT)
 dere.value(0)  # Iniciar en RX
 
+# --- Protocolo binario (SOF LEN | ID_LEN ID SEQ TLV... | CRC16) ---
+SOF = 0xA5
+VERSION_BINARIA = 1
+TAGS_BIN = {
+    "CONT": 1, "TOTAL": 2, "META": 3, "ESTADO": 4, "LOG": 5,
+    "HEARTBEAT": 6, "INACTIVO": 7, "RESET": 8, "PROTO": 9, "FIN": 10,
+    "BAUD": 11, "ECO": 12, "BAUDOK": 13
+}
+
 # --- LCD ---
-i2c = I2C(0, sda=Pin(4), scl=Pin(5), freq=100000)
+i2c = I2C(0, sda=Pin(4), scl=Pin(5), freq=400000)
 lcd = LCD1602(i2c, addr=0x27)
+pantalla = PantallaLCD(lcd)  # Todo se dibuja aquí; tarea_lcd envía solo los cambios
+REFRESCO_LCD_MS = 50
 
 # --- LEDs Semáforo ---
 led_rojo = Pin(17, Pin.OUT)
@@ -23,6 +39,7 @@ buzzer = Pin(16, Pin.OUT)
 
 # --- Sensor de paso ---
 sensor = Pin(15, Pin.IN, Pin.PULL_UP)
+micropython.alloc_emergency_exception_buf(100)
 
 # --- Teclado 4x4 ---
 class Teclado4x4:
@@ -44,21 +61,21 @@ class Teclado4x4:
         for f in self.filas:
             f.value(1)
 
-    def leer_tecla(self):
+    async def leer_tecla(self):
         """Lee una tecla presionada y retorna el carácter"""
         for i, fila in enumerate(self.filas):
             fila.value(0)  # Activar fila
-            time.sleep_ms(10)
+            await asyncio.sleep_ms(10)
 
             # Leer columnas
             for j, col in enumerate(self.cols):
                 if col.value() == 0:  # Tecla presionada
                     fila.value(1)  # Desactivar fila
-                    time.sleep_ms(200)  # Debounce
+                    await asyncio.sleep_ms(200)  # Debounce
                     return self.teclado[i][j]
 
             fila.value(1)  # Desactivar fila
-            time.sleep_ms(10)
+            await asyncio.sleep_ms(10)
 
         return None
 
@@ -70,6 +87,9 @@ meta = 0
 tara = 0
 step_size = 1
 debounce_ms = 100
+sensores = [15]  # Pines de los carriles contados por PIO (el primero es el sensor de paso)
+filtro_us = 1000  # Tiempo que debe sostenerse cada nivel para contar el flanco (PIO)
+contador_pio = None  # ContadorPIO activo; None = IRQ por software
 buzzer_on = True
 brillo = 100
 pin_supervisor = "1234"
@@ -80,6 +100,52 @@ _last_ms = 0
 _estado_anterior = None
 log_contador = 0  # Contador total que no se reinicia
 
+# --- Variables de Protocolo ---
+protocolo_binario = False  # Se activa cuando el maestro lo negocia (PROTO)
+seq_trama = 0  # Secuencia de tramas con CONT/RESET (1..65535, 0 = sin secuencia)
+SECUENCIADOS = ("CONT", "RESET")
+VENTANA_REENVIO = 32
+historial = [None] * VENTANA_REENVIO  # Ultimas tramas numeradas para REENVIAR
+reenvios = []  # Reenvios pedidos en modo sondeo, salen con la proxima respuesta
+baud_anterior = 0  # Velocidad a la que se vuelve si la prueba de BAUD no se confirma
+baud_limite = 0  # ticks_ms hasta el que se espera ECO/BAUDOK
+baud_aceptado = False  # BAUDOK recibido: se guarda al oír tráfico a la nueva velocidad
+BAUD_TIMEOUT_MS = 2000
+_rx_buffer = bytearray()
+cola_tx = []  # Tramas (bytes) o cambios de velocidad (int) en orden de salida
+hay_tx = asyncio.Event()
+modo_polling = False  # Con maestro en el bus solo se transmite al ser sondeado
+pendientes = {}  # Ultimo valor por TAG a enviar en el proximo sondeo
+cerrados = []  # Campos de un conteo ya reiniciado, se envian antes que los pendientes
+
+# --- Anillo de eventos del sensor ---
+# La IRQ solo anota el ticks_ms de cada flanco; la tarea del sensor los descarga.
+# Memoria fija para que la IRQ no asigne nada (256 flancos = más de 1 s a 200 piezas/s)
+TAM_ANILLO = 256  # Potencia de 2
+MASCARA_ANILLO = TAM_ANILLO - 1
+_anillo = array('I', [0] * TAM_ANILLO)
+_cabeza = 0  # Lo escribe solo la IRQ
+_cola = 0  # Lo escribe solo la tarea del sensor
+
+# --- Salidas diferidas (sin sleep por pieza) ---
+INTERVALO_TELEMETRIA_MS = 200  # Un estado por lote de piezas como máximo cada 200 ms
+SENAL_PIEZA_MS = 100
+_estado_pendiente = False
+_ultimo_envio = 0
+_lcd_pendiente = False
+_senal_activa = False
+_fin_senal = 0
+pantalla_ocupada = False  # El teclado está usando el LCD (menú, PIN, estado rápido)
+
+# --- Diario de conteo ---
+# Cada registro es una escritura en flash que en littlefs puede costar el borrado
+# de un bloque y detiene el bucle: las piezas se asientan por tandas. Un corte de
+# energía pierde a lo sumo la última tanda (el Pi ya las contó por RS485)
+DIARIO_MAX_PIEZAS = 100
+DIARIO_MAX_MS = 5000
+_piezas_sin_diario = 0
+_ultimo_diario = 0
+
 # --- Variables de Heartbeat ---
 heartbeat_interval = 30  # Enviar heartbeat cada 30 segundos
 last_heartbeat = 0  # Timestamp del último heartbeat
@@ -88,32 +154,28 @@ last_activity = 0  # Timestamp de la última actividad
 
 # --- Instancias ---
 teclado = Teclado4x4()
+diario = DiarioConteo()
 
 # --- Funciones de Utilidad ---
 def actualizar_lcd(msg1, msg2):
-    lcd.clear()
-    lcd.set_cursor(0, 0)
-    lcd.print(msg1)
-    lcd.set_cursor(0, 1)
-    lcd.print(msg2)
+    pantalla.linea(0, msg1)
+    pantalla.linea(1, msg2)
 
-def mostrar_texto_deslizante(texto, fila=0, delay=200):
+async def mostrar_texto_deslizante(texto, fila=0, delay=200):
     """Muestra texto deslizante en el LCD"""
     if len(texto) <= 16:
-        lcd.set_cursor(0, fila)
-        lcd.print(texto)
+        pantalla.escribir(fila, 0, texto)
         return
 
     # Texto con espacios para crear efecto de deslizamiento
     texto_completo = " " * 16 + texto + " " * 16
 
     for i in range(len(texto_completo) - 15):
-        lcd.set_cursor(0, fila)
-        lcd.print(texto_completo[i:i+16])
-        time.sleep_ms(delay)
+        pantalla.escribir(fila, 0, texto_completo[i:i+16])
+        await asyncio.sleep_ms(delay)
 
         # Verificar si se presionó una tecla para salir
-        tecla = teclado.leer_tecla()
+        tecla = await teclado.leer_tecla()
         if tecla:
             return tecla
 
@@ -124,75 +186,320 @@ def actualizar_semaforo(rojo, amarillo, verde):
     led_amarillo.value(amarillo)
     led_verde.value(verde)
 
-def bip_largo():
+async def bip_largo():
     """Un bip largo o parpadeo LED verde si buzzer apagado"""
     if buzzer_on:
         buzzer.value(1)
-        time.sleep_ms(500)
+        await asyncio.sleep_ms(500)
         buzzer.value(0)
     else:
         # Parpadeo LED verde como alerta visual
         led_verde.value(0)  # Apagar
-        time.sleep_ms(100)
+        await asyncio.sleep_ms(100)
         led_verde.value(1)  # Encender
-        time.sleep_ms(500)
+        await asyncio.sleep_ms(500)
         led_verde.value(0)  # Apagar
 
-def bip_corto():
+async def bip_corto():
     """Un bip corto o parpadeo LED verde si buzzer apagado"""
     if buzzer_on:
         buzzer.value(1)
-        time.sleep_ms(100)
+        await asyncio.sleep_ms(100)
         buzzer.value(0)
     else:
         # Parpadeo LED verde como alerta visual
         led_verde.value(0)  # Apagar
-        time.sleep_ms(50)
+        await asyncio.sleep_ms(50)
         led_verde.value(1)  # Encender
-        time.sleep_ms(100)
+        await asyncio.sleep_ms(100)
         led_verde.value(0)  # Apagar
 
-def dos_bips_cortos():
+async def dos_bips_cortos():
     """Dos bips cortos o parpadeos LED verde si buzzer apagado"""
     if buzzer_on:
         for _ in range(2):
-            bip_corto()
-            time.sleep_ms(50)
+            await bip_corto()
+            await asyncio.sleep_ms(50)
     else:
         # Parpadeos LED verde como alerta visual
         for _ in range(2):
             led_verde.value(0)  # Apagar
-            time.sleep_ms(50)
+            await asyncio.sleep_ms(50)
             led_verde.value(1)  # Encender
-            time.sleep_ms(100)
+            await asyncio.sleep_ms(100)
             led_verde.value(0)  # Apagar
-            time.sleep_ms(50)
+            await asyncio.sleep_ms(50)
 
-def dos_bips_largos():
+async def dos_bips_largos():
     """Dos bips largos o parpadeos LED verde si buzzer apagado"""
     if buzzer_on:
         for _ in range(2):
-            bip_largo()
-            time.sleep_ms(100)
+            await bip_largo()
+            await asyncio.sleep_ms(100)
     else:
         # Parpadeos LED verde como alerta visual
         for _ in range(2):
             led_verde.value(0)  # Apagar
-            time.sleep_ms(100)
+            await asyncio.sleep_ms(100)
             led_verde.value(1)  # Encender
-            time.sleep_ms(500)
+            await asyncio.sleep_ms(500)
             led_verde.value(0)  # Apagar
-            time.sleep_ms(100)
+            await asyncio.sleep_ms(100)
 
-def send_rs485(tag: str, value: int):
-    """Función para enviar datos al bus RS485"""
-    message = f"{device_id}:{tag}:{value}\n"
-    data_to_send = message.encode('utf-8')
+def transmitir(data):
+    """Encola bytes para la tarea de TX"""
+    cola_tx.append(data)
+    hay_tx.set()
+
+def programar_baudrate(nuevo):
+    """Cambia la velocidad después de lo ya encolado (p. ej. la confirmación)"""
+    cola_tx.append(nuevo)
+    hay_tx.set()
+
+def enviar_bus(data):
+    """Transmite bytes manteniendo DE solo el tiempo de transmision"""
     dere.value(1)
-    uart.write(data_to_send)
-    time.sleep_ms(50)
+    uart.write(data)
+    # 10 bits por byte (start + 8 datos + stop) mas margen de vaciado
+    time.sleep_us(len(data) * 10000000 // BAUDRATE + 200)
     dere.value(0)
 
+def send_rs485(tag: str, value: int, seq: int = 0):
+    """Función para enviar datos al bus RS485"""
+    if seq:
+        message = f"{device_id}:{tag}:{value}:{seq}\n"
+    else:
+        message = f"{device_id}:{tag}:{value}\n"
+    transmitir(message.encode('utf-8'))
+
+def crc16(data):
+    """CRC16 Modbus (polinomio 0xA001)"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+def codificar_valor(valor):
+    """Entero con signo big endian en 1 a 4 bytes"""
+    for largo in (1, 2, 3, 4):
+        limite = 1 << (8 * largo - 1)
+        if -limite <= valor < limite:
+            valor &= (1 << (8 * largo)) - 1
+            return bytes([(valor >> (8 * (largo - 1 - i))) & 0xFF for i in range(largo)])
+    return b"\x7f\xff\xff\xff"
+
+def codificar_trama(campos, seq):
+    """Arma una trama binaria con varios pares TAG/VALOR"""
+    id_bytes = device_id.encode()
+    contenido = bytearray([len(id_bytes)])
+    contenido += id_bytes
+    contenido += bytes([(seq >> 8) & 0xFF, seq & 0xFF])
+    for tag, valor in campos:
+        valor_bytes = codificar_valor(int(valor))
+        contenido += bytes([TAGS_BIN[tag], len(valor_bytes)])
+        contenido += valor_bytes
+    cuerpo = bytes([len(contenido)]) + contenido
+    crc = crc16(cuerpo)
+    return bytes([SOF]) + cuerpo + bytes([crc & 0xFF, crc >> 8])
+
+def send_trama(campos):
+    """Envía varios TAG/VALOR en una sola trama (o línea por línea en modo texto)"""
+    if modo_polling:
+        # Los valores son instantaneas: basta el ultimo de cada TAG
+        for tag, valor in campos:
+            if tag == "RESET":
+                # Lo pendiente pertenece al conteo anterior: debe llegar antes del RESET
+                cerrados.extend(pendientes.items())
+                pendientes.clear()
+                cerrados.append((tag, valor))
+            else:
+                pendientes[tag] = valor
+        return
+    transmitir_campos(campos)
+
+def registrar_secuencia(campos):
+    """Asigna la siguiente secuencia y guarda los campos para un posible reenvío"""
+    global seq_trama
+    seq_trama = seq_trama % 65535 + 1
+    historial[seq_trama % VENTANA_REENVIO] = (seq_trama, [c for c in campos if c[0] != "FIN"])
+    return seq_trama
+
+def transmitir_campos(campos, seq=None):
+    """Transmite los campos de inmediato en el protocolo acordado"""
+    if protocolo_binario:
+        if seq is None:
+            seq = 0
+            for tag, _ in campos:
+                if tag in SECUENCIADOS:
+                    seq = registrar_secuencia(campos)
+                    break
+        transmitir(codificar_trama(campos, seq))
+    else:
+        # En texto cada línea CONT/RESET lleva su propia secuencia
+        for tag, valor in campos:
+            if tag in SECUENCIADOS:
+                send_rs485(tag, valor, seq or registrar_secuencia([(tag, valor)]))
+            else:
+                send_rs485(tag, valor)
+
+def reenviar(desde, hasta):
+    """Reenvía las tramas numeradas que aún están en el historial"""
+    cantidad = (hasta - desde) % 65535 + 1
+    if cantidad > VENTANA_REENVIO:
+        desde = (hasta - VENTANA_REENVIO) % 65535 + 1
+        cantidad = VENTANA_REENVIO
+    seq = desde
+    for _ in range(cantidad):
+        entrada = historial[seq % VENTANA_REENVIO]
+        if entrada and entrada[0] == seq:
+            if modo_polling:
+                reenvios.append(entrada)
+            else:
+                transmitir_campos(entrada[1], seq)
+        seq = seq % 65535 + 1
+
+def enviar_estado():
+    """Envía el estado de conteo completo en una trama"""
+    send_trama([
+        ("CONT", contador),
+        ("TOTAL", total),
+        ("META", meta),
+        ("ESTADO", 1 if activo else 0),
+        ("LOG", log_contador)
+    ])
+
+def responder_sondeo():
+    """Envía lo pendiente y la marca de fin en una sola respuesta al maestro"""
+    for seq, campos in reenvios:
+        transmitir_campos(campos, seq)
+    reenvios.clear()
+
+    campos = cerrados + list(pendientes.items())
+    cerrados.clear()
+    pendientes.clear()
+    campos.append(("FIN", len(campos)))
+    transmitir_campos(campos)
+
+def cambiar_baudrate(nuevo):
+    """Reconfigura la UART del bus a otra velocidad"""
+    global BAUDRATE, _rx_buffer
+    BAUDRATE = nuevo
+    uart.init(baudrate=nuevo, tx=Pin(20), rx=Pin(21))
+    _rx_buffer = bytearray()
+
+def revisar_baudrate():
+    """Vuelve a la velocidad anterior si el maestro no confirmó la prueba"""
+    global baud_anterior, baud_aceptado
+    if baud_anterior and time.ticks_diff(time.ticks_ms(), baud_limite) > 0:
+        programar_baudrate(baud_anterior)
+        baud_anterior = 0
+        baud_aceptado = False
+
+def confirmar_baudrate():
+    """El maestro siguió a la nueva velocidad: queda guardada"""
+    global baud_anterior, baud_aceptado
+    baud_anterior = 0
+    baud_aceptado = False
+    guardar_config()
+
+def procesar_comando(linea):
+    """Procesa un comando ID:CMD:VAL recibido del maestro"""
+    global protocolo_binario, modo_polling, baud_anterior, baud_limite, baud_aceptado
+    partes = linea.split(":")
+    if len(partes) != 3:
+        return
+    destino, comando, valor = partes
+    if destino != device_id and destino != "*":
+        return
+
+    # Tras BAUDOK, cualquier comando fuera de la prueba (BAUDFIN, POLL...) prueba
+    # que el maestro quedó a la nueva velocidad; si no llega, se vuelve sin guardar
+    if baud_aceptado and comando not in ("BAUD", "ECO", "BAUDOK"):
+        confirmar_baudrate()
+
+    if comando == "POLL":
+        modo_polling = True
+        responder_sondeo()
+
+    elif comando == "MAESTRO":
+        modo_polling = valor == "1"
+
+    elif comando == "BAUD":
+        try:
+            nuevo = int(valor)
+        except:
+            return
+        # Confirmar a la velocidad actual y pasar a la propuesta a prueba
+        transmitir_campos([("BAUD", nuevo)])
+        if not baud_anterior:
+            baud_anterior = BAUDRATE
+        baud_aceptado = False
+        programar_baudrate(nuevo)
+        baud_limite = time.ticks_add(time.ticks_ms(), BAUD_TIMEOUT_MS)
+
+    elif comando == "ECO":
+        try:
+            transmitir_campos([("ECO", int(valor))])
+        except:
+            return
+        if baud_anterior:
+            baud_limite = time.ticks_add(time.ticks_ms(), BAUD_TIMEOUT_MS)
+
+    elif comando == "BAUDOK":
+        if baud_anterior and valor == str(BAUDRATE):
+            # Todavía sin guardar: el maestro puede volver atrás si otra estación falla
+            baud_aceptado = True
+            baud_limite = time.ticks_add(time.ticks_ms(), BAUD_TIMEOUT_MS)
+            if destino == device_id:
+                transmitir_campos([("BAUDOK", BAUDRATE)])
+
+    elif comando == "REENVIAR":
+        try:
+            desde, hasta = valor.split("-")
+            reenviar(int(desde), int(hasta))
+        except:
+            return
+
+    elif comando == "PROTO":
+        try:
+            version = int(valor)
+        except:
+            return
+        protocolo_binario = version >= VERSION_BINARIA
+        # Confirmar en el protocolo acordado (un broadcast no se confirma:
+        # todas las estaciones responderían a la vez)
+        if destino == device_id:
+            send_trama([("PROTO", VERSION_BINARIA if protocolo_binario else 0)])
+
+def procesar_comandos():
+    """Lee comandos pendientes del bus RS485 sin bloquear"""
+    global _rx_buffer
+    if not uart.any():
+        return
+    datos = uart.read()
+    if not datos:
+        return
+    _rx_buffer += datos
+    while True:
+        fin = _rx_buffer.find(b"\n")
+        if fin < 0:
+            break
+        crudo = bytes(_rx_buffer[:fin])
+        _rx_buffer = _rx_buffer[fin + 1:]
+        try:
+            linea = crudo.decode().strip()
+        except UnicodeError:
+            continue  # Ruido o bytes a otra velocidad (negociación): se descarta la línea
+        if linea:
+            procesar_comando(linea)
+    if len(_rx_buffer) > 128:
+        _rx_buffer = bytearray()
+
 def enviar_heartbeat():
     """Envía heartbeat con estado completo del sistema"""
     global last_heartbeat, tiempo_inactivo, last_activity
@@ -206,21 +513,18 @@ def enviar_heartbeat():
         tiempo_inactivo = 0
 
     # Enviar estado completo
-    send_rs485("HEARTBEAT", int(ahora))  # Timestamp del heartbeat
-    send_rs485("CONT", contador)
-    send_rs485("TOTAL", total)
-    send_rs485("META", meta)
-    send_rs485("ESTADO", 1 if activo else 0)
-    send_rs485("LOG", log_contador)
-    send_rs485("INACTIVO", tiempo_inactivo)  # Tiempo sin actividad en segundos
+    send_trama([
+        ("HEARTBEAT", int(ahora)),  # Timestamp del heartbeat
+        ("CONT", contador),
+        ("TOTAL", total),
+        ("META", meta),
+        ("ESTADO", 1 if activo else 0),
+        ("LOG", log_contador),
+        ("INACTIVO", tiempo_inactivo)  # Tiempo sin actividad en segundos
+    ])
 
     last_heartbeat = ahora
 
-    # Mostrar en LCD si está en modo debug (opcional)
-    if modo_menu:
-        actualizar_lcd("HEARTBEAT", f"T:{tiempo_inactivo}s")
-        time.sleep_ms(500)
-
 def actualizar_actividad():
     """Actualiza el timestamp de última actividad"""
     global last_activity
@@ -233,12 +537,14 @@ def guardar_config():
         "tara": tara,
         "step_size": step_size,
         "debounce_ms": debounce_ms,
+        "sensores": sensores,
+        "filtro_us": filtro_us,
         "buzzer_on": buzzer_on,
         "brillo": brillo,
         "pin_supervisor": pin_supervisor,
         "device_id": device_id,
-        "log_contador": log_contador,
-        "heartbeat_interval": heartbeat_interval
+        "heartbeat_interval": heartbeat_interval,
+        "baudrate": baud_anterior or BAUDRATE  # Nunca guardar una velocidad a prueba
     }
     try:
         with open("/config.json", "w") as f:
@@ -246,9 +552,37 @@ def guardar_config():
     except:
         pass
 
+def guardar_conteo():
+    """Agrega el conteo actual al diario en flash (RESET, UNDO, STOP, nueva meta)"""
+    global _piezas_sin_diario, _ultimo_diario
+    _piezas_sin_diario = 0
+    _ultimo_diario = time.ticks_ms()
+    try:
+        diario.guardar(log_contador, contador, total)
+    except:
+        pass
+
+def revisar_diario(piezas=0):
+    """Asienta las piezas en el diario cada DIARIO_MAX_PIEZAS o DIARIO_MAX_MS"""
+    global _piezas_sin_diario
+    _piezas_sin_diario += piezas
+    if _piezas_sin_diario and (_piezas_sin_diario >= DIARIO_MAX_PIEZAS or
+                               time.ticks_diff(time.ticks_ms(), _ultimo_diario) >= DIARIO_MAX_MS):
+        guardar_conteo()
+
+def cargar_conteo():
+    """Recupera el último conteo del diario"""
+    global log_contador, contador, total
+    try:
+        ultimo = diario.recuperar()
+    except:
+        return
+    if ultimo:
+        log_contador, contador, total = ultimo
+
 def cargar_config():
     """Carga la configuración desde flash"""
-    global meta, tara, step_size, debounce_ms, buzzer_on, brillo, pin_supervisor, device_id, log_contador, heartbeat_interval
+    global meta, tara, step_size, debounce_ms, sensores, filtro_us, buzzer_on, brillo, pin_supervisor, device_id, log_contador, heartbeat_interval
     try:
         with open("/config.json", "r") as f:
             config = json.load(f)
@@ -256,98 +590,103 @@ def cargar_config():
             tara = config.get("tara", 0)
             step_size = config.get("step_size", 1)
             debounce_ms = config.get("debounce_ms", 100)
+            sensores = config.get("sensores", [15])
+            filtro_us = config.get("filtro_us", 1000)
             buzzer_on = config.get("buzzer_on", True)
             brillo = config.get("brillo", 100)
             pin_supervisor = config.get("pin_supervisor", "1234")
             device_id = config.get("device_id", "PIC")
-            log_contador = config.get("log_contador", 0)
+            log_contador = config.get("log_contador", 0)  # Solo archivos anteriores al diario
             heartbeat_interval = config.get("heartbeat_interval", 30)
+            baudrate = config.get("baudrate", BAUDRATE)
+            if baudrate != BAUDRATE:
+                cambiar_baudrate(baudrate)
     except:
         pass
 
 # --- Funciones del Sistema ---
-def modo_espera():
+async def modo_espera():
     """Modo Espera - Armado de Sistema"""
     actualizar_semaforo(0, 0, 1)  # Verde
-    time.sleep_ms(200)
+    await asyncio.sleep_ms(200)
     actualizar_semaforo(0, 1, 0)  # Amarillo
-    time.sleep_ms(200)
+    await asyncio.sleep_ms(200)
     actualizar_semaforo(1, 0, 0)  # Rojo
-    time.sleep_ms(200)
+    await asyncio.sleep_ms(200)
     actualizar_semaforo(0, 1, 0)  # Amarillo Fijo
-    bip_largo()
+    await bip_largo()
 
-def iniciar_conteo():
+async def iniciar_conteo():
     """Control de Conteo - Inicio de Lectura"""
     actualizar_semaforo(0, 1, 0)  # Amarillo - Modo lectura
     if buzzer_on:
-        dos_bips_cortos()
+        await dos_bips_cortos()
     else:
         # Parpadeos LED verde como alerta visual
         for _ in range(2):
             led_verde.value(0)  # Apagar
-            time.sleep_ms(50)
+            await asyncio.sleep_ms(50)
             led_verde.value(1)  # Encender
-            time.sleep_ms(100)
+            await asyncio.sleep_ms(100)
             led_verde.value(0)  # Apagar
-            time.sleep_ms(50)
+            await asyncio.sleep_ms(50)
 
-def pausar_conteo():
+async def pausar_conteo():
     """Control Temporal - Pausa de Lectura"""
     for _ in range(10):
         actualizar_semaforo(0, 1, 0)
-        time.sleep_ms(100)
+        await asyncio.sleep_ms(100)
         actualizar_semaforo(0, 0, 0)
-        time.sleep_ms(100)
-    bip_corto()
+        await asyncio.sleep_ms(100)
+    await bip_corto()
 
-def mostrar_total():
+async def mostrar_total():
     """Consulta de Dato - Mostrar Conteo Total"""
     actualizar_semaforo(1, 0, 0)  # Rojo Fijo
-    bip_corto()
+    await bip_corto()
 
-def reiniciar_conteo():
+async def reiniciar_conteo():
     """Borrar Conteo - Reiniciar a Cero"""
     actualizar_semaforo(1, 0, 0)  # Rojo Fijo
-    time.sleep_ms(1000)
+    await asyncio.sleep_ms(1000)
     actualizar_semaforo(0, 0, 1)  # Verde Fijo
-    time.sleep_ms(1000)
-    dos_bips_largos()
+    await asyncio.sleep_ms(1000)
+    await dos_bips_largos()
 
-def mostrar_estado_rapido():
+async def mostrar_estado_rapido():
     """Muestra estado rápido del sistema con efecto deslizante"""
     estado = "ACTIVO" if activo else "PAUSA" if contador > 0 else "DETENIDO"
     porcentaje = int((contador / meta * 100)) if meta > 0 else 0
 
     # Mostrar información con efecto deslizante
-    lcd.clear()
-    mostrar_texto_deslizante(f"ESTADO: {estado}", 0, 150)
-    time.sleep_ms(300)
+    pantalla.limpiar()
+    await mostrar_texto_deslizante(f"ESTADO: {estado}", 0, 150)
+    await asyncio.sleep_ms(300)
 
     if meta > 0:
-        mostrar_texto_deslizante(f"CONT: {contador}/{meta}", 0, 150)
-        time.sleep_ms(300)
-        mostrar_texto_deslizante(f"TOTAL: {total} - {porcentaje}%", 0, 150)
-        time.sleep_ms(300)
+        await mostrar_texto_deslizante(f"CONT: {contador}/{meta}", 0, 150)
+        await asyncio.sleep_ms(300)
+        await mostrar_texto_deslizante(f"TOTAL: {total} - {porcentaje}%", 0, 150)
+        await asyncio.sleep_ms(300)
         # Mostrar resumen final con meta
         actualizar_lcd(f"{estado} {contador}/{meta}", f"TOTAL:{total} {porcentaje}%")
     else:
-        mostrar_texto_deslizante(f"CONT: {contador} (Libre)", 0, 150)
-        time.sleep_ms(300)
-        mostrar_texto_deslizante(f"TOTAL: {total}", 0, 150)
-        time.sleep_ms(300)
+        await mostrar_texto_deslizante(f"CONT: {contador} (Libre)", 0, 150)
+        await asyncio.sleep_ms(300)
+        await mostrar_texto_deslizante(f"TOTAL: {total}", 0, 150)
+        await asyncio.sleep_ms(300)
         # Mostrar resumen final sin meta
         actualizar_lcd(f"{estado} {contador} (Libre)", f"TOTAL:{total}")
 
 # --- Funciones del Teclado ---
-def entrada_numerica(titulo, valor_actual=0):
+async def entrada_numerica(titulo, valor_actual=0):
     """Función para entrada numérica con el teclado"""
     global entrada_numero
     entrada_numero = str(valor_actual)
     actualizar_lcd(titulo, entrada_numero)
 
     while True:
-        tecla = teclado.leer_tecla()
+        tecla = await teclado.leer_tecla()
         if tecla:
             if tecla.isdigit():
                 entrada_numero += tecla
@@ -363,16 +702,16 @@ def entrada_numerica(titulo, valor_actual=0):
                 if entrada_numero:
                     entrada_numero = entrada_numero[:-1]
                     actualizar_lcd(titulo, entrada_numero)
-        time.sleep_ms(50)
+        await asyncio.sleep_ms(50)
 
-def entrada_texto(titulo, valor_actual=""):
+async def entrada_texto(titulo, valor_actual=""):
     """Función para entrada de texto con el teclado"""
     global entrada_numero
     entrada_numero = str(valor_actual)
     actualizar_lcd(titulo, entrada_numero)
 
     while True:
-        tecla = teclado.leer_tecla()
+        tecla = await teclado.leer_tecla()
         if tecla:
             if tecla.isdigit() or tecla.isalpha():
                 if len(entrada_numero) < 8:  # Máximo 8 caracteres
@@ -381,7 +720,7 @@ def entrada_texto(titulo, valor_actual=""):
                 else:
                     # Mostrar mensaje de límite alcanzado
                     actualizar_lcd("MAX 8 CHARS", entrada_numero)
-                    time.sleep_ms(1000)
+                    await asyncio.sleep_ms(1000)
                     actualizar_lcd(titulo, entrada_numero)
             elif tecla == '*':  # BORRAR CARACTER (solo si hay más de 3 caracteres)
                 if len(entrada_numero) > 3:
@@ -389,16 +728,16 @@ def entrada_texto(titulo, valor_actual=""):
                     actualizar_lcd(titulo, entrada_numero)
             elif tecla == '#':  # GUARDAR
                 return entrada_numero if entrada_numero else None
-        time.sleep_ms(50)
+        await asyncio.sleep_ms(50)
 
-def verificar_pin():
+async def verificar_pin():
     """Función para verificar PIN de 4 dígitos"""
     global entrada_numero
     entrada_numero = ""
     actualizar_lcd("PIN (4 digitos):", "****")
 
     while True:
-        tecla = teclado.leer_tecla()
+        tecla = await teclado.leer_tecla()
         if tecla:
             if tecla.isdigit() and len(entrada_numero) < 4:
                 entrada_numero += tecla
@@ -411,15 +750,15 @@ def verificar_pin():
                 if len(entrada_numero) == 4:
                     if entrada_numero == pin_supervisor:
                         actualizar_lcd("PIN OK", "Acceso autorizado")
-                        time.sleep_ms(1000)
+                        await asyncio.sleep_ms(1000)
                         return True
                     else:
                         actualizar_lcd("PIN ERROR", "Acceso denegado")
-                        time.sleep_ms(1000)
+                        await asyncio.sleep_ms(1000)
                         return False
                 else:
                     actualizar_lcd("PIN INCOMPLETO", "Ingrese 4 digitos")
-                    time.sleep_ms(1000)
+                    await asyncio.sleep_ms(1000)
                     entrada_numero = ""
                     actualizar_lcd("PIN (4 digitos):", "****")
             elif tecla == 'C':  # UNDO/BACKSPACE
@@ -427,19 +766,16 @@ def verificar_pin():
                     entrada_numero = entrada_numero[:-1]
                     asteriscos = "*" * len(entrada_numero) + "_" * (4 - len(entrada_numero))
                     actualizar_lcd("PIN (4 digitos):", asteriscos)
-        time.sleep_ms(50)
+        await asyncio.sleep_ms(50)
 
-def menu_principal():
+async def menu_principal():
     """Menú principal del sistema"""
     global modo_menu, meta, tara, step_size, debounce_ms, buzzer_on, brillo, contador, total, activo, device_id
 
-    # Guardar log_contador al acceder al menú para actualizar
-    guardar_config()
-
     # Mostrar título del menú con efecto deslizante
-    lcd.clear()
-    mostrar_texto_deslizante("MENU", 0, 80)
-    time.sleep_ms(500)
+    pantalla.limpiar()
+    await mostrar_texto_deslizante("MENU", 0, 80)
+    await asyncio.sleep_ms(500)
 
     # Mostrar opciones con efecto deslizante
     opciones = [
@@ -456,268 +792,260 @@ def menu_principal():
     while modo_menu:
         # Mostrar opciones una por una con efecto deslizante
         for i, opcion in enumerate(opciones):
-            lcd.clear()
-            lcd.set_cursor(0, 0)
-            lcd.print(f"Opcion {i+1}/8:")
-            tecla = mostrar_texto_deslizante(opcion, 1, 80)
+            pantalla.limpiar()
+            pantalla.escribir(0, 0, f"Opcion {i+1}/8:")
+            tecla = await mostrar_texto_deslizante(opcion, 1, 80)
 
             if tecla and tecla in ['1', '2', '3', '4', '5', '6', '7', '0']:
                 break
-            time.sleep_ms(800)
+            await asyncio.sleep_ms(800)
 
         # Si no se presionó tecla válida, esperar una
         if not tecla:
             tecla = None
             while tecla is None and modo_menu:
-                tecla = teclado.leer_tecla()
-                time.sleep_ms(50)
+                tecla = await teclado.leer_tecla()
+                await asyncio.sleep_ms(50)
 
         if not modo_menu:
             break
 
         if tecla == '1':  # SET META
-            lcd.clear()
-            if verificar_pin():
-                nueva_meta = entrada_numerica("META:", meta)
+            pantalla.limpiar()
+            if await verificar_pin():
+                nueva_meta = await entrada_numerica("META:", meta)
                 if nueva_meta is not None:
                     meta = nueva_meta
                     guardar_config()
+                    guardar_conteo()  # Nueva meta = nueva orden: el conteo queda asentado
                     actualizar_lcd("META OK:", str(meta))
                     # Enviar meta actualizada
-                    send_rs485("META", meta)
-                    send_rs485("CONT", contador)
-                    send_rs485("TOTAL", total)
-                    send_rs485("ESTADO", 1 if activo else 0)
-                    send_rs485("LOG", log_contador)
-                    time.sleep_ms(1000)
+                    enviar_estado()
+                    await asyncio.sleep_ms(1000)
             else:
                 actualizar_lcd("META CANCELADA", "PIN incorrecto")
-                time.sleep_ms(1000)
+                await asyncio.sleep_ms(1000)
             # Continuar en el menú
 
         elif tecla == '2':  # BORRAR META
-            lcd.clear()
-            if verificar_pin():
+            pantalla.limpiar()
+            if await verificar_pin():
                 meta = 0
                 guardar_config()
                 actualizar_lcd("META BORRADA", "Sin meta fija")
-                time.sleep_ms(1000)
+                await asyncio.sleep_ms(1000)
             else:
                 actualizar_lcd("BORRAR CANCELADO", "PIN incorrecto")
-                time.sleep_ms(1000)
+                await asyncio.sleep_ms(1000)
             # Continuar en el menú
 
         elif tecla == '3':  # MOSTRAR TOTAL
-            lcd.clear()
-            mostrar_estado_rapido()
-            time.sleep_ms(3000)
+            pantalla.limpiar()
+            await mostrar_estado_rapido()
+            await asyncio.sleep_ms(3000)
             # Continuar en el menú
 
         elif tecla == '4':  # BUZZER ON/OFF
-            lcd.clear()
+            pantalla.limpiar()
             buzzer_on = not buzzer_on
             guardar_config()
             actualizar_lcd("BUZZER:", "ON" if buzzer_on else "OFF")
-            time.sleep_ms(1000)
+            await asyncio.sleep_ms(1000)
             # Continuar en el menú
 
         elif tecla == '5':  # CONFIGURAR ID
-            lcd.clear()
-            nuevo_id = entrada_texto("ID:", device_id)
+            pantalla.limpiar()
+            nuevo_id = await entrada_texto("ID:", device_id)
             if nuevo_id is not None and len(nuevo_id) > 0:
                 device_id = nuevo_id
                 guardar_config()
                 actualizar_lcd("ID OK:", device_id)
-                time.sleep_ms(1000)
+                await asyncio.sleep_ms(1000)
             # Continuar en el menú
 
         elif tecla == '6':  # LOG CONTADOR
-            lcd.clear()
-            # Guardar antes de mostrar para asegurar datos actualizados
-            guardar_config()
+            pantalla.limpiar()
             actualizar_lcd("LOG CONTADOR", f"TOTAL: {log_contador}")
-            time.sleep_ms(3000)
+            await asyncio.sleep_ms(3000)
             # Continuar en el menú
 
         elif tecla == '7':  # CONFIGURAR HEARTBEAT
-            lcd.clear()
-            if verificar_pin():
-                nuevo_intervalo = entrada_numerica("HEARTBEAT (s):", heartbeat_interval)
+            pantalla.limpiar()
+            if await verificar_pin():
+                nuevo_intervalo = await entrada_numerica("HEARTBEAT (s):", heartbeat_interval)
                 if nuevo_intervalo is not None and nuevo_intervalo >= 5:  # Mínimo 5 segundos
                     heartbeat_interval = nuevo_intervalo
                     guardar_config()
                     actualizar_lcd("HEARTBEAT OK:", f"{heartbeat_interval}s")
-                    time.sleep_ms(1000)
+                    await asyncio.sleep_ms(1000)
                 elif nuevo_intervalo is not None and nuevo_intervalo < 5:
                     actualizar_lcd("ERROR", "Minimo 5s")
-                    time.sleep_ms(1000)
+                    await asyncio.sleep_ms(1000)
             else:
                 actualizar_lcd("HEARTBEAT CANCELADO", "PIN incorrecto")
-                time.sleep_ms(1000)
+                await asyncio.sleep_ms(1000)
             # Continuar en el menú
 
         elif tecla == '0':  # SALIR
-            # Guardar log_contador antes de salir
-            guardar_config()
             modo_menu = False
             return
 
 
 # --- Interrupción del sensor ---
 def on_detect(pin):
-    global contador, total, _last_ms, log_contador
-    now = time.ticks_ms()
-    if activo and time.ticks_diff(now, _last_ms) > debounce_ms:
-        contador += step_size
-        total += step_size
-        log_contador += step_size  # Incrementar log que no se reinicia
-
-        # Actualizar actividad
-        actualizar_actividad()
-
-        # Guardar log_contador cada 50 lecturas para evitar escritura excesiva
-        if log_contador % (step_size * 50) == 0:
-            guardar_config()
+    """IRQ del sensor: solo anota el instante del flanco en el anillo"""
+    global _cabeza
+    siguiente = (_cabeza + 1) & MASCARA_ANILLO
+    if siguiente != _cola:  # Anillo lleno: el bucle lleva demasiado sin descargarlo
+        _anillo[_cabeza] = time.ticks_ms()
+        _cabeza = siguiente
+
+def iniciar_sensor():
+    """Cuenta por PIO si está disponible; si no, por la IRQ del sensor"""
+    global contador_pio
+    try:
+        from contador_pio import ContadorPIO
+        contador_pio = ContadorPIO(sensores, filtro_us)
+    except Exception:
+        contador_pio = None
+        sensor.irq(trigger=Pin.IRQ_FALLING, handler=on_detect, hard=True)
+
+def descargar_anillo():
+    """Piezas del anillo de la IRQ que pasan el debounce"""
+    global _cola, _last_ms
+    piezas = 0
+    while _cola != _cabeza:
+        instante = _anillo[_cola]
+        _cola = (_cola + 1) & MASCARA_ANILLO
+        if activo and time.ticks_diff(instante, _last_ms) > debounce_ms:
+            piezas += 1
+            _last_ms = instante
+    return piezas
+
+def procesar_piezas():
+    """Lee las piezas nuevas del sensor y las cuenta"""
+    global contador, total, log_contador, _estado_pendiente, _lcd_pendiente
+    if contador_pio:
+        # El PIO cuenta siempre: lo que pasó en pausa se descarta
+        piezas = contador_pio.piezas_nuevas()
+        if not activo:
+            return
+    else:
+        piezas = descargar_anillo()
+    if not piezas:
+        return
 
-        # Alerta visual o sonora
-        if buzzer_on:
-            buzzer.value(1)
-            time.sleep_ms(100)
-            buzzer.value(0)
-        else:
-            # Un solo parpadeo LED verde como alerta visual
-            led_verde.value(0)  # Apagar
-            time.sleep_ms(100)
-            led_verde.value(1)  # Encender
-            time.sleep_ms(150)
-            led_verde.value(0)  # Apagar
-            time.sleep_ms(50)
-
-        # Envía el conteo actual por RS485
-        send_rs485("CONT", contador)
-        send_rs485("TOTAL", total)
-        send_rs485("META", meta)
-        send_rs485("ESTADO", 1 if activo else 0)
-        send_rs485("LOG", log_contador)
-
-        # Verificar meta
-        if meta > 0:
-            if contador >= meta:
-                actualizar_semaforo(1, 0, 0)  # Rojo - Meta alcanzada
-                actualizar_lcd("META OK!", str(contador))
-            elif contador >= meta - 10:  # Últimas 10 piezas
-                actualizar_semaforo(0, 1, 0)  # Amarillo intermitente
-                actualizar_lcd("FALTA:", str(meta - contador))
-            else:
-                actualizar_semaforo(0, 1, 0)  # Amarillo - Modo lectura
-                actualizar_lcd("CONT:", str(contador))
-        else:
-            actualizar_semaforo(0, 1, 0)  # Amarillo - Modo lectura
-            actualizar_lcd("CONT:", str(contador))
+    incremento = piezas * step_size
+    contador += incremento
+    total += incremento
+    log_contador += incremento  # Incrementar log que no se reinicia
 
-        time.sleep_ms(100)
-        if buzzer_on:
-            buzzer.value(0)
-        _last_ms = now
+    # Actualizar actividad
+    actualizar_actividad()
 
-sensor.irq(trigger=Pin.IRQ_FALLING, handler=on_detect)
+    # El diario agrupa lotes: un registro cada DIARIO_MAX_PIEZAS o DIARIO_MAX_MS
+    revisar_diario(piezas)
 
-# --- Inicio ---
-cargar_config()
+    senal_pieza()
+    _estado_pendiente = True
+    _lcd_pendiente = True
 
-# Inicializar timestamps
-actualizar_actividad()
-last_heartbeat = time.time()
+def senal_pieza():
+    """Alerta de pieza sin bloquear: la apaga atender_salidas al vencer"""
+    global _senal_activa, _fin_senal
+    if buzzer_on:
+        buzzer.value(1)
+    else:
+        led_verde.value(1)  # Un parpadeo LED verde como alerta visual
+    _senal_activa = True
+    _fin_senal = time.ticks_add(time.ticks_ms(), SENAL_PIEZA_MS)
 
-# Mostrar mensaje de bienvenida con efecto deslizante
-lcd.clear()
-mostrar_texto_deslizante("=== SISPRO ONE  ===", 0, 80)
-time.sleep_ms(500)
-mostrar_texto_deslizante(f"=== {device_id} ===", 0, 80)
-time.sleep_ms(1000)
+def refrescar_lcd_conteo():
+    """Muestra el conteo y el semáforo según la meta"""
+    if meta > 0:
+        if contador >= meta:
+            actualizar_semaforo(1, 0, 0)  # Rojo - Meta alcanzada
+            actualizar_lcd("META OK!", str(contador))
+        elif contador >= meta - 10:  # Últimas 10 piezas
+            actualizar_semaforo(0, 1, 0)  # Amarillo intermitente
+            actualizar_lcd("FALTA:", str(meta - contador))
+        else:
+            actualizar_semaforo(0, 1, 0)  # Amarillo - Modo lectura
+            actualizar_lcd("CONT:", str(contador))
+    else:
+        actualizar_semaforo(0, 1, 0)  # Amarillo - Modo lectura
+        actualizar_lcd("CONT:", str(contador))
+
+def atender_salidas():
+    """Apaga la alerta vencida, envía el estado y asienta el diario vencido"""
+    global _senal_activa, _estado_pendiente, _ultimo_envio
+    revisar_diario()
+    ahora = time.ticks_ms()
+    if _senal_activa and time.ticks_diff(ahora, _fin_senal) >= 0:
+        buzzer.value(0)
+        if not buzzer_on:
+            led_verde.value(0)
+        _senal_activa = False
+
+    # Envía el conteo actual por RS485 (una sola trama por lote)
+    if _estado_pendiente and time.ticks_diff(ahora, _ultimo_envio) >= INTERVALO_TELEMETRIA_MS:
+        enviar_estado()
+        _estado_pendiente = False
+        _ultimo_envio = ahora
+
+# --- Tareas ---
+async def tarea_tx():
+    """Transmite lo encolado en orden, cediendo entre trama y trama"""
+    while True:
+        await hay_tx.wait()
+        hay_tx.clear()
+        while cola_tx:
+            dato = cola_tx.pop(0)
+            if isinstance(dato, int):
+                cambiar_baudrate(dato)
+            else:
+                enviar_bus(dato)
+            await asyncio.sleep_ms(0)
 
-actualizar_lcd("Sistema Listo", "Presiona D para menu")
-modo_espera()
+async def tarea_rx():
+    """Atiende los comandos del maestro"""
+    while True:
+        try:
+            procesar_comandos()
+            revisar_baudrate()
+        except Exception:
+            pass  # Una trama mala no puede dejar a la estación sin escuchar al maestro
+        await asyncio.sleep_ms(5)
+
+async def tarea_sensor():
+    """Cuenta las piezas y atiende buzzer/LED y telemetría"""
+    while True:
+        procesar_piezas()
+        atender_salidas()
+        await asyncio.sleep_ms(10)
 
-# --- Bucle Principal ---
-while True:
-    # Verificar si es hora de enviar heartbeat
-    ahora = time.time()
-    if ahora - last_heartbeat >= heartbeat_interval:
-        enviar_heartbeat()
-
-    tecla = teclado.leer_tecla()
-
-    if tecla:
-        # Actualizar actividad cuando se presiona una tecla
-        actualizar_actividad()
-        if tecla == 'D':  # MENÚ/OK
-            modo_menu = True
-            menu_principal()
-
-        elif tecla == 'A':  # START/STOP
-            if not activo:
-                activo = True
-                actualizar_lcd("ACTIVO", f"CONT:{contador}")
-                iniciar_conteo()
-                # Enviar estado actualizado
-                send_rs485("ESTADO", 1)
-                send_rs485("CONT", contador)
-                send_rs485("TOTAL", total)
-                send_rs485("META", meta)
-                send_rs485("LOG", log_contador)
-            else:
-                activo = False
-                actualizar_lcd("DETENIDO", f"CONT:{contador}")
-                actualizar_semaforo(0, 1, 0)
-                # Enviar estado actualizado
-                send_rs485("ESTADO", 0)
-                send_rs485("CONT", contador)
-                send_rs485("TOTAL", total)
-                send_rs485("META", meta)
-                send_rs485("LOG", log_contador)
-            time.sleep_ms(300)
-
-        elif tecla == 'B':  # UNDO
-            if contador > 0:
-                contador -= step_size
-                total -= step_size
-                actualizar_lcd("UNDO", f"CONT:{contador}")
-                bip_corto()
-                # Enviar datos actualizados después del UNDO
-                send_rs485("CONT", contador)
-                send_rs485("TOTAL", total)
-                send_rs485("META", meta)
-                send_rs485("ESTADO", 1 if activo else 0)
-                send_rs485("LOG", log_contador)
-            time.sleep_ms(300)
-
-        elif tecla == 'C':  # RESET CON PIN
-            lcd.clear()
-            if verificar_pin():
-                contador = tara
-                total = 0
-                actualizar_lcd("RESET OK", f"CONT:{contador}")
-                bip_largo()
-            else:
-                actualizar_lcd("RESET CANCELADO", "PIN incorrecto")
-            time.sleep_ms(1000)
-
-        elif tecla == '0':  # CANCEL
-            if modo_menu:
-                modo_menu = False
-                actualizar_lcd("Sistema Listo", "Presiona D para menu")
-
-        elif tecla == '#':  # ENTER - Mostrar estado rápido
-            mostrar_estado_rapido()
-            time.sleep_ms(2000)
-            if activo:
-                actualizar_lcd("ACTIVO", f"CONT:{contador}")
-            else:
-                actualizar_lcd("DETENIDO", f"CONT:{contador}")
+async def tarea_heartbeat():
+    """Envía el heartbeat a intervalo fijo, aunque el operador esté en el menú"""
+    while True:
+        if time.time() - last_heartbeat >= heartbeat_interval:
+            enviar_heartbeat()
+        await asyncio.sleep_ms(200)
 
-    # Actualizar display si no está en menú (solo cuando hay cambios de estado)
-    if not modo_menu and not tecla:
+async def tarea_lcd():
+    """Pasa al LCD las celdas cambiadas, a lo sumo cada REFRESCO_LCD_MS"""
+    while True:
+        pantalla.refrescar()
+        await asyncio.sleep_ms(REFRESCO_LCD_MS)
+
+async def tarea_pantalla():
+    """Mantiene LCD y semáforo al día mientras el teclado no usa la pantalla"""
+    global activo, _estado_anterior, _lcd_pendiente
+    while True:
+        await asyncio.sleep_ms(50)
+        if modo_menu or pantalla_ocupada:
+            continue
+
+        # Actualizar display solo cuando hay cambios de estado
         estado_actual = "ACTIVO" if activo else "DETENIDO"
 
         if activo:
@@ -727,13 +1055,13 @@ while True:
                 actualizar_lcd("META OK!", str(contador))
                 actualizar_semaforo(1, 0, 0)  # Rojo
                 if buzzer_on:
-                    bip_largo()
+                    await bip_largo()
                 else:
                     # Parpadeo LED verde como alerta visual
                     led_verde.value(0)
-                    time.sleep_ms(100)
+                    await asyncio.sleep_ms(100)
                     led_verde.value(1)
-                    time.sleep_ms(500)
+                    await asyncio.sleep_ms(500)
                     led_verde.value(0)
                 _estado_anterior = "META_OK"
             elif _estado_anterior != estado_actual:
@@ -754,4 +1082,124 @@ while True:
                     actualizar_lcd("DETENIDO (LIBRE)", f"CONT:{contador}")
                 _estado_anterior = estado_actual
 
-    time.sleep_ms(50)
\ No newline at end of file
+        # Conteo nuevo: solo toca el framebuffer, tarea_lcd agrupa los envíos
+        if _lcd_pendiente:
+            refrescar_lcd_conteo()
+            _lcd_pendiente = False
+
+async def atender_tecla(tecla):
+    """Ejecuta la acción de una tecla fuera del menú"""
+    global modo_menu, activo, contador, total
+
+    # Actualizar actividad cuando se presiona una tecla
+    actualizar_actividad()
+    if tecla == 'D':  # MENÚ/OK
+        modo_menu = True
+        await menu_principal()
+
+    elif tecla == 'A':  # START/STOP
+        if not activo:
+            activo = True
+            actualizar_lcd("ACTIVO", f"CONT:{contador}")
+            await iniciar_conteo()
+            # Enviar estado actualizado
+            enviar_estado()
+        else:
+            procesar_piezas()  # Las piezas que pasaron antes de detener cuentan
+            activo = False
+            if _piezas_sin_diario:
+                guardar_conteo()
+            actualizar_lcd("DETENIDO", f"CONT:{contador}")
+            actualizar_semaforo(0, 1, 0)
+            # Enviar estado actualizado
+            enviar_estado()
+        await asyncio.sleep_ms(300)
+
+    elif tecla == 'B':  # UNDO
+        if contador > 0:
+            contador -= step_size
+            total -= step_size
+            guardar_conteo()
+            actualizar_lcd("UNDO", f"CONT:{contador}")
+            await bip_corto()
+            # Enviar datos actualizados después del UNDO
+            enviar_estado()
+        await asyncio.sleep_ms(300)
+
+    elif tecla == 'C':  # RESET CON PIN
+        pantalla.limpiar()
+        if await verificar_pin():
+            contador = tara
+            total = 0
+            guardar_conteo()
+            # Nueva base para el Pi: el salto de contador no es un UNDO
+            send_trama([("RESET", contador)])
+            enviar_estado()
+            actualizar_lcd("RESET OK", f"CONT:{contador}")
+            await bip_largo()
+        else:
+            actualizar_lcd("RESET CANCELADO", "PIN incorrecto")
+        await asyncio.sleep_ms(1000)
+
+    elif tecla == '0':  # CANCEL
+        if modo_menu:
+            modo_menu = False
+            actualizar_lcd("Sistema Listo", "Presiona D para menu")
+
+    elif tecla == '#':  # ENTER - Mostrar estado rápido
+        await mostrar_estado_rapido()
+        await asyncio.sleep_ms(2000)
+        if activo:
+            actualizar_lcd("ACTIVO", f"CONT:{contador}")
+        else:
+            actualizar_lcd("DETENIDO", f"CONT:{contador}")
+
+async def tarea_teclado():
+    """Lee el teclado; mientras atiende una tecla la pantalla es suya"""
+    global pantalla_ocupada
+    while True:
+        tecla = await teclado.leer_tecla()
+        if tecla:
+            pantalla_ocupada = True
+            try:
+                await atender_tecla(tecla)
+            finally:
+                pantalla_ocupada = False
+        await asyncio.sleep_ms(50)
+
+async def main():
+    # El bus y el conteo se atienden desde el arranque
+    asyncio.create_task(tarea_tx())
+    asyncio.create_task(tarea_rx())
+    asyncio.create_task(tarea_sensor())
+    asyncio.create_task(tarea_lcd())
+
+    # Mostrar mensaje de bienvenida con efecto deslizante
+    pantalla.limpiar()
+    await mostrar_texto_deslizante("=== SISPRO ONE  ===", 0, 80)
+    await asyncio.sleep_ms(500)
+    await mostrar_texto_deslizante(f"=== {device_id} ===", 0, 80)
+    await asyncio.sleep_ms(1000)
+
+    actualizar_lcd("Sistema Listo", "Presiona D para menu")
+    await modo_espera()
+
+    # Anunciar soporte de tramas binarias; el maestro decide si se usan
+    send_rs485("PROTO", VERSION_BINARIA)
+    # El contador viene del diario (o de cero): fijar la base en el Pi
+    send_rs485("RESET", contador)
+
+    asyncio.create_task(tarea_heartbeat())
+    asyncio.create_task(tarea_pantalla())
+    await tarea_teclado()
+
+# --- Inicio ---
+cargar_config()
+cargar_conteo()
+iniciar_sensor()
+
+# Inicializar timestamps
+actualizar_actividad()
+last_heartbeat = time.time()
+
+asyncio.run(main())
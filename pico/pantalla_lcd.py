@@ -0,0 +1,53 @@
+# --- Framebuffer del LCD 16x2 ---
+# Las funciones de pantalla escriben en una copia en memoria; refrescar()
+# compara con lo que ya muestra el LCD y envía por I2C solo las celdas que
+# cambiaron. Varias escrituras entre dos refrescos cuestan un solo envío.
+
+class PantallaLCD:
+    def __init__(self, lcd, columnas=16, filas=2):
+        self.lcd = lcd
+        self.columnas = columnas
+        self.deseado = [[" "] * columnas for _ in range(filas)]
+        self.visible = [[" "] * columnas for _ in range(filas)]
+        self.pendiente = False
+        lcd.clear()  # Único clear: desde aquí el LCD coincide con visible
+
+    def escribir(self, fila, columna, texto):
+        """Escribe texto desde (fila, columna); lo que no entra se descarta"""
+        celdas = self.deseado[fila]
+        for caracter in str(texto)[:max(self.columnas - columna, 0)]:
+            if celdas[columna] != caracter:
+                celdas[columna] = caracter
+                self.pendiente = True
+            columna += 1
+
+    def linea(self, fila, texto):
+        """Reemplaza la fila completa (rellena con espacios)"""
+        texto = str(texto)[:self.columnas]
+        self.escribir(fila, 0, texto + " " * (self.columnas - len(texto)))
+
+    def limpiar(self):
+        for fila in range(len(self.deseado)):
+            self.linea(fila, "")
+
+    def refrescar(self):
+        """Envía al LCD los tramos de celdas que difieren de lo visible"""
+        if not self.pendiente:
+            return
+        self.pendiente = False
+        for fila, (deseada, visible) in enumerate(zip(self.deseado, self.visible)):
+            columna = 0
+            while columna < self.columnas:
+                if deseada[columna] == visible[columna]:
+                    columna += 1
+                    continue
+                # Un tramo absorbe huecos de una celda: reescribirla cuesta
+                # lo mismo que mover el cursor
+                fin = columna + 1
+                while fin < self.columnas and (deseada[fin] != visible[fin] or
+                                               (fin + 1 < self.columnas and deseada[fin + 1] != visible[fin + 1])):
+                    fin += 1
+                self.lcd.set_cursor(columna, fila)
+                self.lcd.print("".join(deseada[columna:fin]))
+                visible[columna:fin] = deseada[columna:fin]
+                columna = fin